@@ -0,0 +1,381 @@
+"""
+Offline end-to-end benchmark for the flask-api service.
+
+Starts fake_loki.py, fake_llm.py and app.py (with CHROMA_BACKEND=memory)
+locally, then measures:
+
+  ingest     lines/s for a burst of fake_logs/app.log plus generate_logs.py lines
+             pushed into Loki and read back through the tail path
+  lag        end-to-end lag: Loki push -> line visible on /stream, and the
+             logs_ingest_lag_seconds gauge (push -> committed upsert)
+  endpoints  /logs, /stats, /chat and streaming /chat (time to first
+             token) latency percentiles under concurrent clients while
+             live lines keep arriving
+
+Results are written as JSON (bench/results/ by default); --compare prints
+the change against an earlier result file.
+
+Usage:
+    python bench/run_bench.py
+    python bench/run_bench.py --synthetic 50000 --clients 16 --out base.json
+    python bench/run_bench.py --compare base.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_DIR = os.path.join(ROOT, "flask_api")
+sys.path.insert(0, API_DIR)
+sys.path.insert(0, os.path.join(ROOT, "fake_logs"))
+
+import fake_llm  # noqa: E402
+import fake_loki  # noqa: E402
+from generate_logs import LineGenerator  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 6),
+        "p50": round(pick(0.5), 6),
+        "p90": round(pick(0.9), 6),
+        "p99": round(pick(0.99), 6),
+        "max": round(values[-1], 6),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def load_lines(path, synthetic, gen):
+    lines = []
+    if path and os.path.exists(path):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            lines = [l.rstrip("\r\n") for l in f if l.strip()]
+    lines += [line for _, line in gen.batch(synthetic)]
+    gen.rng.shuffle(lines)
+    return lines
+
+
+def wait_for(url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=2).ok:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    return False
+
+
+class LivePusher(threading.Thread):
+    """Push generate_logs.py lines into the fake Loki at a fixed rate."""
+
+    def __init__(self, store, rate, gen):
+        super().__init__(daemon=True)
+        self.store = store
+        self.rate = rate
+        self.gen = gen
+        self.running = True
+        self.pushed = 0
+
+    def run(self):
+        interval = 0.05
+        per_tick = max(1, round(self.rate * interval))
+        while self.running:
+            started = time.time()
+            self.store.push(fake_loki.DEFAULT_LABELS, [(None, line) for _, line in self.gen.batch(per_tick)])
+            self.pushed += per_tick
+            time.sleep(max(0.0, interval - (time.time() - started)))
+
+
+class StreamWatcher(threading.Thread):
+    """Record push -> /stream visibility lag for every line delivered."""
+
+    def __init__(self, url):
+        super().__init__(daemon=True)
+        self.url = url
+        self.lags = []
+        self.running = True
+
+    def run(self):
+        try:
+            with requests.get(self.url, stream=True, timeout=(5, 60)) as res:
+                event = None
+                for line in res.iter_lines(decode_unicode=True):
+                    if not self.running:
+                        return
+                    if line.startswith("event:"):
+                        event = line[6:].strip()
+                    elif line.startswith("data:") and event == "logs":
+                        now = time.time_ns()
+                        for stream in json.loads(line[5:]).get("result", []):
+                            for ts, _ in stream.get("values", []):
+                                self.lags.append((now - int(ts)) / 1e9)
+        except requests.RequestException:
+            pass  # app.py shut down at the end of the run
+
+
+def scrape_gauge(base, name):
+    try:
+        for line in requests.get(f"{base}/metrics", timeout=5).text.splitlines():
+            if line.startswith(name + " "):
+                return float(line.split()[1])
+    except (requests.RequestException, ValueError):
+        pass
+    return None
+
+
+def run_load(base, clients, seconds, questions):
+    """Concurrent clients cycling through the endpoints; returns latencies per endpoint."""
+    calls = {
+        "logs": lambda s: s.get(f"{base}/logs", params={"limit": 100}, timeout=30),
+        "stats": lambda s: s.get(f"{base}/stats", timeout=30),
+        "chat": lambda s: s.post(f"{base}/chat", json={"message": random.choice(questions)}, timeout=60),
+    }
+    latencies = {name: [] for name in list(calls) + ["chat_stream_ttft", "chat_stream_total"]}
+    errors = {name: 0 for name in latencies}
+    lock = threading.Lock()
+    deadline = time.time() + seconds
+
+    def stream_chat(session):
+        started = time.perf_counter()
+        ttft = None
+        with session.post(f"{base}/chat", json={"message": random.choice(questions), "stream": True},
+                          stream=True, timeout=60) as res:
+            res.raise_for_status()
+            for line in res.iter_lines(decode_unicode=True):
+                if ttft is None and line.startswith("event: token"):
+                    ttft = time.perf_counter() - started
+        return ttft, time.perf_counter() - started
+
+    def client(i):
+        session = requests.Session()
+        order = ["logs", "stats", "logs", "stats", "chat", "chat_stream"]
+        n = i
+        while time.time() < deadline:
+            name = order[n % len(order)]
+            n += 1
+            try:
+                if name == "chat_stream":
+                    ttft, total = stream_chat(session)
+                    with lock:
+                        if ttft is not None:
+                            latencies["chat_stream_ttft"].append(ttft)
+                        latencies["chat_stream_total"].append(total)
+                    continue
+                started = time.perf_counter()
+                res = calls[name](session)
+                elapsed = time.perf_counter() - started
+                with lock:
+                    if res.status_code < 400 or res.status_code == 304:
+                        latencies[name].append(elapsed)
+                    else:
+                        errors[name] += 1
+            except requests.RequestException:
+                with lock:
+                    errors["chat_stream_total" if name == "chat_stream" else name] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return {
+        name: {**percentiles(values), "errors": errors[name], "rps": round(len(values) / seconds, 2)}
+        for name, values in latencies.items()
+    }
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    def rows(prefix, cur, base):
+        for key, value in cur.items():
+            if isinstance(value, dict):
+                yield from rows(f"{prefix}{key}.", value, (base or {}).get(key))
+            elif isinstance(value, (int, float)) and isinstance((base or {}).get(key), (int, float)):
+                yield f"{prefix}{key}", base[key], value
+
+    print(f"\nCompared with {baseline_path} ({baseline.get('meta', {}).get('git_commit')}):")
+    for section in ("ingest", "lag", "endpoints"):
+        for name, old, new in rows(f"{section}.", current.get(section, {}), baseline.get(section)):
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+            print(f"  {name:<45} {old:>12.4f} -> {new:>12.4f}  {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline flask-api benchmark")
+    parser.add_argument("--replay", default=os.path.join(ROOT, "fake_logs", "app.log"),
+                        help="log file replayed in the ingest phase")
+    parser.add_argument("--synthetic", type=int, default=20000,
+                        help="generate_logs.py lines added to the ingest phase")
+    parser.add_argument("--seed", type=int, default=42, help="seed for synthetic lines and chat questions")
+    parser.add_argument("--live-rate", type=float, default=200, help="live lines/s during lag and load phases")
+    parser.add_argument("--lag-seconds", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--load-seconds", type=float, default=20)
+    parser.add_argument("--first-token", type=float, default=0.05, help="fake LLM first-token delay")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="fake LLM delay between chunks")
+    parser.add_argument("--ingest-timeout", type=float, default=300)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for app.py (repeatable)")
+    parser.add_argument("--out", help="result file (default bench/results/bench-<time>.json)")
+    parser.add_argument("--compare", help="earlier result file to diff against")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    gen = LineGenerator(seed=args.seed)
+    workdir = tempfile.mkdtemp(prefix="logs-bench-")
+    loki_port, llm_port, app_port = free_port(), free_port(), free_port()
+    loki_server, store = fake_loki.serve(port=loki_port)
+    llm_server = fake_llm.serve(port=llm_port, first_token=args.first_token, token_delay=args.token_delay)
+
+    env = dict(os.environ)
+    env.update({
+        "CHROMA_BACKEND": "memory",
+        "LOKI_URL": f"http://127.0.0.1:{loki_port}",
+        "GEMINI_BASE_URL": f"http://127.0.0.1:{llm_port}/v1beta",
+        "GEMINI_API_KEY": "bench",
+        "PROM_URL": f"http://127.0.0.1:{free_port()}",
+        "INGEST_STATE_DIR": os.path.join(workdir, "state"),
+        "LOG_LEVEL": "WARNING",
+        "PORT": str(app_port),
+    })
+    env.update(kv.split("=", 1) for kv in args.env)
+    base = f"http://127.0.0.1:{app_port}"
+
+    app_log = open(os.path.join(workdir, "app.log"), "w")
+    spawned = time.time()
+    app = subprocess.Popen([sys.executable, "app.py"], cwd=API_DIR, env=env,
+                           stdout=app_log, stderr=subprocess.STDOUT)
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        }
+    }
+    watcher = pusher = None
+    try:
+        if not wait_for(f"{base}/health", 120):
+            raise SystemExit(f"app.py did not become healthy; see {app_log.name}")
+        results["meta"]["startup_seconds"] = round(time.time() - spawned, 3)
+        print(f"✅ app.py up in {results['meta']['startup_seconds']}s ({workdir})")
+
+        # --- ingest throughput ---
+        lines = load_lines(args.replay, args.synthetic, gen)
+        started = time.time()
+        for i in range(0, len(lines), 500):
+            store.push(fake_loki.DEFAULT_LABELS, [(None, l) for l in lines[i:i + 500]])
+        pushed_in = time.time() - started
+        added = 0
+        while time.time() - started < args.ingest_timeout:
+            added = requests.get(f"{base}/health", timeout=10).json().get("logs_added", 0)
+            if added >= len(lines):
+                break
+            time.sleep(0.1)
+        elapsed = time.time() - started
+        results["ingest"] = {
+            "lines": len(lines),
+            "ingested": added,
+            "seconds": round(elapsed, 3),
+            "push_seconds": round(pushed_in, 3),
+            "lines_per_sec": round(added / elapsed, 1),
+        }
+        print(f"📥 Ingest: {added}/{len(lines)} lines in {elapsed:.2f}s "
+              f"({results['ingest']['lines_per_sec']} lines/s)")
+
+        # --- end-to-end lag at a steady live rate ---
+        watcher = StreamWatcher(f"{base}/stream")
+        watcher.start()
+        pusher = LivePusher(store, args.live_rate, gen)
+        pusher.start()
+        commit_lag = []
+        deadline = time.time() + args.lag_seconds
+        while time.time() < deadline:
+            time.sleep(0.5)
+            value = scrape_gauge(base, "logs_ingest_lag_seconds")
+            if value is not None:
+                commit_lag.append(value)
+        results["lag"] = {
+            "live_rate": args.live_rate,
+            "stream_visible_seconds": percentiles(list(watcher.lags)),
+            "commit_lag_seconds": percentiles(commit_lag),
+        }
+        print(f"⏱️  Lag: visible p50={results['lag']['stream_visible_seconds'].get('p50')}s "
+              f"p99={results['lag']['stream_visible_seconds'].get('p99')}s, "
+              f"commit p50={results['lag']['commit_lag_seconds'].get('p50')}s")
+
+        # --- endpoint latency under concurrent clients ---
+        questions = [
+            "any errors in db-connection?",
+            "why are API responses slow in the last 5 minutes",
+            "how many cache misses",
+            "what happened with transaction_id deadlocks",
+            "show auth failures",
+        ]
+        results["endpoints"] = run_load(base, args.clients, args.load_seconds, questions)
+        for name, r in results["endpoints"].items():
+            print(f"🌐 {name:<18} n={r['count']:<6} p50={r.get('p50')} p99={r.get('p99')} errors={r['errors']}")
+
+        results["app"] = requests.get(f"{base}/health", timeout=10).json()
+    finally:
+        if pusher:
+            pusher.running = False
+        if watcher:
+            watcher.running = False
+        app.terminate()
+        try:
+            app.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            app.kill()
+        app_log.close()
+        loki_server.shutdown()
+        llm_server.shutdown()
+
+    out = args.out or os.path.join(
+        ROOT, "bench", "results", f"bench-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"💾 Results written to {out}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
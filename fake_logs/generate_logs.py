@@ -1,19 +1,15 @@
+import argparse
+import json
+import multiprocessing
 import time
 import random
 import logging
 import os
 import uuid
+import urllib.request
 
-# Ensure log directory exists
-os.makedirs("/var/log/fake", exist_ok=True)
 log_file = "/var/log/fake/app.log"
-
-# Configure logging
-logging.basicConfig(
-    filename=log_file,
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] [%(name)s] %(message)s",
-)
+LOG_FORMAT = "%(asctime)s [%(levelname)s] [%(name)s] %(message)s"
 
 # Create loggers for different services
 auth_logger = logging.getLogger("auth-service")
@@ -56,60 +52,64 @@ log_templates = [
 # ---------------------------------------------------------------------
 # 🔧 Helper functions to generate dynamic content
 # ---------------------------------------------------------------------
-def random_str(length=8):
-    return ''.join(random.choices("abcdef0123456789", k=length))
+def random_str(length=8, rng=random):
+    return ''.join(rng.choices("abcdef0123456789", k=length))
+
+def random_endpoint(rng=random):
+    return rng.choice(["/api/v1/login", "/api/v1/user", "/api/v1/orders", "/health", "/metrics"])
 
-def random_endpoint():
-    return random.choice(["/api/v1/login", "/api/v1/user", "/api/v1/orders", "/health", "/metrics"])
+def random_topic(rng=random):
+    return rng.choice(["auth-events", "order-stream", "user-activity", "notifications"])
 
-def random_topic():
-    return random.choice(["auth-events", "order-stream", "user-activity", "notifications"])
+def random_error(rng=random):
+    return rng.choice(["ConnectionRefusedError", "TimeoutError", "BrokenPipeError", "InvalidQueryError"])
 
-def random_error():
-    return random.choice(["ConnectionRefusedError", "TimeoutError", "BrokenPipeError", "InvalidQueryError"])
+def random_uuid(rng=random):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
 
 # ---------------------------------------------------------------------
-# 🧩 Safe formatter: automatically fills all %s placeholders
+# 🧩 Value binding: pick each template's value generator once
 # ---------------------------------------------------------------------
-def safe_format(template):
-    count = template.count("%s")
-    values = []
-
+def bind_values(template):
+    """Return fn(rng) -> values for the template's %s placeholders."""
     # Fill dynamic placeholders based on keywords
     if "user_id" in template and "session_id" in template:
-        values = [random.randint(1000, 5000), str(uuid.uuid4())]
+        return lambda rng: [rng.randint(1000, 5000), random_uuid(rng)]
     elif "user_id" in template:
-        values = [random.randint(1000, 5000)]
+        return lambda rng: [rng.randint(1000, 5000)]
     elif "session_id" in template:
-        values = [str(uuid.uuid4())]
+        return lambda rng: [random_uuid(rng)]
     elif "request_id" in template:
-        values = [str(uuid.uuid4())]
+        return lambda rng: [random_uuid(rng)]
     elif "transaction_id" in template:
-        values = [random_str(12)]
+        return lambda rng: [random_str(12, rng)]
     elif "pool_size" in template:
-        values = [random.randint(50, 2000), random.randint(5, 50)]
+        return lambda rng: [rng.randint(50, 2000), rng.randint(5, 50)]
     elif "endpoint" in template and "response" in template:
-        values = [random.randint(200, 3000), random_endpoint()]
+        return lambda rng: [rng.randint(200, 3000), random_endpoint(rng)]
     elif "endpoint" in template:
-        values = [random_endpoint()]
+        return lambda rng: [random_endpoint(rng)]
     elif "status" in template:
-        values = [random_endpoint(), random.choice(["502", "504", "503"])]
+        return lambda rng: [random_endpoint(rng), rng.choice(["502", "504", "503"])]
     elif "key" in template:
-        values = [f"user:{random.randint(1, 500)}"]
+        return lambda rng: [f"user:{rng.randint(1, 500)}"]
     elif "topic" in template and "offset" in template:
-        values = [random_topic(), random.randint(1000, 9999)]
+        return lambda rng: [random_topic(rng), rng.randint(1000, 9999)]
     elif "topic" in template and "error" in template:
-        values = [random_topic()]
+        return lambda rng: [random_topic(rng)]
     elif "query" in template:
-        values = [random.randint(5, 200), random.randint(100, 2000)]
+        return lambda rng: [rng.randint(5, 200), rng.randint(100, 2000)]
     elif "error" in template and "%s" in template:
-        values = [random_error()]
+        return lambda rng: [random_error(rng)]
     elif "request" in template and "to" in template:
-        values = [random.choice(["GET", "POST", "DELETE", "PATCH"]), random_endpoint()]
+        return lambda rng: [rng.choice(["GET", "POST", "DELETE", "PATCH"]), random_endpoint(rng)]
     elif "%s" in template:
-        values = [random.randint(100, 1000)]  # default numeric filler
+        return lambda rng: [rng.randint(100, 1000)]  # default numeric filler
+    return lambda rng: []
 
+def fill(template, values):
     # Pad remaining placeholders safely
+    count = template.count("%s")
     while len(values) < count:
         values.append("N/A")
 
@@ -118,7 +118,203 @@ def safe_format(template):
     except Exception as e:
         return f"[FORMAT_ERROR: {e}] {template} ({values})"
 
-if __name__ == "__main__":
+# ---------------------------------------------------------------------
+# 🧩 Safe formatter: automatically fills all %s placeholders
+# ---------------------------------------------------------------------
+def safe_format(template, rng=random):
+    return fill(template, bind_values(template)(rng))
+
+# ---------------------------------------------------------------------
+# 🚀 Load mode: pre-bound templates, batched output
+# ---------------------------------------------------------------------
+class LineGenerator:
+    """
+    Seeded generator of complete log lines in the logging format above.
+
+    Templates are bound to their value generators once, so producing a
+    line is a random choice plus one % format.
+    """
+
+    def __init__(self, seed=None, start_time=None, rate=None):
+        self.rng = random.Random(seed)
+        self.bound = [
+            (f" [{logging.getLevelName(level)}] [{logger.name}] ", template, bind_values(template))
+            for logger, level, template in log_templates
+        ]
+        # With start_time, timestamps advance 1/rate per line instead of
+        # following the wall clock, so a seeded run is fully reproducible
+        self.clock = start_time
+        self.step = 1.0 / rate if rate else 0.001
+        self._stamp_second = None
+        self._stamp_prefix = ""
+
+    def _stamp(self, now):
+        second = int(now)
+        if second != self._stamp_second:
+            self._stamp_second = second
+            self._stamp_prefix = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+        return f"{self._stamp_prefix},{int((now - second) * 1000):03d}"
+
+    def line(self):
+        """(timestamp seconds, line)."""
+        if self.clock is None:
+            now = time.time()
+        else:
+            now = self.clock
+            self.clock += self.step
+        head, template, values = self.rng.choice(self.bound)
+        return now, self._stamp(now) + head + fill(template, values(self.rng))
+
+    def batch(self, n):
+        return [self.line() for _ in range(n)]
+
+
+class FileSink:
+    """Appends whole batches with one write() each (safe across processes)."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def write(self, entries):
+        os.write(self.fd, "".join(line + "\n" for _, line in entries).encode())
+
+    def close(self):
+        os.close(self.fd)
+
+
+class LokiSink:
+    """POSTs batches to a Loki-compatible /loki/api/v1/push endpoint."""
+
+    def __init__(self, url, labels):
+        self.url = url.rstrip("/") + "/loki/api/v1/push"
+        self.labels = labels
+
+    def write(self, entries):
+        body = json.dumps({"streams": [{
+            "stream": self.labels,
+            "values": [[str(int(ts * 1e9)), line] for ts, line in entries],
+        }]}).encode()
+        req = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        urllib.request.urlopen(req, timeout=10).close()
+
+    def close(self):
+        pass
+
+
+def parse_profile(profile):
+    """"1000:10,50000:5" -> [(1000.0, 10.0), (50000.0, 5.0)] (lines/s, seconds), cycled."""
+    phases = []
+    for part in profile.split(","):
+        rate, seconds = part.split(":")
+        phases.append((float(rate), float(seconds)))
+    return phases
+
+
+def run_load(args, worker=0):
+    share = 1.0 / args.processes
+    phases = parse_profile(args.profile) if args.profile else [(args.rate, float("inf"))]
+    phases = [(rate * share, seconds) for rate, seconds in phases]
+    seed = None if args.seed is None else args.seed + worker
+    gen = LineGenerator(seed, args.start_time, phases[0][0])
+    if args.loki_url:
+        sink = LokiSink(args.loki_url, {"job": args.job, "host": args.host})
+    else:
+        sink = FileSink(args.output)
+
+    limit = args.count * share if args.count else None
+    deadline = time.time() + args.duration if args.duration else None
+    sent = 0
+    started = time.time()
+    try:
+        while True:
+            for rate, seconds in phases:
+                phase_start = time.time()
+                phase_sent = 0
+                while time.time() - phase_start < seconds:
+                    if (limit is not None and sent >= limit) or (deadline and time.time() >= deadline):
+                        return sent
+                    # Small batches at low rates keep the output smooth
+                    n = min(args.batch_size, max(1, int(rate / 20))) if rate > 0 else args.batch_size
+                    if limit is not None:
+                        n = max(1, int(min(n, limit - sent)))
+                    sink.write(gen.batch(n))
+                    sent += n
+                    phase_sent += n
+                    # Pace against the phase's schedule; rate 0 means unthrottled
+                    if rate > 0:
+                        ahead = phase_sent / rate - (time.time() - phase_start)
+                        if ahead > 0:
+                            time.sleep(ahead)
+                if worker == 0 and not args.quiet:
+                    elapsed = time.time() - started
+                    print(f"[Fake Logs] {sent * args.processes} lines in {elapsed:.1f}s "
+                          f"({sent * args.processes / elapsed:.0f} lines/s)")
+    finally:
+        sink.close()
+
+
+def _worker(args, worker, results):
+    results.put(run_load(args, worker))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake log generator")
+    parser.add_argument("--rate", type=float,
+                        help="load mode: target lines/s across all processes (0 = as fast as possible)")
+    parser.add_argument("--profile", help="load mode: rate:seconds phases, cycled, e.g. 1000:10,50000:5")
+    parser.add_argument("--seed", type=int, help="seed for reproducible output")
+    parser.add_argument("--start-time", type=float,
+                        help="epoch seconds of the first line; timestamps then advance 1/rate per line")
+    parser.add_argument("--count", type=int, help="stop after this many lines")
+    parser.add_argument("--duration", type=float, help="stop after this many seconds")
+    parser.add_argument("--batch-size", type=int, default=1000, help="lines per write / push")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes (rate is split between them)")
+    parser.add_argument("--output", default=log_file, help="log file to append to")
+    parser.add_argument("--loki-url", help="push to this Loki instead of writing the file")
+    parser.add_argument("--job", default="fake_logs", help="job label for --loki-url")
+    parser.add_argument("--host", default="fake-logs-container", help="host label for --loki-url")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    if args.rate is None and not args.profile:
+        run_classic()
+        return
+
+    args.rate = args.rate or 0.0
+    target = args.profile or (f"{args.rate:g} lines/s" if args.rate else "max rate")
+    print(f"[Fake Logs] Load mode: {target}, {args.processes} process(es) -> {args.loki_url or args.output}")
+    started = time.time()
+    if args.processes == 1:
+        total = run_load(args)
+    else:
+        results = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=_worker, args=(args, i, results))
+                 for i in range(args.processes)]
+        for p in procs:
+            p.start()
+        try:
+            for p in procs:
+                p.join()
+        except KeyboardInterrupt:
+            for p in procs:
+                p.terminate()
+        total = sum(results.get() for p in procs if p.exitcode == 0)
+    elapsed = time.time() - started
+    print(f"[Fake Logs] Done: {total} lines in {elapsed:.1f}s ({total / elapsed:.0f} lines/s)")
+
+
+def run_classic():
+    # Ensure log directory exists
+    os.makedirs("/var/log/fake", exist_ok=True)
+
+    # Configure logging
+    logging.basicConfig(
+        filename=log_file,
+        level=logging.INFO,
+        format=LOG_FORMAT,
+    )
+
     print(f"[Fake Logs] Writing to {log_file}")
     while True:
         logger, level, template = random.choice(log_templates)
@@ -127,3 +323,8 @@ if __name__ == "__main__":
         print(msg)  # Print to stdout for debugging
         time.sleep(random.uniform(0.3, 2.0))
 
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
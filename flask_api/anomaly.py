@@ -0,0 +1,243 @@
+"""
+Streaming spike detection over ingested lines.
+
+AnomalyDetector counts WARNING-and-above lines per template, and ERROR /
+CRITICAL lines per service, in fixed windows of line time (not arrival
+time, so a catch-up backlog is not mistaken for a burst). When a window
+closes, each key's count is compared with an EWMA baseline of its own
+history:
+
+    spike  if  count >= min_count  and  count > mean + threshold * std
+
+with std floored at sqrt(mean) (Poisson noise), and the baseline is then
+updated: a plain running mean / variance for the first windows, then
+exponentially weighted (alpha). Nothing fires during the detector's first
+`warmup` windows; a key first seen after that counts as having been zero
+all along, so a burst of a brand-new error template is flagged at once.
+
+A spike opens an Incident, or extends the open one for the same key; an
+incident resolves after `cooldown` quiet windows. on_incident is called
+once per new incident, which app.py uses to precompute the context bundle
+(and optionally an LLM summary) in the background, so /incidents can serve
+a diagnosis before anyone asks.
+"""
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+
+log = logging.getLogger(__name__)
+
+ALERT_LEVELS = {"WARNING", "ERROR", "CRITICAL"}
+ERROR_LEVELS = {"ERROR", "CRITICAL"}
+
+
+class _Baseline:
+    __slots__ = ("mean", "var", "windows")
+
+    def __init__(self, windows=0):
+        self.mean = 0.0
+        self.var = 0.0
+        self.windows = windows
+
+    def update(self, count, alpha):
+        alpha = max(alpha, 1.0 / (self.windows + 1))
+        diff = count - self.mean
+        self.mean += alpha * diff
+        self.var = (1 - alpha) * (self.var + alpha * diff * diff)
+        self.windows += 1
+
+
+class Incident:
+    """One spike of one key; `context` and `summary` are filled in afterwards."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, key, label, window_start_ns, count, baseline, score, samples):
+        self.id = next(self._ids)
+        self.kind, self.service, self.template_id = key
+        self.label = label
+        self.started_ns = window_start_ns
+        self.last_ns = window_start_ns
+        self.peak = count
+        self.total = count
+        self.baseline = baseline
+        self.score = score
+        self.windows = 1
+        self.quiet = 0
+        self.status = "open"
+        self.samples = list(samples)
+        self.context = None
+        self.summary = None
+        self.detected_at = time.time()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "service": self.service,
+            "template_id": self.template_id,
+            "label": self.label,
+            "status": self.status,
+            "started": self.started_ns // 1_000_000_000,
+            "last_seen": self.last_ns // 1_000_000_000,
+            "detected_at": self.detected_at,
+            "windows": self.windows,
+            "peak": self.peak,
+            "total": self.total,
+            "baseline": round(self.baseline, 2),
+            "score": round(self.score, 1),
+            "samples": self.samples,
+            "context": self.context,
+            "summary": self.summary
+        }
+
+
+class AnomalyDetector:
+    """EWMA spike detection per template and per service, in line-time windows."""
+
+    def __init__(self, window_seconds=10, alpha=0.1, threshold=4.0, min_count=5,
+                 warmup=6, cooldown=6, max_incidents=200, max_samples=5, on_incident=None):
+        self.window_ns = int(window_seconds * 1_000_000_000)
+        self.alpha = alpha
+        self.threshold = threshold
+        self.min_count = min_count
+        self.warmup = warmup
+        self.cooldown = cooldown
+        self.max_incidents = max_incidents
+        self.max_samples = max_samples
+        self.on_incident = on_incident or (lambda incident: None)
+
+        self._windows = {}      # window index -> Counter(key)
+        self._samples = {}      # window index -> {key: [lines]}
+        self._closed = None     # newest closed window index
+        self._age = 0           # windows closed so far
+        self._baselines = {}    # key -> _Baseline
+        self._labels = {}       # key -> display text
+        self._open = {}         # key -> open Incident
+        self._incidents = OrderedDict()  # id -> Incident, oldest first
+        self._lock = threading.Lock()
+
+        self.late_lines = 0
+
+    # ----------------------------------------------------------------
+    # Ingest side
+    # ----------------------------------------------------------------
+    def add_batch(self, entries):
+        """Count (ts_ns, level, service, template_id, template, line) entries."""
+        with self._lock:
+            for ts, level, service, tpl_id, template, line in entries:
+                if level not in ALERT_LEVELS:
+                    continue
+                window = int(ts) // self.window_ns
+                if self._closed is not None and window <= self._closed:
+                    self.late_lines += 1
+                    continue
+                keys = [("template", service, tpl_id)]
+                self._labels.setdefault(keys[0], f"{level} [{service}] {template}")
+                if level in ERROR_LEVELS:
+                    keys.append(("service", service, None))
+                    self._labels.setdefault(keys[1], f"errors in {service}")
+                counts = self._windows.get(window)
+                if counts is None:
+                    counts = self._windows[window] = Counter()
+                    self._samples[window] = {}
+                samples = self._samples[window]
+                for key in keys:
+                    counts[key] += 1
+                    kept = samples.setdefault(key, [])
+                    if len(kept) < self.max_samples:
+                        kept.append(line)
+
+    def flush(self, now_ns=None, grace_windows=1):
+        """
+        Close every window that ended more than grace_windows ago; returns
+        the incidents opened. Call about once per window.
+        """
+        now_ns = now_ns or time.time_ns()
+        last = now_ns // self.window_ns - 1 - grace_windows
+        opened = []
+        with self._lock:
+            if self._closed is None:
+                if not self._windows:
+                    return opened
+                self._closed = min(self._windows) - 1
+            # Long idle gaps: the EWMA converges to zero long before this
+            start = max(self._closed + 1, last - 360)
+            for window in range(start, last + 1):
+                opened.extend(self._close(window))
+            for stale in [w for w in self._windows if w <= last]:
+                self._windows.pop(stale, None)
+                self._samples.pop(stale, None)
+            self._closed = max(self._closed, last)
+        for incident in opened:
+            log.warning("🚨 Incident #%d: %s (%d in %ds, baseline %.1f)", incident.id, incident.label,
+                        incident.peak, self.window_ns // 1_000_000_000, incident.baseline)
+            try:
+                self.on_incident(incident)
+            except Exception as e:
+                log.error("❌ Incident #%d handler failed: %s", incident.id, e)
+        return opened
+
+    def _close(self, window):
+        counts = self._windows.get(window, Counter())
+        samples = self._samples.get(window, {})
+        start_ns = window * self.window_ns
+        opened = []
+
+        for key in set(self._baselines) | set(counts):
+            count = counts.get(key, 0)
+            base = self._baselines.get(key)
+            if base is None:
+                base = self._baselines[key] = _Baseline(self._age)
+            std = max(math.sqrt(base.var), math.sqrt(max(base.mean, 1.0)))
+            spike = (base.windows >= self.warmup and count >= self.min_count
+                     and count > base.mean + self.threshold * std)
+            score = (count - base.mean) / std
+
+            incident = self._open.get(key)
+            if spike:
+                if incident is None:
+                    incident = Incident(key, self._labels.get(key, str(key)), start_ns, count,
+                                        base.mean, score, samples.get(key, ()))
+                    self._open[key] = incident
+                    self._incidents[incident.id] = incident
+                    while len(self._incidents) > self.max_incidents:
+                        self._incidents.popitem(last=False)
+                    opened.append(incident)
+                else:
+                    incident.windows += 1
+                    incident.quiet = 0
+                    incident.last_ns = start_ns
+                    incident.total += count
+                    incident.peak = max(incident.peak, count)
+                    incident.score = max(incident.score, score)
+            elif incident is not None:
+                incident.total += count
+                incident.quiet += 1
+                if incident.quiet >= self.cooldown:
+                    incident.status = "resolved"
+                    del self._open[key]
+            base.update(count, self.alpha)
+        self._age += 1
+        return opened
+
+    # ----------------------------------------------------------------
+    # Read side
+    # ----------------------------------------------------------------
+    def incidents(self, status=None, limit=50):
+        """Newest first, as dicts."""
+        with self._lock:
+            found = [i for i in reversed(self._incidents.values()) if status in (None, i.status)]
+            return [i.to_dict() for i in found[:limit]]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "keys": len(self._baselines),
+                "open": len(self._open),
+                "incidents": len(self._incidents),
+                "late_lines": self.late_lines
+            }
@@ -0,0 +1,154 @@
+"""
+Semantic cache of /chat answers.
+
+A question is looked up first by its normalised text, then by cosine
+similarity of its embedding against the cached questions, so "why are DB
+connections timing out?" and "why do database connections time out" share
+one answer.
+
+An answer is only reused while the logs it was based on are unchanged. Each
+entry records the ingest watermark (newest line timestamp ingested) when it
+was computed and the templates its context drew on; note_ingested() tracks,
+per template, the newest line seen. The entry is stale once one of its
+templates has a newer line, or a template never seen before appears after
+the watermark (something new is happening). Entries also expire after
+`ttl` seconds, since questions like "errors in the last 5 minutes" age on
+their own, and the least recently used are evicted beyond `capacity`.
+
+Only a process that ingests sees new lines, so a cache is created inactive
+(get() always misses, nothing is stored) until that process starts ingesting.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalise(question):
+    return _SPACE_RE.sub(" ", question.strip().lower()).rstrip("?!. ")
+
+
+class _Entry:
+    __slots__ = ("question", "vector", "value", "templates", "watermark", "created_at", "hits")
+
+    def __init__(self, question, vector, value, templates, watermark):
+        self.question = question
+        self.vector = vector
+        self.value = value
+        self.templates = frozenset(templates)
+        self.watermark = watermark
+        self.created_at = time.time()
+        self.hits = 0
+
+
+class AnswerCache:
+    """LRU + TTL answer cache matched by question embedding, invalidated by ingest."""
+
+    def __init__(self, embed, capacity=256, ttl=600.0, threshold=0.92):
+        self.embed = embed  # list of texts -> list of vectors
+        self.capacity = capacity
+        self.ttl = ttl
+        self.threshold = threshold
+        self.active = False
+        self._entries = OrderedDict()  # normalised question -> _Entry
+        self._template_ts = {}         # template_id -> newest ingested line ts
+        self._watermark = 0            # newest ingested line ts overall
+        self._new_template_ts = 0      # ts of the newest first-seen template
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    # ----------------------------------------------------------------
+    # Ingest side
+    # ----------------------------------------------------------------
+    def note_ingested(self, lines):
+        """Record ingested (ts_ns, template_id) pairs."""
+        with self._lock:
+            seen = self._template_ts
+            for ts, tpl_id in lines:
+                ts = int(ts)
+                last = seen.get(tpl_id)
+                if last is None:
+                    self._new_template_ts = max(self._new_template_ts, ts)
+                if last is None or ts > last:
+                    seen[tpl_id] = ts
+                if ts > self._watermark:
+                    self._watermark = ts
+
+    def watermark(self):
+        """Take before gathering context; pass to put() with the result."""
+        return self._watermark
+
+    # ----------------------------------------------------------------
+    # Chat side
+    # ----------------------------------------------------------------
+    def _vector(self, question):
+        vec = np.asarray(self.embed([question])[0], dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def _valid(self, entry, now):
+        if now - entry.created_at > self.ttl:
+            return False
+        if self._new_template_ts > entry.watermark:
+            return False
+        return all(self._template_ts.get(t, 0) <= entry.watermark for t in entry.templates)
+
+    def get(self, question):
+        """(cached value or None, key for put(); None while inactive)."""
+        if not self.active:
+            return None, None
+        key = normalise(question)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+        vector = None
+        if entry is None and self._entries:
+            vector = self._vector(question)
+            with self._lock:
+                best, best_sim = None, self.threshold
+                for candidate in self._entries.values():
+                    sim = float(candidate.vector @ vector)
+                    if sim >= best_sim:
+                        best, best_sim = candidate, sim
+                entry = best
+
+        with self._lock:
+            if entry is not None and not self._valid(entry, now):
+                self._entries.pop(normalise(entry.question), None)
+                self.stale += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None, (key, question, vector)
+            self._entries.move_to_end(normalise(entry.question))
+            entry.hits += 1
+            self.hits += 1
+            return entry.value, None
+
+    def put(self, lookup_key, value, templates, watermark):
+        """Store a freshly computed value under the key get() returned."""
+        key, question, vector = lookup_key
+        if vector is None:
+            vector = self._vector(question)
+        with self._lock:
+            self._entries[key] = _Entry(question, vector, value, templates, watermark)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "watermark": self._watermark
+            }
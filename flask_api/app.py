@@ -1,326 +1,888 @@
 import os
 import time
+import atexit
+import signal
+import logging
 import threading
-import requests
-from flask import Flask, request, jsonify
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-import chromadb
-import hashlib
+
+from anomaly import AnomalyDetector
+from answer_cache import AnswerCache
+from broadcast import Broadcaster, sse_frame
+from chat_engine import ChatEngine, LLMClient
+from context_builder import build_log_context, summarize_metrics
+from cursor import IngestCursor
+from dedup import RecentIds, log_id
+from drain import TemplateEmbeddings, TemplateMiner
+from ingester import (DEFAULT_SELECTOR, LeaderLock, SelectorIngester, cursor_path,
+                      lock_path, parse_selectors)
+from logline import extract_fields, parse_line
+import metrics
+from pipeline import DeadLetterFile, IngestPipeline
+from recent import RecentLogs
+from records import build_meta, stream_labels, where_clause
+from rollups import RollupEngine
+from search_index import SearchIndex, exact_terms, matches_filters, parse_filters, rrf
+from store import PartitionedStore, cloud_database_name, open_client
+from upstream import CircuitOpen, Upstream
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp:generateContent"
+# Point GEMINI_BASE_URL at fake_llm.py to run /chat offline
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp")
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "30"))
 
 LOKI_URL = os.getenv("LOKI_URL", "http://loki:3100")
 PROM_URL = os.getenv("PROM_URL", "http://prometheus:9090")
 
+# "cloud" (ChromaDB Cloud) or "memory" (fake_chroma.py, offline runs and bench/)
+CHROMA_BACKEND = os.getenv("CHROMA_BACKEND", "cloud").lower()
 CHROMA_API_KEY = os.getenv("CHROMA_API_KEY")
 CHROMA_TENANT = os.getenv("CHROMA_TENANT")
 
-db_from_env = os.getenv("CHROMA_DATABASE", "")
-if db_from_env and not db_from_env.endswith(" "):
-    CHROMA_DATABASE = db_from_env + " "
-elif not db_from_env:
-    CHROMA_DATABASE = "Dharmil "
-else:
-    CHROMA_DATABASE = db_from_env
+CHROMA_DATABASE = cloud_database_name(os.getenv("CHROMA_DATABASE", ""))
 
-LOKI_QUERY = '{job="fake_logs"}'
+# LogQL stream selectors to ingest, separated by ';'; each keeps its own cursor
+LOKI_SELECTORS = parse_selectors(os.getenv("LOKI_SELECTORS", DEFAULT_SELECTOR))
 STREAM_POLL_INTERVAL = 3.0
 
+# "auto" serves the API and ingests if this process wins the per-host leader
+# lock (other gunicorn workers stand by and take over if it dies); "api" only
+# serves; "ingest" is what ingester.py runs as. Streams are split over
+# INGEST_SHARDS by label hash, and this process ingests shard INGEST_SHARD.
+# Rollups, incidents, templates and the live feed exist only in a process
+# that ingests; others answer those endpoints with 503.
+INGEST_ROLE = os.getenv("INGEST_ROLE", "auto").lower()
+INGEST_SHARDS = int(os.getenv("INGEST_SHARDS", "1"))
+INGEST_SHARD = int(os.getenv("INGEST_SHARD", "0"))
+INGEST_LEADER_RETRY = float(os.getenv("INGEST_LEADER_RETRY", "5"))
+
+# "tail" holds a WebSocket open to Loki and falls back to polling if that fails,
+# trying the tail again every TAIL_RETRY seconds
+INGEST_MODE = os.getenv("INGEST_MODE", "tail").lower()
+TAIL_MAX_BACKOFF = float(os.getenv("TAIL_MAX_BACKOFF", "30"))
+TAIL_MAX_FAILURES = int(os.getenv("TAIL_MAX_FAILURES", "5"))
+TAIL_RETRY = float(os.getenv("TAIL_RETRY", "300"))
+
+# Catch-up pages through query_range until it reaches "now"; a page whose
+# lines all share one timestamp is asked for again with up to
+# CATCHUP_MAX_PAGE_SIZE lines (Loki's max_entries_limit_per_query)
+CATCHUP_PAGE_SIZE = int(os.getenv("CATCHUP_PAGE_SIZE", "1000"))
+CATCHUP_MAX_PAGE_SIZE = int(os.getenv("CATCHUP_MAX_PAGE_SIZE", "5000"))
+
+# Each stream keeps its own watermark; a line arriving up to INGEST_LATENESS
+# seconds behind the newest one ingested (e.g. another host's, via tail) is
+# still taken, and queries restart that far back at most
+INGEST_LATENESS = float(os.getenv("INGEST_LATENESS", "30"))
+STATE_DIR = os.getenv("INGEST_STATE_DIR", "./state")
+
+# IDs of recently upserted lines, so re-read entries never reach ChromaDB
+DEDUP_CAPACITY = int(os.getenv("DEDUP_CAPACITY", "50000"))
+
+# Fetching and upserting run in separate stages joined by a bounded queue;
+# upsert batches close at UPSERT_BATCH_SIZE lines, UPSERT_BATCH_BYTES or
+# UPSERT_MAX_LATENCY seconds, whichever comes first
+UPSERT_WORKERS = int(os.getenv("UPSERT_WORKERS", "2"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "10000"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "250"))
+UPSERT_BATCH_BYTES = int(os.getenv("UPSERT_BATCH_BYTES", str(512 * 1024)))
+UPSERT_MAX_LATENCY = float(os.getenv("UPSERT_MAX_LATENCY", "0.25"))
+
+# A batch still failing after UPSERT_MAX_ATTEMPTS tries (~2 minutes of
+# backoff) is written to a dead-letter file under INGEST_STATE_DIR instead of
+# stalling every later cursor save; replay it with backfill.py --dead-letter
+UPSERT_MAX_ATTEMPTS = int(os.getenv("UPSERT_MAX_ATTEMPTS", "10"))
+
+# Lines are mined into templates at ingest; with TEMPLATE_EMBEDDINGS on, each
+# template is embedded once and that vector is reused for all of its lines
+TEMPLATE_SIMILARITY = float(os.getenv("TEMPLATE_SIMILARITY", "0.5"))
+TEMPLATE_EMBEDDINGS = os.getenv("TEMPLATE_EMBEDDINGS", "1") == "1"
+CHAT_MAX_PER_TEMPLATE = 3
+
+# /chat fuses vector search with a local BM25 index over the newest lines
+SEARCH_INDEX_SIZE = int(os.getenv("SEARCH_INDEX_SIZE", "20000"))
+CHAT_RESULTS = 15
+CHAT_WORKERS = int(os.getenv("CHAT_WORKERS", "8"))
+
+# Retrieved lines are collapsed by template and trimmed to this many
+# (estimated) prompt tokens
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "1200"))
+
+# /chat answers are reused for the same or a similar question (cosine >=
+# ANSWER_CACHE_SIMILARITY) until a line of one of the templates they drew on,
+# or a new template, is ingested; ANSWER_CACHE_SIZE=0 turns the cache off
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "600"))
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))
+
+# Vector store is split into time-bucket collections; expired buckets are
+# dropped whole
+STORE_BUCKET_SECONDS = int(os.getenv("STORE_BUCKET_SECONDS", "3600"))
+STORE_RETENTION_HOURS = float(os.getenv("STORE_RETENTION_HOURS", "24"))
+
+# Per-minute counts / field sketches kept in memory for /aggregate, and how
+# far back the chat prompt's volume summary looks by default
+ROLLUP_MINUTES = int(os.getenv("ROLLUP_MINUTES", "1440"))
+CHAT_ROLLUP_MINUTES = 15
+
+# Spike detection on WARNING+ lines per template and ERROR lines per service,
+# in ANOMALY_WINDOW-second windows against an EWMA baseline. Each incident's
+# context (and, with ANOMALY_SUMMARIES=1, an LLM summary) is prepared in the
+# background for /incidents
+ANOMALY_WINDOW = float(os.getenv("ANOMALY_WINDOW", "10"))
+ANOMALY_THRESHOLD = float(os.getenv("ANOMALY_THRESHOLD", "4"))
+ANOMALY_MIN_COUNT = int(os.getenv("ANOMALY_MIN_COUNT", "5"))
+ANOMALY_SUMMARIES = os.getenv("ANOMALY_SUMMARIES", "1" if GEMINI_API_KEY else "0") == "1"
+
+# /logs is served from this many recently ingested lines
+RECENT_LOGS_SIZE = int(os.getenv("RECENT_LOGS_SIZE", "5000"))
+
+# /stream (SSE): per-client buffer in events, and how often counters are pushed
+SSE_CLIENT_BUFFER = int(os.getenv("SSE_CLIENT_BUFFER", "256"))
+SSE_STATS_INTERVAL = float(os.getenv("SSE_STATS_INTERVAL", "1.0"))
+
+# Outbound HTTP: retries per call (with jittered backoff), and consecutive
+# failures before a backend's circuit opens / seconds before it is retried
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "2"))
+UPSTREAM_BREAKER_FAILURES = int(os.getenv("UPSTREAM_BREAKER_FAILURES", "5"))
+UPSTREAM_BREAKER_RESET = float(os.getenv("UPSTREAM_BREAKER_RESET", "15"))
+
+# On SIGTERM, queued lines get this long to be upserted before exiting
+# (keep it under the orchestrator's grace period, 10s for docker stop)
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "8"))
+
+# DEBUG shows per-batch ingest detail; WARNING or higher keeps the hot path quiet
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+PORT = int(os.getenv("PORT", "5000"))
+logging.basicConfig(
+    level=LOG_LEVEL,
+    format="%(asctime)s [%(levelname)s] [%(name)s] %(message)s"
+)
+log = logging.getLogger("flask-api")
+
 app = Flask(__name__)
 CORS(app)
 
+# One keep-alive pool per backend; health is learned from these calls
+loki = Upstream("loki", LOKI_URL, timeout=15, retries=UPSTREAM_RETRIES,
+                failure_threshold=UPSTREAM_BREAKER_FAILURES, reset_timeout=UPSTREAM_BREAKER_RESET)
+prometheus = Upstream("prometheus", PROM_URL, timeout=5, retries=UPSTREAM_RETRIES,
+                      failure_threshold=UPSTREAM_BREAKER_FAILURES, reset_timeout=UPSTREAM_BREAKER_RESET)
+gemini = Upstream("gemini", GEMINI_BASE_URL, timeout=GEMINI_TIMEOUT, retries=1,
+                  failure_threshold=UPSTREAM_BREAKER_FAILURES, reset_timeout=UPSTREAM_BREAKER_RESET)
+UPSTREAMS = (loki, prometheus, gemini)
 
-print("\n" + "="*70)
-print("🔵 Connecting to ChromaDB Cloud...")
-print(f"   Tenant: {CHROMA_TENANT}")
-print(f"   Database: '{CHROMA_DATABASE}' (length: {len(CHROMA_DATABASE)})")
-print("="*70)
+# Connected in the background by create_app(); until then /readyz is 503 and
+# /chat answers from the local index only
+logs_store = None
+embedding_fn = None
+_ready = threading.Event()
+_init_error = None
+_started = False
+_start_lock = threading.Lock()
 
-try:
-    client = chromadb.CloudClient(
-        api_key=CHROMA_API_KEY,
-        tenant=CHROMA_TENANT,
-        database=CHROMA_DATABASE
-    )
-    
-    logs_col = client.get_or_create_collection(
-        name="system_logs",
-        metadata={"description": "System logs from observability stack"}
-    )
-    
-    print(f"✅ ChromaDB Connected!")
-    print(f"   Collection: {logs_col.name}")
-    print(f"   Current count: {logs_col.count()}")
-    print("="*70 + "\n")
-    
-except Exception as e:
-    print(f"❌ ChromaDB Connection Failed: {e}")
-    raise
-
-_last_ts = str(int((time.time() - 600) * 1_000_000_000))  # Start 10 minutes ago
 _total_added = 0
 _total_processed = 0
+_total_deduped = 0
+_recent_ids = RecentIds(DEDUP_CAPACITY)
+# Dead-lettered IDs are not marked as seen, so a later re-read stores them
+_dead_lettered_ids = RecentIds(DEDUP_CAPACITY)
+_stats_lock = threading.Lock()
+_miner = TemplateMiner(similarity=TEMPLATE_SIMILARITY)
+_template_embeddings = TemplateEmbeddings(None)
+_recent_logs = RecentLogs(RECENT_LOGS_SIZE)
+_search_index = SearchIndex(SEARCH_INDEX_SIZE)
+_rollups = RollupEngine(ROLLUP_MINUTES)
+_broadcaster = Broadcaster(SSE_CLIENT_BUFFER)
+_detector = AnomalyDetector(
+    window_seconds=ANOMALY_WINDOW,
+    threshold=ANOMALY_THRESHOLD,
+    min_count=ANOMALY_MIN_COUNT,
+    on_incident=lambda incident: _incident_pool.submit(prepare_incident, incident)
+)
+_incident_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="incident")
+_answer_cache = AnswerCache(None, ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_CACHE_SIMILARITY)
+_last_stats_event = 0.0
 _streamer_running = True
-_last_fetch_time = None
+_leader_lock = LeaderLock(lock_path(STATE_DIR, INGEST_SHARD, INGEST_SHARDS))
+_committed_ts = {}  # cursor path -> newest upserted timestamp
+_dead_letters = DeadLetterFile(os.path.join(
+    STATE_DIR, "dead_letter.jsonl" if INGEST_SHARDS <= 1 else
+    f"dead_letter-shard{INGEST_SHARD}of{INGEST_SHARDS}.jsonl"))
 
-def generate_unique_id(timestamp, log_line, index):
-    """Generate truly unique ID"""
-    content = f"{timestamp}_{log_line}_{index}_{time.time()}"
-    return hashlib.sha256(content.encode()).hexdigest()[:32]
+def upsert_batch(ids, docs, metas):
+    """Upsert worker sink: one batch into ChromaDB (raises so the pipeline retries)."""
+    global _total_added
 
-def stream_logs():
-    global _last_ts, _total_added, _total_processed, _last_fetch_time
-    
-    print("\n" + "="*70)
-    print("🔄 STARTING LOG STREAMER")
-    print(f"   Loki URL: {LOKI_URL}")
-    print(f"   Query: {LOKI_QUERY}")
-    print(f"   Poll Interval: {STREAM_POLL_INTERVAL}s")
-    print(f"   Starting from: {_last_ts}")
-    print("="*70 + "\n")
-    
-    poll_count = 0
-    consecutive_errors = 0
-    
+    started = time.perf_counter()
+    try:
+        embeddings = _template_embeddings.for_batch(metas, docs) if TEMPLATE_EMBEDDINGS else None
+
+        # Use upsert to handle any duplicates; routed to time buckets
+        logs_store.upsert(
+            ids=ids,
+            documents=docs,
+            metadatas=metas,
+            embeddings=embeddings
+        )
+    except Exception:
+        metrics.UPSERT_FAILURES.inc()
+        raise
+    metrics.UPSERT_SECONDS.observe(time.perf_counter() - started)
+    metrics.UPSERT_BATCH_SIZE.observe(len(ids))
+    metrics.LINES_INGESTED.inc(len(ids))
+
+    with _stats_lock:
+        _total_added += len(ids)
+    log.debug("✅ Upserted %d logs to ChromaDB (session total: %d)", len(ids), _total_added)
+    publish_stats()
+
+def dead_letter(records, error):
+    """Keep records the store keeps rejecting so they can be replayed later."""
+    metrics.DEAD_LETTERED.inc(len(records))
+    _dead_lettered_ids.add([r[0] for r in records])
+    _dead_letters(records, error)
+    log.error("💀 %d logs written to %s; replay with: python backfill.py --dead-letter %s",
+              len(records), _dead_letters.path, _dead_letters.path)
+
+def streamer_stats():
+    """Counters pushed to /stream clients; no ChromaDB round trip needed."""
+    return {
+        "chromadb_count": logs_store.count() if logs_store is not None else 0,
+        "logs_added": _total_added,
+        "logs_processed": _total_processed,
+        "logs_deduped": _total_deduped,
+        "last_fetch": last_fetch_time(),
+        "cursor_ts": cursor_ts()
+    }
+
+def publish_stats(force=False):
+    """Push counters to SSE clients at most every SSE_STATS_INTERVAL seconds."""
+    global _last_stats_event
+    now = time.time()
+    if not force and now - _last_stats_event < SSE_STATS_INTERVAL:
+        return
+    _last_stats_event = now
+    _broadcaster.publish("stats", streamer_stats())
+
+def save_cursor(cursor, state, lines=()):
+    """
+    Persist a cursor snapshot once everything before it has been upserted;
+    `lines` ((ts, template_id) of the batch) are now queryable, so answers
+    built on those templates go stale.
+    """
+    _answer_cache.note_ingested(lines)
+    _committed_ts[cursor.path] = state["ts"]
+    try:
+        cursor.save(state)
+    except OSError as e:
+        log.warning("⚠️  Could not persist cursor to %s: %s", cursor.path, e)
+
+def commit_unit(cursor, state, ids, lines):
+    """on_commit of one queued unit: mark its stored IDs as seen, then save the cursor."""
+    _recent_ids.add([i for i in ids if i not in _dead_lettered_ids])
+    save_cursor(cursor, state, lines)
+
+def ingest_streams(results, cursor, owns=None):
+    """
+    Queue the not-yet-ingested entries of a list of Loki streams for upsert.
+
+    The cursor moves over every stream in `results`; only the streams that
+    `owns(labels)` accepts (this process's shard) are stored.
+    """
+    global _total_processed, _total_deduped
+
+    fresh = cursor.select_new(results)
+    new_records = []
+    new_entries = []
+    alerts = []
+
+    for stream in fresh:
+        labels = stream.get("stream", {})
+        values = stream.get("values", [])
+        if owns is not None and not owns(labels):
+            continue
+
+        ids = [log_id(labels, ts, log_line) for ts, log_line in values]
+        unseen = _recent_ids.unseen(ids)
+        dropped = unseen.count(False)
+        with _stats_lock:
+            _total_deduped += dropped
+        metrics.DEDUP_DROPS.inc(dropped)
+
+        for (ts, log_line), unique_id, keep in zip(values, ids, unseen):
+            # Same labels + timestamp + line means we already stored it
+            if not keep:
+                continue
+
+            tpl_id, template, params = _miner.add(log_line)
+            level, service, message = parse_line(log_line)
+            _rollups.add(ts, level, service, message, tpl_id, template)
+            alerts.append((ts, level, service, tpl_id, template, log_line))
+            new_entries.append((ts, log_line, labels))
+
+            meta = build_meta(labels, ts, (tpl_id, template, params), log_line)
+            new_records.append((unique_id, log_line, meta))
+            _search_index.add(unique_id, log_line, ts, meta)
+
+    # The in-memory cursor moves as soon as lines are queued so the next
+    # fetch does not re-read them; the on-disk cursor, and the IDs marked as
+    # seen, only follow once the pipeline confirms they were upserted.
+    _recent_logs.extend(new_entries)
+    _detector.add_batch(alerts)
+    if new_entries:
+        _broadcaster.publish("logs", {
+            "cursor": _recent_logs.latest,
+            "result": _recent_logs.as_streams((0, ts, line, labels) for ts, line, labels in new_entries)
+        })
+    cursor.advance(fresh)
+    snapshot = cursor.to_dict()
+
+    with _stats_lock:
+        _total_processed += len(new_records)
+    if new_records:
+        log.debug("📦 Queued %d new logs for upsert (queue: %d, skipped duplicates: %d)",
+                  len(new_records), _pipeline.qsize(), _total_deduped)
+
+    # Blocks while the upsert queue is full, which slows fetching down
+    lines = [(m["timestamp"], m["template_id"]) for _, _, m in new_records]
+    ids = [r[0] for r in new_records]
+    _pipeline.submit(new_records, on_commit=lambda: commit_unit(cursor, snapshot, ids, lines))
+    return True
+
+_pipeline = IngestPipeline(
+    upsert_batch,
+    workers=UPSERT_WORKERS,
+    max_queue=INGEST_QUEUE_SIZE,
+    batch_size=UPSERT_BATCH_SIZE,
+    batch_bytes=UPSERT_BATCH_BYTES,
+    max_latency=UPSERT_MAX_LATENCY,
+    max_attempts=UPSERT_MAX_ATTEMPTS,
+    dead_letter=dead_letter
+)
+
+# One loop per selector, each resuming from its own persisted cursor; a
+# fresh install starts 10 minutes ago
+_ingesters = [
+    SelectorIngester(
+        loki,
+        LOKI_URL,
+        selector,
+        IngestCursor.load(cursor_path(STATE_DIR, selector, INGEST_SHARD, INGEST_SHARDS),
+                          default_ts=int((time.time() - 600) * 1_000_000_000),
+                          lateness_ns=int(INGEST_LATENESS * 1_000_000_000)),
+        ingest=ingest_streams,
+        is_running=lambda: _streamer_running,
+        shard=INGEST_SHARD,
+        shards=INGEST_SHARDS,
+        mode=INGEST_MODE,
+        page_size=CATCHUP_PAGE_SIZE,
+        max_page_size=CATCHUP_MAX_PAGE_SIZE,
+        poll_interval=STREAM_POLL_INTERVAL,
+        tail_max_backoff=TAIL_MAX_BACKOFF,
+        tail_max_failures=TAIL_MAX_FAILURES,
+        tail_retry=TAIL_RETRY
+    )
+    for selector in LOKI_SELECTORS
+]
+for _ingester in _ingesters:
+    _committed_ts[_ingester.cursor.path] = _ingester.cursor.ts
+
+def last_fetch_time():
+    fetched = [i.last_fetch for i in _ingesters if i.last_fetch]
+    return max(fetched) if fetched else None
+
+def cursor_ts():
+    """Oldest in-memory cursor across selectors."""
+    return min(i.cursor.ts for i in _ingesters)
+
+def ingest_status():
+    return {
+        "role": INGEST_ROLE,
+        "leader": _leader_lock.held,
+        "shard": INGEST_SHARD,
+        "shards": INGEST_SHARDS,
+        "selectors": [
+            {"selector": i.selector, "cursor_ts": i.cursor.ts, "last_fetch": i.last_fetch}
+            for i in _ingesters
+        ]
+    }
+
+def prepare_incident(incident):
+    """Background: build the context bundle (and optional LLM summary) for a new incident."""
+    window_ns = int(ANOMALY_WINDOW * 1_000_000_000)
+    since_ns = incident.started_ns - 10 * 60_000_000_000
+    until_ns = incident.last_ns + window_ns
+    activity = _rollups.aggregate(since_ns, until_ns, services={incident.service},
+                                  levels={"WARNING", "ERROR", "CRITICAL"}, group_by=("level", "template"))
+    others = [i["label"] for i in _detector.incidents(status="open") if i["id"] != incident.id]
+
+    lines = [
+        f"Spike: {incident.label}",
+        f"{incident.peak} lines in {ANOMALY_WINDOW:g}s at "
+        f"{time.strftime('%H:%M:%S', time.gmtime(incident.started_ns / 1e9))} UTC "
+        f"(baseline {incident.baseline:.1f} per window)",
+        f"{incident.service} warnings/errors over the last 10 min:"
+    ]
+    lines.extend(f"  {r['count']}x {r['level']} {r['template_text']}" for r in activity["groups"][:8])
+    lines.extend(f"  {f['field']}: p50={f['p50']:g} p99={f['p99']:g} max={f['max']:g} (n={f['count']})"
+                 for f in activity["fields"])
+    if others:
+        lines.append("Other open incidents: " + "; ".join(others[:5]))
+    lines.append("Sample lines:")
+    lines.extend(f"  {l}" for l in incident.samples)
+    incident.context = "\n".join(lines)
+    metrics.INCIDENTS.labels(incident.kind).inc()
+
+    if ANOMALY_SUMMARIES:
+        prompt = f"""You are an observability AI assistant. An anomaly was just detected.
+
+{incident.context}
+
+In a few sentences: the likely cause, the impact, and what to check first."""
+        try:
+            incident.summary = _chat_engine.llm.generate(prompt)
+        except Exception as e:
+            log.warning("⚠️  Incident #%d: summary failed: %s", incident.id, e)
+    _broadcaster.publish("incident", incident.to_dict())
+
+def run_detector():
+    """Close anomaly windows as line time passes; runs alongside ingestion."""
     while _streamer_running:
+        time.sleep(ANOMALY_WINDOW)
         try:
-            poll_count += 1
-            current_time = int(time.time() * 1_000_000_000)
-            
-            # Check Loki connectivity first
-            try:
-                health_check = requests.get(f"{LOKI_URL}/ready", timeout=3)
-                if health_check.status_code != 200:
-                    print(f"⚠️  Poll #{poll_count}: Loki not ready (status: {health_check.status_code})")
-                    time.sleep(STREAM_POLL_INTERVAL)
-                    continue
-            except Exception as e:
-                print(f"⚠️  Poll #{poll_count}: Cannot reach Loki: {e}")
-                consecutive_errors += 1
-                if consecutive_errors <= 3:
-                    print(f"   💡 Make sure Loki container is running: docker-compose ps loki")
-                time.sleep(STREAM_POLL_INTERVAL)
-                continue
-            
-            params = {
-                "query": LOKI_QUERY,
-                "start": _last_ts,
-                "end": str(current_time),
-                "limit": 1000,
-                "direction": "forward"
-            }
-            
-            print(f"\n📡 Poll #{poll_count}: Fetching logs from Loki...")
-            print(f"   Time range: {_last_ts} to {current_time}")
-            
-            res = requests.get(
-                f"{LOKI_URL}/loki/api/v1/query_range",
-                params=params,
-                timeout=15
+            _detector.flush()
+        except Exception as e:
+            log.exception("❌ Anomaly detector flush failed: %s", e)
+
+def run_ingest():
+    """Wait to become this host's ingester for our shard, then start one loop per selector."""
+    announced = False
+    while _streamer_running and not _leader_lock.acquire():
+        if not announced:
+            log.info("⏸️  %s is held by another process; serving API only until it is released",
+                     _leader_lock.path)
+            announced = True
+        time.sleep(INGEST_LEADER_RETRY)
+    if not _streamer_running:
+        return
+
+    log.info("👑 Ingesting shard %d/%d in pid %d (%d selector(s), lock %s)",
+             INGEST_SHARD, INGEST_SHARDS, os.getpid(), len(_ingesters), _leader_lock.path)
+    _pipeline.start()
+    if INGEST_SHARD == 0:
+        # One-shot move of the single collection older versions wrote to
+        threading.Thread(target=logs_store.migrate_legacy, name="migrate", daemon=True).start()
+    _answer_cache.active = ANSWER_CACHE_SIZE > 0
+    for n, ingester in enumerate(_ingesters):
+        threading.Thread(target=ingester.run, name=f"ingest-{n}", daemon=True).start()
+    threading.Thread(target=run_detector, name="anomaly", daemon=True).start()
+
+def stop_ingest(timeout=SHUTDOWN_TIMEOUT):
+    """Stop fetching, let queued lines be upserted (saving cursors), then release the lock."""
+    global _streamer_running
+    _streamer_running = False
+    if not _leader_lock.held:
+        return
+    deadline = time.time() + timeout
+    while _pipeline.in_flight() and time.time() < deadline:
+        time.sleep(0.2)
+    _pipeline.stop(max(0.0, deadline - time.time()))
+    left = _pipeline.in_flight()
+    if left:
+        # Their cursor snapshots were never saved, so a restart re-reads them
+        log.warning("⚠️  %d queued lines not upserted before shutdown; they will be re-read", left)
+    _leader_lock.release()
+    log.info("✅ Ingest stopped, saved cursors at %s", dict(_committed_ts))
+
+def connect_store():
+    """Open the vector store (retrying with backoff), then start ingesting."""
+    global logs_store, embedding_fn, _init_error
+    delay = 1.0
+    while _streamer_running:
+        try:
+            client, fn = open_client(CHROMA_BACKEND, CHROMA_API_KEY, CHROMA_TENANT, CHROMA_DATABASE)
+            store = PartitionedStore(
+                client,
+                prefix="system_logs",
+                bucket_seconds=STORE_BUCKET_SECONDS,
+                retention_seconds=int(STORE_RETENTION_HOURS * 3600),
+                embedding_function=fn,
+                metadata={"description": "System logs from observability stack"}
             )
-            
-            _last_fetch_time = time.time()
-            
-            if res.status_code != 200:
-                print(f"❌ Poll #{poll_count}: Loki error {res.status_code}: {res.text[:200]}")
-                time.sleep(STREAM_POLL_INTERVAL)
-                continue
-            
-            data = res.json()
-            results = data.get("data", {}).get("result", [])
-            
-            print(f"   Received {len(results)} streams from Loki")
-            
-            if not results:
-                print(f"   ⏳ No new logs. ChromaDB count: {logs_col.count()}")
-                if poll_count == 1:
-                    print(f"   💡 Check if fake-logs container is running and generating logs")
-                    print(f"   💡 Check Promtail: docker-compose logs promtail | tail -20")
-                consecutive_errors = 0
-                time.sleep(STREAM_POLL_INTERVAL)
-                continue
-            
-            new_docs, new_metas, new_ids = [], [], []
-            max_ts = None
-            
-            for stream_idx, stream in enumerate(results):
-                labels = stream.get("stream", {})
-                values = stream.get("values", [])
-                
-                print(f"   📦 Stream {stream_idx+1}: {len(values)} log entries, labels: {labels}")
-                
-                for value_idx, (ts, log_line) in enumerate(values):
-                    ts_int = int(ts)
-                    
-                    # Skip if already processed
-                    if ts_int <= int(_last_ts):
-                        continue
-                    
-                    # Generate unique ID with multiple factors
-                    unique_id = generate_unique_id(ts, log_line, len(new_ids))
-                    
-                    new_ids.append(unique_id)
-                    new_docs.append(log_line)
-                    new_metas.append({
-                        "timestamp": ts,
-                        "job": labels.get("job", "unknown"),
-                        "labels": str(labels),
-                        "processed_at": str(int(time.time())),
-                        "stream_index": str(stream_idx),
-                        "value_index": str(value_idx)
-                    })
-                    
-                    if max_ts is None or ts_int > int(max_ts):
-                        max_ts = ts
-            
-            if new_docs:
-                _total_processed += len(new_docs)
-                
-                print(f"\n   💾 Attempting to add {len(new_docs)} logs to ChromaDB...")
-                
-                try:
-                    # Use upsert to handle any duplicates
-                    logs_col.upsert(
-                        ids=new_ids,
-                        documents=new_docs,
-                        metadatas=new_metas
-                    )
-                    
-                    _total_added += len(new_docs)
-                    current_count = logs_col.count()
-                    
-                    print(f"   ✅ SUCCESS! Added {len(new_docs)} logs to ChromaDB")
-                    print(f"   📊 Stats:")
-                    print(f"      - Session processed: {_total_processed}")
-                    print(f"      - Session added: {_total_added}")
-                    print(f"      - ChromaDB total: {current_count}")
-                    print(f"      - Sample log: {new_docs[0][:100]}...")
-                    
-                    consecutive_errors = 0
-                    
-                except Exception as e:
-                    print(f"   ❌ ChromaDB upsert failed: {e}")
-                    print(f"      Error type: {type(e).__name__}")
-                    consecutive_errors += 1
-            else:
-                print(f"   ⚠️  All logs were duplicates (already processed)")
-            
-            # Update timestamp
-            if max_ts:
-                _last_ts = str(int(max_ts) + 1)
-                print(f"   🕐 Updated last timestamp to: {_last_ts}")
-            
+            log.info("✅ ChromaDB connected: %d bucket(s) of %ds, current count %d",
+                     len(store.buckets()), STORE_BUCKET_SECONDS, store.count())
+            break
         except Exception as e:
-            print(f"\n❌ Poll #{poll_count}: Unexpected error: {e}")
-            print(f"   Error type: {type(e).__name__}")
-            consecutive_errors += 1
-        
-        time.sleep(STREAM_POLL_INTERVAL)
+            _init_error = str(e)
+            log.error("❌ ChromaDB connection failed (retrying in %.0fs): %s", delay, e)
+            time.sleep(delay)
+            delay = min(delay * 2, 60.0)
+    else:
+        return
+
+    embedding_fn = fn
+    _template_embeddings.embedding_function = fn
+    _answer_cache.embed = fn
+    logs_store = store
+    _init_error = None
+    _ready.set()
+
+    # Only one process per host (and shard) ingests; the rest serve requests
+    if INGEST_ROLE == "api":
+        log.info("🌐 INGEST_ROLE=api: not ingesting")
+    else:
+        run_ingest()
 
-# Start streamer thread
-streamer_thread = threading.Thread(target=stream_logs, daemon=True)
-streamer_thread.start()
-print("✅ Streamer thread started\n")
+def create_app():
+    """
+    The Flask app, with backend initialisation started in the background
+    (once per process): the port is served at once, /livez is 200 from the
+    start and /readyz once the vector store is connected. Queued ingest is
+    drained at interpreter exit.
+
+        gunicorn -w 4 -b 0.0.0.0:5000 'app:create_app()'
+    """
+    global _started
+    with _start_lock:
+        if not _started:
+            _started = True
+            threading.Thread(target=connect_store, name="init", daemon=True).start()
+            atexit.register(stop_ingest)
+    return app
+
+def _terminate(signum, frame):
+    log.info("⏹️  Received signal %d, draining ingest before exit", signum)
+    stop_ingest()
+    raise SystemExit(0)
+
+# Scrape-time gauges over in-process state
+metrics.INGEST_LAG.set_function(
+    lambda: max(0.0, time.time() - min(_committed_ts.values()) / 1e9) if _leader_lock.held else 0.0)
+metrics.QUEUE_DEPTH.set_function(_pipeline.in_flight)
+metrics.SSE_CLIENTS.set_function(lambda: len(_broadcaster))
+for _upstream in UPSTREAMS:
+    metrics.UPSTREAM_UP.labels(_upstream.name).set_function(
+        lambda u=_upstream: 1.0 if u.healthy else 0.0)
 
 # ==============================================================
 # 📊 ROUTES
 # ==============================================================
 
+@app.route("/livez", methods=["GET"])
+def livez():
+    """Liveness: the process is up and serving requests."""
+    return jsonify({"status": "ok"})
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    """Readiness: 200 once the vector store is connected, 503 until then."""
+    body = {
+        "status": "ready" if _ready.is_set() else "starting",
+        "ingesting": _leader_lock.held,
+        "error": _init_error
+    }
+    return jsonify(body), 200 if _ready.is_set() else 503
+
 @app.route("/health", methods=["GET"])
 def health():
     """Health check endpoint"""
+    if logs_store is None:
+        return jsonify({"status": "starting", "error": _init_error}), 503
     try:
+        # Tracked per-bucket counts: polled often, so no per-bucket round trips
+        logs_store.refresh()
         return jsonify({
             "status": "ok",
-            "chromadb_count": logs_col.count(),
+            "chromadb_count": logs_store.count(),
+            "chromadb_buckets": len(logs_store.buckets()),
             "logs_processed": _total_processed,
             "logs_added": _total_added,
-            "streamer_running": _streamer_running,
-            "last_fetch": _last_fetch_time
+            "logs_deduped": _total_deduped,
+            "streamer_running": _streamer_running and _leader_lock.held,
+            "last_fetch": last_fetch_time(),
+            "cursor_ts": cursor_ts(),
+            "ingest": ingest_status(),
+            "upstreams": {u.name: u.health() for u in UPSTREAMS}
         })
     except Exception as e:
         return jsonify({"status": "error", "error": str(e)}), 500
 
-@app.route("/logs", methods=["GET"])
-def get_logs():
+def local_views():
+    """True if this process ingests, so its rollups, detector, log buffer and feed are live"""
+    return _leader_lock.held
+
+def views_unavailable(what):
+    """503 for views that only the ingesting process has, instead of empty data"""
+    return jsonify({
+        "error": f"{what} is only available from the ingesting process; this one "
+                 f"does not ingest (INGEST_ROLE={INGEST_ROLE}, or a standby worker)",
+        "ingesting": False
+    }), 503
+
+def logs_from_loki(limit):
     """Fetch logs directly from Loki"""
     try:
-        limit = request.args.get("limit", 100, type=int)
-        
         # Get last hour of logs
         end_time = int(time.time() * 1_000_000_000)
         start_time = end_time - (3600 * 1_000_000_000)  # 1 hour ago
         
-        params = {
-            "query": LOKI_QUERY,
-            "limit": limit,
-            "start": str(start_time),
-            "end": str(end_time),
-            "direction": "backward"  # Get newest first
-        }
-        
-        print(f"\n🌐 /logs endpoint called (limit={limit})")
+        log.info("🌐 /logs served from Loki (limit=%d, no local ingest buffer yet)", limit)
         
-        res = requests.get(
-            f"{LOKI_URL}/loki/api/v1/query_range",
-            params=params,
-            timeout=10
-        )
+        # Streams of every ingested selector, merged into one response
+        data = None
+        for selector in LOKI_SELECTORS:
+            params = {
+                "query": selector,
+                "limit": limit,
+                "start": str(start_time),
+                "end": str(end_time),
+                "direction": "backward"  # Get newest first
+            }
+            res = loki.get("/loki/api/v1/query_range", params=params, timeout=10)
+            
+            if res.status_code != 200:
+                log.error("❌ Loki error: %d", res.status_code)
+                return jsonify({
+                    "error": f"Loki returned status {res.status_code}",
+                    "details": res.text
+                }), res.status_code
+            
+            page = res.json()
+            if data is None:
+                data = page
+            else:
+                data.setdefault("data", {}).setdefault("result", []).extend(
+                    page.get("data", {}).get("result", []))
         
-        if res.status_code == 200:
-            data = res.json()
-            result_count = len(data.get("data", {}).get("result", []))
-            print(f"   ✅ Returned {result_count} streams from Loki")
-            return jsonify(data)
-        else:
-            print(f"   ❌ Loki error: {res.status_code}")
-            return jsonify({
-                "error": f"Loki returned status {res.status_code}",
-                "details": res.text
-            }), res.status_code
+        result_count = len(data.get("data", {}).get("result", []))
+        log.debug("✅ Returned %d streams from Loki", result_count)
+        return jsonify(data)
             
     except Exception as e:
-        print(f"   ❌ Error: {e}")
+        log.error("❌ Error: %s", e)
         return jsonify({"error": str(e)}), 500
 
+def arg_set(name):
+    """Values of a comma-separated query parameter as a set, or None if absent"""
+    return {v for v in request.args.get(name, "").split(",") if v} or None
+
+def logs_from_store(limit):
+    """Lines matching /logs filters, pushed down to the vector store as a where clause"""
+    if logs_store is None:
+        return jsonify({"error": "ChromaDB not connected yet"}), 503
+    
+    start = request.args.get("start", type=int)
+    end = request.args.get("end", type=int)
+    where = where_clause(
+        levels={l.upper() for l in arg_set("level") or ()} or None,
+        services=arg_set("service"),
+        since_ns=start,
+        until_ns=end,
+        fields=extract_fields(" ".join(request.args.getlist("field")), latency=False)
+    )
+    
+    try:
+        found = logs_store.get(where=where, limit=limit, since_ns=start, until_ns=end)
+    except Exception as e:
+        log.error("❌ Filtered /logs query failed: %s", e)
+        return jsonify({"error": str(e), "where": where}), 500
+    
+    entries = sorted(
+        ((0, m.get("timestamp") or 0, d, stream_labels(m))
+         for d, m in zip(found["documents"], found["metadatas"])),
+        key=lambda e: int(e[1]), reverse=True
+    )
+    return jsonify({
+        "status": "success",
+        "data": {
+            "resultType": "streams",
+            "result": _recent_logs.as_streams(entries)
+        },
+        "where": where
+    })
+
+@app.route("/logs", methods=["GET"])
+def get_logs():
+    """
+    Recent logs from the shared ingest buffer, newest first.
+    
+    Pass the returned `cursor` back as `since` to get only newer lines,
+    oldest page first: `more` says newer lines remain, and `reset` that
+    lines after `since` were already evicted from the buffer.
+    Responses carry a weak ETag, so an unchanged poll is answered with 304.
+    
+    Filtering by level, service (comma-separated), start / end (ns) or
+    field (repeatable key=value, e.g. field=status=503) queries the vector
+    store instead.
+    """
+    limit = request.args.get("limit", 100, type=int)
+    since = request.args.get("since", 0, type=int)
+    
+    if any(name in request.args for name in ("level", "service", "start", "end", "field")):
+        return logs_from_store(limit)
+    
+    if not local_views() or len(_recent_logs) == 0:
+        return logs_from_loki(limit)
+    
+    etag = f"{_recent_logs.latest}-{since}-{limit}"
+    if request.if_none_match.contains_weak(etag):
+        not_modified = app.response_class(status=304)
+        not_modified.set_etag(etag, weak=True)
+        return not_modified
+    
+    entries, cursor, more, reset = _recent_logs.since(since, limit)
+    resp = jsonify({
+        "status": "success",
+        "data": {
+            "resultType": "streams",
+            "result": _recent_logs.as_streams(entries)
+        },
+        "cursor": cursor,
+        "more": more,
+        "reset": reset
+    })
+    resp.set_etag(etag, weak=True)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+@app.route("/stream", methods=["GET"])
+def stream():
+    """
+    Server-Sent Events feed of newly ingested lines ("logs") and counters ("stats").
+    
+    Clients that cannot keep up with their buffer are disconnected.
+    """
+    if not local_views():
+        return views_unavailable("The live feed")
+    sub = _broadcaster.subscribe()
+    sub.queue.put_nowait(sse_frame("stats", streamer_stats()))
+    
+    def events():
+        try:
+            yield from sub.frames()
+        finally:
+            _broadcaster.unsubscribe(sub)
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.route("/stats", methods=["GET"])
 def stats():
     """Get detailed stats"""
+    if logs_store is None:
+        return jsonify({"error": "Vector store not connected yet"}), 503
     try:
-        count = logs_col.count()
-        sample = logs_col.peek(limit=5)
+        count = logs_store.count(exact=True)
+        sample = logs_store.peek(limit=5)
         
         return jsonify({
             "chromadb": {
                 "total": count,
+                "buckets": [logs_store.name_of(b) for b in logs_store.buckets()],
                 "sample_ids": sample.get("ids", []),
                 "sample_docs": sample.get("documents", [])
             },
             "streamer": {
                 "processed": _total_processed,
                 "added": _total_added,
-                "running": _streamer_running,
-                "last_fetch": _last_fetch_time
+                "deduped": _total_deduped,
+                "running": _streamer_running and _leader_lock.held,
+                "last_fetch": last_fetch_time()
+            },
+            "pipeline": _pipeline.stats(),
+            "stream_clients": len(_broadcaster),
+            "answer_cache": _answer_cache.stats(),
+            "anomaly": _detector.stats(),
+            "templates": {
+                "known": len(_miner.templates()),
+                "embeddings_computed": _template_embeddings.computed,
+                "embeddings_reused": _template_embeddings.reused
             }
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Prometheus exposition endpoint (scraped by the flask-api job)"""
+    body, content_type = metrics.exposition()
+    return Response(body, mimetype=content_type)
+
+@app.route("/templates", methods=["GET"])
+def templates():
+    """Log templates mined from the ingested stream, most frequent first"""
+    if not local_views():
+        return views_unavailable("Template mining")
+    limit = request.args.get("limit", 50, type=int)
+    mined = _miner.templates()
+    return jsonify({"total": len(mined), "templates": mined[:limit]})
+
+@app.route("/aggregate", methods=["GET"])
+def aggregate():
+    """
+    Counts and numeric-field quantiles from the in-memory rollups.
+    
+    Query params: minutes (default 10) or since/until (ns), service, level
+    (comma-separated), match (template substring), group_by
+    (comma-separated: service, level, template).
+    """
+    if not local_views():
+        return views_unavailable("Aggregation over the rollups")
+    minutes = request.args.get("minutes", 10, type=int)
+    since = request.args.get("since", type=int) or time.time_ns() - minutes * 60_000_000_000
+    until = request.args.get("until", type=int)
+    
+    result = _rollups.aggregate(
+        since_ns=since,
+        until_ns=until,
+        services=arg_set("service"),
+        levels={l.upper() for l in arg_set("level") or ()} or None,
+        match=request.args.get("match"),
+        group_by=tuple(arg_set("group_by") or ("service", "level"))
+    )
+    result.update({"since": since, "until": until})
+    return jsonify(result)
+
+@app.route("/incidents", methods=["GET"])
+def incidents():
+    """
+    Spikes flagged by the anomaly detector, newest first, with their
+    precomputed context and (if enabled) summary.
+    
+    Query params: status (open or resolved), limit (default 50).
+    """
+    if not local_views():
+        return views_unavailable("Incident detection")
+    return jsonify({
+        "incidents": _detector.incidents(
+            status=request.args.get("status"),
+            limit=request.args.get("limit", 50, type=int)
+        ),
+        "detector": _detector.stats(),
+        "ingesting": _leader_lock.held
+    })
+
 @app.route("/debug/loki", methods=["GET"])
 def debug_loki():
     """Debug endpoint to check Loki directly"""
     try:
         # Check Loki health
-        health = requests.get(f"{LOKI_URL}/ready", timeout=5)
+        health = loki.get("/ready", retries=0, timeout=5)
         
         # Get label names
-        labels = requests.get(f"{LOKI_URL}/loki/api/v1/labels", timeout=5)
+        labels = loki.get("/loki/api/v1/labels", retries=0, timeout=5)
         
         # Get series for our query
-        series = requests.get(
-            f"{LOKI_URL}/loki/api/v1/series",
-            params={"match[]": LOKI_QUERY},
+        series = loki.get(
+            "/loki/api/v1/series",
+            params={"match[]": LOKI_SELECTORS},
+            retries=0,
             timeout=5
         )
         
@@ -332,97 +894,183 @@ def debug_loki():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/chat", methods=["POST"])
-def chat():
-    """AI chat endpoint"""
-    data = request.get_json()
-    user_msg = data.get("message", "").strip()
+def retrieve_logs(user_msg):
+    """Fused local + vector retrieval for one question."""
+    count = logs_store.count() if logs_store is not None else 0
+    filters = parse_filters(user_msg, _search_index.services())
     
-    if not user_msg:
-        return jsonify({"error": "Empty message"}), 400
+    # Local lexical hits first: exact IDs / key=value lookups are answered
+    # from the in-memory index without a vector-store round trip
+    started = time.perf_counter()
+    local_hits = _search_index.search(user_msg, k=CHAT_RESULTS, filters=filters)
+    metrics.CHAT_STAGE_SECONDS.labels("local_search").observe(time.perf_counter() - started)
+    wanted = exact_terms(user_msg)
+    exact = bool(wanted) and any(t in line.lower() for _, line, _ in local_hits for t in wanted)
     
-    print(f"\n💬 Chat query: {user_msg}")
+    # Level, service, time range and key=value pairs named in the question
+    # are filtered by the vector store, so every result returned is usable
+    where = where_clause(filters["levels"], filters["services"], filters["since_ns"],
+                         fields=extract_fields(user_msg, latency=False))
     
+    vector_hits = []
+    started = time.perf_counter()
     try:
-        count = logs_col.count()
-        print(f"   ChromaDB has {count} documents")
-        
-        if count == 0:
-            context = "⚠️ No logs in ChromaDB yet"
-            logs_found = 0
-        else:
-            result = logs_col.query(
+        if count > 0 and not exact:
+            # Lines of one template share an embedding, so over-fetch and
+            # keep a few per template to get varied evidence
+            # Only buckets overlapping the question's time range are queried
+            query = dict(
                 query_texts=[user_msg],
-                n_results=min(15, count)
+                n_results=min(CHAT_RESULTS * CHAT_MAX_PER_TEMPLATE, count),
+                since_ns=filters["since_ns"]
             )
-            docs = result.get("documents", [[]])[0]
-            metas = result.get("metadatas", [[]])[0]
-            
-            context = "\n".join([
-                f"[{m.get('timestamp', '')}] {d}" 
-                for d, m in zip(docs, metas)
-            ])
-            
-            if not context:
-                context = "No relevant logs found"
-            
-            logs_found = len(docs)
-            print(f"   Found {logs_found} relevant logs")
+            result = logs_store.query(where=where, **query)
+            if where and not result.get("ids", [[]])[0]:
+                # Lines stored before typed metadata cannot match a where, and a
+                # value nobody logged still deserves the nearest lines; fall
+                # back to filtering level / service / time after the query
+                result = logs_store.query(**query)
+            per_template = {}
+            for doc_id, d, m in zip(result.get("ids", [[]])[0],
+                                    result.get("documents", [[]])[0],
+                                    result.get("metadatas", [[]])[0]):
+                m = m or {}
+                level, service, _ = parse_line(d)
+                if not matches_filters(level, service, m.get("timestamp", 0), filters):
+                    continue
+                tpl_id = m.get("template_id", d)
+                if per_template.get(tpl_id, 0) >= CHAT_MAX_PER_TEMPLATE:
+                    continue
+                per_template[tpl_id] = per_template.get(tpl_id, 0) + 1
+                vector_hits.append((doc_id, d, m))
+        vector_error = None
     except Exception as e:
-        context = f"ChromaDB query error: {e}"
-        logs_found = 0
-        print(f"   ❌ Query error: {e}")
+        vector_error = e
+        log.error("❌ Query error: %s", e)
+    
+    # Reciprocal rank fusion of the lexical and vector rankings; everything
+    # fused is kept, the context builder trims by template and token budget
+    by_id = {doc_id: (d, m) for doc_id, d, m in vector_hits + local_hits}
+    fused = rrf([[h[0] for h in local_hits], [h[0] for h in vector_hits]])
+    hits = [(i, *by_id[i]) for i in fused]
     
+    context, groups = build_log_context(
+        hits,
+        CHAT_CONTEXT_TOKENS,
+        template_stats=_rollups.template_stats(filters["since_ns"])
+    )
+    if not context:
+        if vector_error is not None:
+            context = f"ChromaDB query error: {vector_error}"
+        elif logs_store is None:
+            context = "⚠️ ChromaDB not connected yet"
+        elif count == 0:
+            context = "⚠️ No logs in ChromaDB yet"
+        else:
+            context = "No relevant logs found"
+    
+    log.debug("Found %d relevant logs in %d template group(s) (%d local, %d vector, exact=%s, where=%s)",
+              len(hits), groups, len(local_hits), len(vector_hits), exact, where)
+    metrics.CHAT_STAGE_SECONDS.labels("vector_query").observe(time.perf_counter() - started)
+    return {
+        "context": context,
+        "logs_found": len(hits),
+        "total_in_db": count,
+        "templates": {m.get("template_id") for _, _, m in hits if m and m.get("template_id")},
+        "cacheable": vector_error is None
+    }
+
+def fetch_prometheus():
+    started = time.perf_counter()
     try:
-        prom_res = requests.get(
-            f"{PROM_URL}/api/v1/query",
-            params={"query": "up"},
-            timeout=5
-        )
-        metrics = prom_res.json() if prom_res.ok else {"error": "Failed"}
-    except:
-        metrics = {"error": "Prometheus unavailable"}
+        prom_res = prometheus.get("/api/v1/query", params={"query": "up"})
+        prom_metrics = prom_res.json() if prom_res.ok else {"error": "Failed"}
+    except CircuitOpen:
+        prom_metrics = {"error": "Prometheus unavailable (circuit open)"}
+    except Exception:
+        prom_metrics = {"error": "Prometheus unavailable"}
+    metrics.CHAT_STAGE_SECONDS.labels("prometheus").observe(time.perf_counter() - started)
+    return prom_metrics
+
+def build_prompt(user_msg, context, prom_metrics):
+    # Aggregate questions are answered from the rollups; use the question's
+    # own time range when it names one
+    since_ns = parse_filters(user_msg)["since_ns"]
+    minutes = CHAT_ROLLUP_MINUTES
+    if since_ns:
+        minutes = max(1, min(ROLLUP_MINUTES, round((time.time_ns() - since_ns) / 60_000_000_000)))
+    # Only the ingesting process has rollups; empty ones would read as "no traffic"
+    volume = _rollups.summary(minutes) if local_views() else "Unavailable (this API process does not ingest)"
     
-    prompt = f"""You are an observability AI assistant.
+    return f"""You are an observability AI assistant.
 
 User Question: {user_msg}
 
 Relevant Logs:
 {context}
 
+Log Volume:
+{volume}
+
 Metrics:
-{metrics}
+{summarize_metrics(prom_metrics)}
 
 Provide diagnosis and suggestions."""
 
-    try:
-        gemini_res = requests.post(
-            f"{GEMINI_URL}?key={GEMINI_API_KEY}",
-            json={"contents": [{"parts": [{"text": prompt}]}]},
-            timeout=30
-        )
-        
-        if gemini_res.ok:
-            answer = gemini_res.json()["candidates"][0]["content"]["parts"][0]["text"]
-        else:
-            answer = f"Gemini error: {gemini_res.status_code}"
-    except Exception as e:
-        answer = f"Gemini request failed: {e}"
+# Logs and metrics are fetched concurrently; the answer is either returned
+# whole or relayed token by token from streamGenerateContent, unless a
+# still-valid cached answer to a similar question exists
+_chat_engine = ChatEngine(
+    retrieve_logs,
+    fetch_prometheus,
+    build_prompt,
+    LLMClient(gemini, GEMINI_MODEL, GEMINI_API_KEY),
+    workers=CHAT_WORKERS,
+    observe=lambda stage, seconds: metrics.CHAT_STAGE_SECONDS.labels(stage).observe(seconds),
+    cache=_answer_cache
+)
+
+@app.route("/chat", methods=["POST"])
+def chat():
+    """
+    AI chat endpoint.
     
-    return jsonify({
-        "answer": answer,
-        "logs_found": logs_found,
-        "total_in_db": count
-    })
+    Returns JSON by default. With {"stream": true} or Accept: text/event-stream
+    the answer is streamed as SSE: "meta" (logs_found, total_in_db, cached),
+    then "token" events ({"text"}) as they are generated, then "done".
+    A cached answer comes back whole, as a single token.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object with a \"message\""}), 400
+    message = data.get("message", "")
+    if not isinstance(message, str):
+        return jsonify({"error": "\"message\" must be a string"}), 400
+    user_msg = message.strip()
+    
+    if not user_msg:
+        return jsonify({"error": "Empty message"}), 400
+    
+    log.info("💬 Chat query: %s", user_msg)
+    
+    wants_stream = data.get("stream") or "text/event-stream" in request.headers.get("Accept", "")
+    if not wants_stream:
+        return jsonify(_chat_engine.answer(user_msg))
+    
+    def generate():
+        for event, payload in _chat_engine.stream(user_msg):
+            yield sse_frame(event, payload)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 if __name__ == "__main__":
-    print("\n" + "="*70)
-    print("🚀 Starting Flask on 0.0.0.0:5000")
-    print("📍 Available endpoints:")
-    print("   - GET  /health")
-    print("   - GET  /logs")
-    print("   - GET  /stats")
-    print("   - GET  /debug/loki")
-    print("   - POST /chat")
-    print("="*70 + "\n")
-    app.run(host="0.0.0.0", port=5000, debug=False, threaded=True)
+    # As PID 1 in a container, SIGTERM is ignored without a handler
+    signal.signal(signal.SIGTERM, _terminate)
+    signal.signal(signal.SIGINT, _terminate)
+    log.info("🚀 Starting Flask on 0.0.0.0:%d", PORT)
+    log.info("📍 Endpoints: GET /livez /readyz /health /logs /stream /stats /metrics /templates /aggregate /incidents /debug/loki, POST /chat")
+    create_app().run(host="0.0.0.0", port=PORT, debug=False, threaded=True)
@@ -0,0 +1,336 @@
+"""
+Bulk backfill of log files straight into the vector store.
+
+Files are memory-mapped and read in chunks that end on a line boundary, so
+memory use does not depend on file size. Each line gets its timestamp from
+its leading asctime (continuation lines reuse the previous one), and is
+turned into the same ID and metadata as the live ingester builds
+(records.py). Records go through the same IngestPipeline and
+PartitionedStore as app.py, with larger batches and more upsert workers.
+
+A line's ID covers its Loki stream labels and timestamp, so a file that
+promtail also ships is labelled the way promtail labels it: the static
+labels of the promtail scrape target whose __path__ matches the file name,
+plus promtail's `filename` label, and asctimes are read in the timezone of
+its timestamp stage (../promtail/config.yml stamps entries with their
+asctime). Lines still inside Loki's retention then get the IDs the live
+ingester gives them and are not stored twice. Files promtail does not
+scrape are labelled job=fake_logs plus their real path; --label overrides
+either.
+
+Progress (byte offset of the last fully upserted chunk) is saved per file
+under INGEST_STATE_DIR/backfill/, so an interrupted run continues where it
+stopped; upserts are idempotent, so the chunk in flight is simply redone.
+
+Lines older than the store's retention are skipped; raise
+STORE_RETENTION_HOURS (here and for app.py) to keep older history. A file
+with skipped lines keeps its saved progress from before the first of them,
+so a rerun with a longer retention still picks them up.
+
+Batches the store keeps rejecting are written to a dead-letter file (by
+app.py under INGEST_STATE_DIR, here under INGEST_STATE_DIR/backfill/);
+--dead-letter re-upserts such a file once the cause is fixed.
+
+Usage:
+    python backfill.py ../fake_logs/app.log
+    python backfill.py /var/log/app.log.1 /var/log/app.log --label job=fake_logs --workers 8
+    CHROMA_BACKEND=memory python backfill.py ../fake_logs/app.log
+    python backfill.py --dead-letter state/dead_letter.jsonl
+"""
+import argparse
+import fnmatch
+import hashlib
+import json
+import logging
+import mmap
+import os
+import signal
+import threading
+import time
+from datetime import timezone
+from zoneinfo import ZoneInfo
+
+import yaml
+
+from drain import TemplateEmbeddings, TemplateMiner
+from pipeline import DeadLetterFile, IngestPipeline
+from records import build_record, parse_file_timestamp
+from store import PartitionedStore, cloud_database_name, open_client
+
+log = logging.getLogger("backfill")
+
+PROMTAIL_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "promtail", "config.yml")
+
+
+def promtail_targets(config_path):
+    """
+    Static targets of a promtail config as [(labels, __path__ glob, tz), ...].
+
+    tz is the timezone promtail's timestamp stage reads asctimes in (UTC
+    unless it sets a location), or None if entries keep their read time.
+    """
+    with open(config_path, encoding="utf-8") as f:
+        config = yaml.safe_load(f) or {}
+    targets = []
+    for job in config.get("scrape_configs") or []:
+        tz = None
+        for stage in job.get("pipeline_stages") or []:
+            if isinstance(stage, dict) and "timestamp" in stage:
+                location = (stage["timestamp"] or {}).get("location")
+                tz = ZoneInfo(location) if location else timezone.utc
+        for static in job.get("static_configs") or []:
+            labels = dict(static.get("labels") or {})
+            glob = labels.pop("__path__", None)
+            if glob:
+                labels = {k: str(v) for k, v in labels.items() if not k.startswith("__")}
+                targets.append((labels, glob, tz))
+    return targets
+
+
+def file_labels(path, targets):
+    """(labels, tz) promtail ships `path` with, matched by file name, or (None, None)."""
+    name = os.path.basename(path)
+    for labels, glob, tz in targets:
+        shipped = os.path.join(os.path.dirname(glob), name)
+        if fnmatch.fnmatch(shipped, glob):
+            return dict(labels, filename=shipped), tz
+    return None, None
+
+
+def read_chunks(path, start=0, chunk_bytes=8 * 1024 * 1024):
+    """Yield (end offset, lines) for whole lines from byte offset `start`."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if start >= size:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = start
+            while pos < size:
+                end = min(pos + chunk_bytes, size)
+                if end < size:
+                    nl = mm.rfind(b"\n", pos, end)
+                    if nl == -1:
+                        # A single line longer than a chunk
+                        nl = mm.find(b"\n", end)
+                        end = size if nl == -1 else nl + 1
+                    else:
+                        end = nl + 1
+                yield end, mm[pos:end].decode("utf-8", errors="replace").splitlines()
+                pos = end
+
+
+class Progress:
+    """Per-file resume point, saved atomically like the ingest cursor."""
+
+    def __init__(self, state_dir, path):
+        real = os.path.realpath(path)
+        self.path = os.path.join(state_dir, "backfill", hashlib.sha1(real.encode()).hexdigest()[:16] + ".json")
+        self.file = real
+        self.offset = 0
+        self.lines = 0
+        self.last_ts = None
+        self.inode = None
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return self
+        st = os.stat(self.file)
+        # A rotated or truncated file starts over
+        if state.get("inode") == st.st_ino and state.get("offset", 0) <= st.st_size:
+            self.offset = state["offset"]
+            self.lines = state.get("lines", 0)
+            self.last_ts = state.get("last_ts")
+        return self
+
+    def save(self, offset, lines, last_ts):
+        self.offset, self.lines, self.last_ts = offset, lines, last_ts
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({
+                "file": self.file,
+                "inode": os.stat(self.file).st_ino,
+                "offset": offset,
+                "lines": lines,
+                "last_ts": last_ts,
+                "updated_at": time.time()
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+
+def backfill_file(path, labels, pipeline, miner, progress, chunk_bytes, stop, expired, lost, tz=None):
+    """
+    Queue one file chunk by chunk until done or `stop` is set; returns
+    (lines queued, lines skipped as expired). Asctimes are read in tz
+    (default local time).
+
+    Progress is only saved up to the first chunk with a skipped line, and
+    not at all once `lost` is set (a line expired between this check and
+    its upsert).
+    """
+    queued = 0
+    skipped = 0
+    line_no = progress.lines
+    last_ts = progress.last_ts or int(os.stat(path).st_mtime * 1_000_000_000)
+    if progress.offset:
+        log.info("↩️  %s: resuming at byte %d (line %d)", path, progress.offset, line_no)
+
+    for end, lines in read_chunks(path, progress.offset, chunk_bytes):
+        if stop.is_set():
+            break
+        records = []
+        for line in lines:
+            line_no += 1
+            if not line.strip():
+                continue
+            ts = parse_file_timestamp(line, tz) or last_ts
+            last_ts = ts
+            if expired(ts):
+                skipped += 1
+                continue
+            records.append(build_record(labels, ts, line, miner))
+        if skipped:
+            # Never mark skipped lines as done: the next run starts from here
+            pipeline.submit(records)
+        else:
+            snapshot = (end, line_no, last_ts)
+            pipeline.submit(records, on_commit=lambda s=snapshot: lost.is_set() or progress.save(*s))
+        queued += len(records)
+    if skipped:
+        log.warning("⚠️  %s: %d lines older than the store retention were skipped; progress stops "
+                    "before them so a rerun with a higher STORE_RETENTION_HOURS adds them", path, skipped)
+    return queued, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill log files into the vector store")
+    parser.add_argument("files", nargs="*")
+    parser.add_argument("--dead-letter", action="append", default=[], metavar="FILE",
+                        help="re-upsert the records of a dead-letter file (repeatable)")
+    parser.add_argument("--label", action="append", default=[], metavar="KEY=VALUE",
+                        help="stream label (repeatable); default: the promtail target's labels")
+    parser.add_argument("--promtail-config", default=os.getenv("PROMTAIL_CONFIG", PROMTAIL_CONFIG),
+                        help="promtail config to take labels and timestamp timezone from")
+    parser.add_argument("--workers", type=int, default=4, help="parallel upsert workers")
+    parser.add_argument("--batch-size", type=int, default=1000, help="lines per upsert")
+    parser.add_argument("--chunk-bytes", type=int, default=8 * 1024 * 1024, help="bytes read per chunk")
+    parser.add_argument("--state-dir", default=os.getenv("INGEST_STATE_DIR", "./state"))
+    parser.add_argument("--restart", action="store_true", help="ignore saved progress")
+    args = parser.parse_args()
+    if not args.files and not args.dead_letter:
+        parser.error("give log files to backfill and/or --dead-letter files to replay")
+
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s [%(levelname)s] [%(name)s] %(message)s"
+    )
+
+    client, embedding_fn = open_client(
+        os.getenv("CHROMA_BACKEND", "cloud").lower(),
+        os.getenv("CHROMA_API_KEY"),
+        os.getenv("CHROMA_TENANT"),
+        cloud_database_name(os.getenv("CHROMA_DATABASE", ""))
+    )
+    store = PartitionedStore(
+        client,
+        prefix="system_logs",
+        bucket_seconds=int(os.getenv("STORE_BUCKET_SECONDS", "3600")),
+        retention_seconds=int(float(os.getenv("STORE_RETENTION_HOURS", "24")) * 3600),
+        embedding_function=embedding_fn,
+        metadata={"description": "System logs from observability stack"}
+    )
+    targets = []
+    if os.path.exists(args.promtail_config):
+        targets = promtail_targets(args.promtail_config)
+    elif args.files:
+        log.info("No promtail config at %s; labelling files by their path", args.promtail_config)
+
+    miner = TemplateMiner(similarity=float(os.getenv("TEMPLATE_SIMILARITY", "0.5")))
+    template_embeddings = TemplateEmbeddings(embedding_fn)
+    use_templates = os.getenv("TEMPLATE_EMBEDDINGS", "1") == "1"
+
+    totals = {"written": 0, "seen": 0}
+    totals_lock = threading.Lock()
+    # Set when a queued line expired before its upsert; no progress is saved after that
+    lost = threading.Event()
+
+    def sink(ids, docs, metas):
+        embeddings = template_embeddings.for_batch(metas, docs) if use_templates else None
+        written = store.upsert(ids, docs, metas, embeddings, now=time.time())
+        if written < len(ids):
+            lost.set()
+        with totals_lock:
+            totals["written"] += written
+            totals["seen"] += len(ids)
+
+    pipeline = IngestPipeline(
+        sink,
+        workers=args.workers,
+        max_queue=args.batch_size * args.workers * 4,
+        batch_size=args.batch_size,
+        batch_bytes=4 * 1024 * 1024,
+        max_latency=1.0,
+        dead_letter=DeadLetterFile(os.path.join(args.state_dir, "backfill", "dead_letter.jsonl"))
+    )
+    pipeline.start()
+
+    # Stop between chunks rather than wherever the signal lands
+    stop = threading.Event()
+
+    def interrupt(signum, frame):
+        log.warning("⏸️  Interrupted; finishing queued chunks, rerun to resume")
+        stop.set()
+
+    signal.signal(signal.SIGINT, interrupt)
+    signal.signal(signal.SIGTERM, interrupt)
+
+    started = time.time()
+    queued = 0
+    skipped = 0
+    for path in args.dead_letter:
+        records = list(DeadLetterFile.read(path))
+        log.info("♻️  Replaying %d dead-lettered lines from %s", len(records), path)
+        for i in range(0, len(records), args.batch_size):
+            pipeline.submit(records[i:i + args.batch_size])
+        queued += len(records)
+    for path in args.files:
+        if stop.is_set():
+            break
+        labels, tz = file_labels(path, targets)
+        if labels is None:
+            # The real path, so the same file gets the same IDs from any cwd
+            labels, tz = {"job": "fake_logs", "filename": os.path.realpath(path)}, None
+        labels.update(kv.split("=", 1) for kv in args.label)
+        log.info("🏷️  %s labelled %s", path, labels)
+        progress = Progress(args.state_dir, path)
+        if not args.restart:
+            progress.load()
+        log.info("📂 Backfilling %s (%d bytes)", path, os.path.getsize(path))
+        file_queued, file_skipped = backfill_file(path, labels, pipeline, miner, progress,
+                                                  args.chunk_bytes, stop, store.expired, lost, tz)
+        queued += file_queued
+        skipped += file_skipped
+
+    # Wait for everything queued to be upserted and its progress saved
+    while pipeline.in_flight():
+        time.sleep(0.2)
+    pipeline.stop()
+
+    elapsed = time.time() - started
+    log.info("✅ Backfill done: %d lines queued, %d upserted in %.1fs (%.0f lines/s), %d bucket(s)",
+             queued, totals["written"], elapsed, totals["seen"] / max(elapsed, 1e-9), len(store.buckets()))
+    if skipped:
+        log.warning("⚠️  %d lines were older than the store retention and were skipped "
+                    "(STORE_RETENTION_HOURS); their files were not marked done", skipped)
+    if lost.is_set():
+        log.warning("⚠️  %d queued lines expired before their upsert; progress was not saved "
+                    "after that, rerun to resume", totals["seen"] - totals["written"])
+
+
+if __name__ == "__main__":
+    main()
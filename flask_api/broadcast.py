@@ -0,0 +1,79 @@
+"""
+In-process fan-out of live events to Server-Sent Events clients.
+
+The ingest path publishes each event once; it is serialized to an SSE frame
+a single time and the same string is handed to every subscriber. Each
+subscriber has a bounded buffer. A client that falls so far behind that its
+buffer fills up is dropped rather than allowed to slow ingestion or grow
+memory; its EventSource reconnects and resyncs through /logs?since=.
+"""
+import json
+import queue
+import threading
+
+
+def sse_frame(event, data):
+    """Encode one SSE message."""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class Subscription:
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = False
+
+    def frames(self, keepalive=15.0):
+        """Yield SSE frames until the subscription is dropped."""
+        while not self.dropped:
+            try:
+                yield self.queue.get(timeout=keepalive)
+            except queue.Empty:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+
+
+class Broadcaster:
+    """Publish events to all subscribers without ever blocking the publisher."""
+
+    def __init__(self, client_buffer=256):
+        self.client_buffer = client_buffer
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped_clients = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def subscribe(self):
+        sub = Subscription(self.client_buffer)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, event, data):
+        """Send an event to every subscriber; slow subscribers are dropped."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+
+        frame = sse_frame(event, data)
+        slow = []
+        for sub in subscribers:
+            try:
+                sub.queue.put_nowait(frame)
+            except queue.Full:
+                sub.dropped = True
+                slow.append(sub)
+
+        with self._lock:
+            self.published += 1
+            for sub in slow:
+                self._subscribers.discard(sub)
+            self.dropped_clients += len(slow)
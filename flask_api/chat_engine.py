@@ -0,0 +1,187 @@
+"""
+Concurrent, streaming /chat pipeline.
+
+ChatEngine fetches log context and metrics in parallel on a shared thread
+pool, builds the prompt and then either waits for the whole LLM answer
+(answer()) or relays it token by token as it is generated (stream()).
+Time to first token is therefore bounded by the slowest context fetch plus
+the model's first-token latency instead of the sum of every step.
+
+With an AnswerCache (answer_cache.py), a question similar to one already
+answered, whose logs have not changed since, is answered from the cache
+without retrieval or generation.
+
+LLMClient speaks the Gemini generateContent / streamGenerateContent (SSE)
+API; fake_llm.py implements the same endpoints for offline runs.
+"""
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+
+class LLMError(Exception):
+    """The LLM request failed or returned an unusable response."""
+
+
+def _candidate_text(payload):
+    parts = (payload.get("candidates") or [{}])[0].get("content", {}).get("parts", [])
+    return "".join(p.get("text", "") for p in parts)
+
+
+class LLMClient:
+    """Minimal Gemini REST client with blocking and streaming calls."""
+
+    def __init__(self, upstream, model, api_key):
+        self.upstream = upstream  # upstream.Upstream rooted at the API base URL
+        self.model = model
+        self.api_key = api_key
+
+    def _path(self, method):
+        return f"/models/{self.model}:{method}"
+
+    def _body(self, prompt):
+        return {"contents": [{"parts": [{"text": prompt}]}]}
+
+    def generate(self, prompt):
+        """Whole answer text."""
+        res = self.upstream.post(
+            self._path("generateContent"),
+            params={"key": self.api_key},
+            json=self._body(prompt)
+        )
+        if not res.ok:
+            raise LLMError(f"Gemini error: {res.status_code}")
+        return _candidate_text(res.json())
+
+    def stream(self, prompt):
+        """Yield answer text chunks as the model produces them."""
+        res = self.upstream.post(
+            self._path("streamGenerateContent"),
+            params={"key": self.api_key, "alt": "sse"},
+            json=self._body(prompt),
+            stream=True
+        )
+        if not res.ok:
+            res.close()
+            raise LLMError(f"Gemini error: {res.status_code}")
+        try:
+            for line in res.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                text = _candidate_text(json.loads(line[len("data:"):].strip()))
+                if text:
+                    yield text
+        finally:
+            res.close()
+
+
+class ChatEngine:
+    """Parallel context gathering plus blocking or streaming generation."""
+
+    def __init__(self, retrieve_logs, fetch_metrics, build_prompt, llm,
+                 workers=8, observe=None, cache=None):
+        # question -> {"context", "logs_found", "total_in_db", "templates", "cacheable"}
+        self.retrieve_logs = retrieve_logs
+        self.fetch_metrics = fetch_metrics  # () -> metrics summary
+        self.build_prompt = build_prompt    # (question, context, metrics) -> str
+        self.llm = llm
+        self.observe = observe or (lambda stage, seconds: None)
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat")
+
+    def prepare(self, question):
+        """Fetch logs and metrics concurrently; returns (prompt, info)."""
+        logs_future = self._pool.submit(self.retrieve_logs, question)
+        metrics_future = self._pool.submit(self.fetch_metrics)
+        info = logs_future.result()
+        prom_metrics = metrics_future.result()
+        return self.build_prompt(question, info["context"], prom_metrics), info
+
+    def _cached(self, question, started):
+        """(cached response or None, cache key, watermark)."""
+        if self.cache is None:
+            return None, None, None
+        # Taken before retrieval, so lines arriving meanwhile invalidate the result
+        watermark = self.cache.watermark()
+        cached, key = self.cache.get(question)
+        if cached is not None:
+            self.observe("cached", time.perf_counter() - started)
+        return cached, key, watermark
+
+    def _store(self, key, response, info, watermark):
+        if key is not None and info.get("cacheable"):
+            self.cache.put(key, response, info.get("templates", ()), watermark)
+
+    def answer(self, question):
+        started = time.perf_counter()
+        cached, key, watermark = self._cached(question, started)
+        if cached is not None:
+            return dict(cached, cached=True)
+
+        prompt, info = self.prepare(question)
+
+        llm_started = time.perf_counter()
+        failed = False
+        try:
+            answer = self.llm.generate(prompt)
+        except LLMError as e:
+            answer, failed = str(e), True
+        except Exception as e:
+            answer, failed = f"Gemini request failed: {e}", True
+        self.observe("llm", time.perf_counter() - llm_started)
+        self.observe("total", time.perf_counter() - started)
+
+        response = {
+            "answer": answer,
+            "logs_found": info["logs_found"],
+            "total_in_db": info["total_in_db"]
+        }
+        if not failed:
+            self._store(key, response, info, watermark)
+        return dict(response, cached=False)
+
+    def stream(self, question):
+        """
+        Yield (event, data) pairs: one "meta", then "token"s, then "done"
+        (or "error" if generation fails part-way).
+        """
+        started = time.perf_counter()
+        cached, key, watermark = self._cached(question, started)
+        if cached is not None:
+            yield "meta", {"logs_found": cached["logs_found"], "total_in_db": cached["total_in_db"],
+                           "cached": True}
+            yield "token", {"text": cached["answer"]}
+            yield "done", {}
+            return
+
+        prompt, info = self.prepare(question)
+        yield "meta", {"logs_found": info["logs_found"], "total_in_db": info["total_in_db"],
+                       "cached": False}
+
+        llm_started = time.perf_counter()
+        first = True
+        parts = []
+        try:
+            for text in self.llm.stream(prompt):
+                if first:
+                    self.observe("llm_first_token", time.perf_counter() - llm_started)
+                    self.observe("first_token", time.perf_counter() - started)
+                    first = False
+                parts.append(text)
+                yield "token", {"text": text}
+        except Exception as e:
+            log.error("❌ Streaming generation failed: %s", e)
+            yield "error", {"error": str(e) if isinstance(e, LLMError) else f"Gemini request failed: {e}"}
+        else:
+            self._store(key, {
+                "answer": "".join(parts),
+                "logs_found": info["logs_found"],
+                "total_in_db": info["total_in_db"]
+            }, info, watermark)
+        finally:
+            self.observe("llm", time.perf_counter() - llm_started)
+            self.observe("total", time.perf_counter() - started)
+        yield "done", {}
@@ -0,0 +1,32 @@
+"""
+Shared pytest fixtures: the offline stand-ins for Loki and ChromaDB.
+
+    loki        fake_loki.py served on a free port, as (Upstream client, FakeLokiStore)
+    collection  an empty fake_chroma.py collection with the hashing embedder
+
+Run from flask_api/:
+    python -m pytest -q
+"""
+import pytest
+
+from fake_chroma import HashEmbeddingFunction, InMemoryClient
+from fake_loki import serve
+from upstream import Upstream
+
+
+@pytest.fixture
+def loki():
+    server, store = serve(port=0)
+    host, port = server.server_address[:2]
+    client = Upstream("loki", f"http://{host}:{port}", timeout=5, retries=0)
+    try:
+        yield client, store
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def collection():
+    return InMemoryClient().get_or_create_collection(
+        "logs", embedding_function=HashEmbeddingFunction())
@@ -0,0 +1,166 @@
+"""
+Compact, token-budgeted prompt context for /chat.
+
+Retrieved lines are mostly instances of a few templates, so pasting them
+verbatim spends the prompt on near-duplicates. build_log_context() collapses
+hits by template into one entry each:
+
+    ERROR [db] DB connection timeout after {3523|4100|2987|…}ms while acquiring from pool_size=20
+      ×42, first 18:48:57, last 18:59:02 UTC
+
+Groups are ordered by their best retrieval rank and added until the token
+budget is spent; counts and first/last seen come from the rollups (all
+occurrences in the window) when available, otherwise from the hits.
+summarize_metrics() does the same for the Prometheus response.
+
+Tokens are estimated at ~4 characters each, which is close enough for
+budgeting without a tokenizer.
+"""
+import json
+import math
+import time
+from collections import Counter
+
+from drain import WILDCARD
+from logline import parse_line
+
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def _clock(ts_ns):
+    return time.strftime("%H:%M:%S", time.gmtime(int(ts_ns) / 1e9))
+
+
+class _Group:
+    __slots__ = ("template", "level", "service", "rank", "hits", "first_ns", "last_ns", "values")
+
+    def __init__(self, template, level, service, rank):
+        self.template = template
+        self.level = level
+        self.service = service
+        self.rank = rank
+        self.hits = 0
+        self.first_ns = None
+        self.last_ns = None
+        self.values = []  # per <*> slot: Counter of values
+
+    def add(self, ts_ns, params):
+        self.hits += 1
+        if ts_ns is not None:
+            self.first_ns = ts_ns if self.first_ns is None else min(self.first_ns, ts_ns)
+            self.last_ns = ts_ns if self.last_ns is None else max(self.last_ns, ts_ns)
+        for i, value in enumerate(params):
+            if i == len(self.values):
+                self.values.append(Counter())
+            self.values[i][value] += 1
+
+    def render(self, stats, max_values):
+        slots = iter(self.values)
+        parts = []
+        for i, chunk in enumerate(self.template.split(WILDCARD)):
+            if i:
+                counter = next(slots, None)
+                if not counter:
+                    parts.append(WILDCARD)
+                else:
+                    common = [v for v, _ in counter.most_common(max_values)]
+                    more = "|…" if len(counter) > max_values else ""
+                    parts.append(common[0] if len(common) == 1 and not more
+                                 else "{" + "|".join(common) + more + "}")
+            parts.append(chunk)
+
+        count, first_ns, last_ns = self.hits, self.first_ns, self.last_ns
+        if stats:
+            count = max(count, stats["count"])
+            first_ns = stats["first_ns"] if first_ns is None else min(first_ns, stats["first_ns"])
+            last_ns = stats["last_ns"] if last_ns is None else max(last_ns, stats["last_ns"])
+
+        head = " ".join(p for p in (self.level, f"[{self.service}]" if self.service else None) if p)
+        seen = f", first {_clock(first_ns)}, last {_clock(last_ns)} UTC" if first_ns is not None else ""
+        return f"{head} {''.join(parts)}".strip() + f"\n  ×{count}{seen}"
+
+
+def group_hits(hits):
+    """Collapse ranked (id, document, metadata) hits into template groups, best first."""
+    groups = {}
+    for rank, (_, doc, meta) in enumerate(hits):
+        meta = meta or {}
+        level, service, message = parse_line(doc)
+        template = meta.get("template")
+        try:
+            params = json.loads(meta.get("template_params") or "[]")
+        except ValueError:
+            params = []
+        if not template:
+            # Stored before template mining: group identical messages only
+            template, params = message, []
+        key = (meta.get("template_id") or template, level, service)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = _Group(template, level, service, rank)
+        try:
+            ts_ns = int(meta.get("timestamp"))
+        except (TypeError, ValueError):
+            ts_ns = None
+        group.add(ts_ns, params)
+    return groups
+
+
+def build_log_context(hits, budget_tokens, template_stats=None, max_values=4):
+    """
+    Prompt text for ranked hits within budget_tokens; returns (text, groups_used).
+
+    template_stats maps template_id -> {"count", "first_ns", "last_ns"}
+    (RollupEngine.template_stats) for real occurrence counts.
+    """
+    template_stats = template_stats or {}
+    groups = sorted(group_hits(hits).items(), key=lambda kv: kv[1].rank)
+
+    lines = []
+    used = 0
+    for (tpl_id, _, _), group in groups:
+        text = group.render(template_stats.get(tpl_id), max_values)
+        cost = estimate_tokens(text) + 1
+        if used + cost > budget_tokens:
+            if not lines:
+                # Always show the best match, cut to the budget
+                lines.append(text[:budget_tokens * CHARS_PER_TOKEN])
+            break
+        lines.append(text)
+        used += cost
+
+    shown = len(lines)
+    if shown < len(groups):
+        lines.append(f"(+{len(groups) - shown} more matching templates omitted)")
+    return "\n".join(lines), shown
+
+
+def summarize_metrics(prom, max_series=10):
+    """One-line-per-fact digest of a Prometheus instant query response."""
+    if not isinstance(prom, dict) or prom.get("status") != "success":
+        error = prom.get("error", "unknown error") if isinstance(prom, dict) else prom
+        return f"Unavailable: {error}"
+    result = prom.get("data", {}).get("result", [])
+    if not result:
+        return "No series returned"
+
+    def name(metric):
+        target = metric.get("job") or metric.get("__name__", "series")
+        instance = metric.get("instance")
+        return f"{target} ({instance})" if instance else target
+
+    values = [(r.get("metric", {}), r.get("value", [None, ""])[1]) for r in result]
+    metric = values[0][0].get("__name__")
+    if metric == "up":
+        down = [name(m) for m, v in values if v != "1"]
+        line = f"up: {len(values) - len(down)}/{len(values)} targets up"
+        return line + (f"; down: {', '.join(down[:max_series])}" if down else "")
+
+    lines = [f"{name(m)} = {v}" for m, v in values[:max_series]]
+    if len(values) > max_series:
+        lines.append(f"(+{len(values) - max_series} more series)")
+    return "\n".join(lines)
@@ -0,0 +1,150 @@
+"""
+Persisted, tie-safe ingestion cursor.
+
+Loki timestamps are nanoseconds, but several lines can still share one
+timestamp, and with several hosts a tail push can deliver one stream's
+line after another stream's newer one. A single "last timestamp + 1"
+watermark would drop both, so the cursor keeps, per stream:
+
+    streams  - stream key -> [newest timestamp ingested, how many lines
+               *at exactly that timestamp* were ingested]
+    ts       - the newest timestamp ingested from any stream
+
+A stream's line is new if it is past that stream's own watermark (ties
+counted off by the offset). Lines of a stream with no watermark, or more
+than `lateness_ns` behind `ts`, are only taken if they are within
+`lateness_ns` of `ts`; watermarks older than that are forgotten, so the
+state stays bounded. Queries restart at `start` (inclusive), the oldest
+watermark still inside that window, and select_new() drops the lines that
+were already taken. The cursor is written to disk atomically (temp file +
+fsync + rename) so a restart resumes exactly where ingestion stopped.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+DEFAULT_LATENESS_NS = 30 * 1_000_000_000
+
+
+def stream_key(labels):
+    """Stable identity for a Loki stream, e.g. '{host="a",job="b"}'."""
+    return "{" + ",".join(f'{k}="{labels[k]}"' for k in sorted(labels)) + "}"
+
+
+class IngestCursor:
+    """Per-stream (timestamp, offset) resume point for Loki ingestion."""
+
+    def __init__(self, path, ts, streams=None, lateness_ns=DEFAULT_LATENESS_NS):
+        self.path = path
+        self.ts = int(ts)
+        self.streams = {key: [int(t), int(n)] for key, (t, n) in (streams or {}).items()}
+        self.lateness_ns = int(lateness_ns)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, default_ts, lateness_ns=DEFAULT_LATENESS_NS):
+        """Read the cursor from path, or start at default_ts if there is none."""
+        try:
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            streams = state.get("streams")
+            if streams is None:
+                # One watermark for all streams: {"ts": ..., "offsets": {stream: n}}
+                streams = {key: [state["ts"], n] for key, n in (state.get("offsets") or {}).items()}
+            return cls(path, state["ts"], streams, lateness_ns)
+        except FileNotFoundError:
+            return cls(path, default_ts, lateness_ns=lateness_ns)
+        except (ValueError, KeyError, TypeError) as e:
+            log.warning("⚠️  Ignoring unreadable cursor %s: %s", path, e)
+            return cls(path, default_ts, lateness_ns=lateness_ns)
+
+    @property
+    def start(self):
+        """Where a query should (inclusively) restart to see every line still wanted."""
+        with self._lock:
+            floor = self.ts - self.lateness_ns
+            marks = [t for t, _ in self.streams.values()]
+            return max(floor, min(marks)) if marks else self.ts
+
+    def select_new(self, streams):
+        """Return streams trimmed to the entries the cursor has not covered yet."""
+        with self._lock:
+            floor = self.ts - self.lateness_ns
+            fresh = []
+            for stream in streams:
+                labels = stream.get("stream", {})
+                mark, taken = self.streams.get(stream_key(labels), (floor, 0))
+                if mark < floor:
+                    mark, taken = floor, 0
+                tie = 0
+                values = []
+                for ts, line in stream.get("values", []):
+                    ts_int = int(ts)
+                    if ts_int < mark:
+                        continue
+                    if ts_int == mark:
+                        tie += 1
+                        if tie <= taken:
+                            continue
+                    values.append([ts, line])
+                if values:
+                    fresh.append({"stream": labels, "values": values})
+            return fresh
+
+    def advance(self, streams):
+        """Move past streams previously returned by select_new()."""
+        with self._lock:
+            for stream in streams:
+                key = stream_key(stream.get("stream", {}))
+                mark = self.streams.get(key)
+                for ts, _ in stream.get("values", []):
+                    ts_int = int(ts)
+                    if mark is None or ts_int > mark[0]:
+                        mark = self.streams[key] = [ts_int, 1]
+                    elif ts_int == mark[0]:
+                        mark[1] += 1
+                    self.ts = max(self.ts, ts_int)
+            floor = self.ts - self.lateness_ns
+            for key in [k for k, (t, _) in self.streams.items() if t < floor]:
+                del self.streams[key]
+
+    def skip_past(self, ts):
+        """Force the cursor beyond ts (used when one timestamp has more lines than Loki returns at once)."""
+        with self._lock:
+            ts = int(ts)
+            for mark in self.streams.values():
+                if mark[0] <= ts:
+                    mark[:] = [ts + 1, 0]
+            self.ts = max(self.ts, ts + 1)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "ts": self.ts,
+                "streams": {key: list(mark) for key, mark in self.streams.items()},
+                "saved_at": time.time()
+            }
+
+    def save(self, state=None):
+        """Atomically persist the cursor (or an earlier to_dict() snapshot of it)."""
+        state = state or self.to_dict()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix=".cursor-", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
@@ -0,0 +1,203 @@
+"""
+Online log-template mining (a simplified Drain) and template embeddings.
+
+Almost every line we ingest is one of a few dozen templates with different
+IDs and numbers filled in. TemplateMiner splits each line into a template
+("DB connection timeout after <*>ms while acquiring from pool_size=<*>")
+and its parameter values, learning templates incrementally:
+
+  1. obvious variables (numbers, UUIDs, hex IDs) are masked to <*>
+  2. lines are bucketed by token count and first token
+  3. inside a bucket the most similar template is chosen; if at least
+     `similarity` of its tokens are equal, non-wildcard tokens (as in
+     Drain, a wildcard is not a match, or a generalised template would
+     absorb every line of its length), positions that differ become <*>,
+     otherwise a new template is started
+
+A template's ID is assigned when it is created and stays the same while
+its text generalises, so lines stored early keep pointing at it. Once
+`max_clusters` templates exist, lines that match none of them share one
+catch-all template ("<*>", the whole message as its parameter).
+
+TemplateEmbeddings embeds each distinct template text once and hands the
+cached vector out for every line of that template; catch-all lines are
+embedded from their own text.
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+from logline import parse_line
+
+WILDCARD = "<*>"
+
+MASKS = [
+    re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"),
+    re.compile(r"(?<![0-9A-Za-z])(?=[0-9a-f]*[a-f])(?=[0-9a-f]*[0-9])[0-9a-f]{8,}(?![0-9A-Za-z])"),
+    re.compile(r"(?<![A-Za-z_])\d+(?:\.\d+)?"),
+]
+
+
+def template_id(template):
+    """Stable short ID for a template text."""
+    return hashlib.sha1(template.encode()).hexdigest()[:12]
+
+
+def message_part(line):
+    """Strip the asctime/level/logger header so only the message is mined."""
+    return parse_line(line)[2]
+
+
+def mask_token(token):
+    for pattern in MASKS:
+        token = pattern.sub(WILDCARD, token)
+    return token
+
+
+def extract_params(template_tokens, tokens):
+    """Values that fill the <*> slots of template_tokens in tokens."""
+    params = []
+    for tpl, tok in zip(template_tokens, tokens):
+        if WILDCARD not in tpl:
+            continue
+        if tpl == WILDCARD:
+            params.append(tok)
+            continue
+        pattern = "^" + "(.*?)".join(re.escape(p) for p in tpl.split(WILDCARD)) + "$"
+        m = re.match(pattern, tok)
+        if m:
+            params.extend(m.groups())
+        else:
+            params.append(tok)
+    return params
+
+
+class _Cluster:
+    __slots__ = ("id", "tokens", "count")
+
+    def __init__(self, tokens):
+        self.tokens = list(tokens)
+        self.id = template_id(" ".join(self.tokens))
+        self.count = 0
+
+    @property
+    def template(self):
+        return " ".join(self.tokens)
+
+
+class TemplateMiner:
+    """Incremental template miner; add() is thread-safe."""
+
+    def __init__(self, similarity=0.5, max_clusters=1000):
+        self.similarity = similarity
+        self.max_clusters = max_clusters
+        self._buckets = {}  # (token count, first token) -> [_Cluster]
+        self._clusters = 0
+        self._overflow = _Cluster([WILDCARD])
+        self._lock = threading.Lock()
+
+    def _similarity(self, cluster, masked):
+        same = sum(1 for a, b in zip(cluster.tokens, masked) if a == b and a != WILDCARD)
+        return same / len(masked)
+
+    def add(self, line):
+        """Mine one line; returns (template_id, template, params)."""
+        tokens = message_part(line).split()
+        if not tokens:
+            return template_id(""), "", []
+        masked = [mask_token(t) for t in tokens]
+        first = masked[0] if not any(c.isdigit() for c in masked[0]) else WILDCARD
+        key = (len(masked), first)
+
+        with self._lock:
+            bucket = self._buckets.setdefault(key, [])
+            best, best_sim = None, -1.0
+            for cluster in bucket:
+                sim = self._similarity(cluster, masked)
+                if sim > best_sim:
+                    best, best_sim = cluster, sim
+
+            if best is not None and best_sim >= self.similarity:
+                best.tokens = [a if a == b else WILDCARD for a, b in zip(best.tokens, masked)]
+                cluster = best
+            elif self._clusters < self.max_clusters:
+                cluster = _Cluster(masked)
+                bucket.append(cluster)
+                self._clusters += 1
+            else:
+                # Too many templates: every unmatched line shares the catch-all
+                cluster = self._overflow
+
+            cluster.count += 1
+            cluster_id = cluster.id
+            template_tokens = list(cluster.tokens)
+
+        if cluster is self._overflow:
+            return cluster_id, WILDCARD, [" ".join(tokens)]
+        template = " ".join(template_tokens)
+        return cluster_id, template, extract_params(template_tokens, tokens)
+
+    def templates(self):
+        """All known templates, most frequent first."""
+        with self._lock:
+            clusters = [c for bucket in self._buckets.values() for c in bucket]
+            if self._overflow.count:
+                clusters.append(self._overflow)
+            rows = [{"template_id": c.id, "template": c.template, "count": c.count}
+                    for c in clusters]
+        return sorted(rows, key=lambda r: r["count"], reverse=True)
+
+
+class TemplateEmbeddings:
+    """Embed each template text once and reuse the vector for all its lines."""
+
+    def __init__(self, embedding_function, capacity=10_000):
+        self.embedding_function = embedding_function
+        self.capacity = capacity
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+        self.computed = 0
+        self.reused = 0
+
+    def for_batch(self, metas, documents=None):
+        """
+        Embeddings for a batch of metadatas carrying template_id/template.
+
+        Lines of the catch-all template are embedded from `documents`.
+        """
+        # Cached vectors are picked up here, in one lock hold, so another
+        # batch evicting them while this one embeds cannot lose them
+        with self._lock:
+            known = {}
+            missing = {}
+            for m in metas:
+                tid = m["template_id"]
+                if tid in known or tid in missing or (m["template"] == WILDCARD and documents):
+                    continue
+                vector = self._vectors.get(tid)
+                if vector is not None:
+                    self._vectors.move_to_end(tid)
+                    known[tid] = vector
+                else:
+                    missing[tid] = m["template"]
+
+        fresh = {}
+        if missing:
+            vectors = self.embedding_function(list(missing.values()))
+            fresh = {tid: [float(x) for x in v] for tid, v in zip(missing, vectors)}
+        known.update(fresh)
+        own = {}
+        catch_all = [i for i, m in enumerate(metas) if m["template"] == WILDCARD and documents]
+        if catch_all:
+            vectors = self.embedding_function([documents[i] for i in catch_all])
+            own = {i: [float(x) for x in v] for i, v in zip(catch_all, vectors)}
+        result = [own[i] if i in own else known[m["template_id"]] for i, m in enumerate(metas)]
+
+        with self._lock:
+            self._vectors.update(fresh)
+            while len(self._vectors) > self.capacity:
+                self._vectors.popitem(last=False)
+            self.computed += len(fresh)
+            self.reused += len(metas) - len(missing) - len(catch_all)
+            return result
@@ -0,0 +1,210 @@
+"""
+In-memory ChromaDB stand-in for offline runs and benchmarks.
+
+Implements the subset of the chromadb client / collection API that app.py
+and store.py use (get_or_create_collection, list_collections,
+delete_collection; upsert, count, peek, get, query, delete) with exact
+cosine search over numpy arrays and the common where operators ($eq, $ne,
+$gt, $gte, $lt, $lte, $in, $nin, $and, $or).
+
+HashEmbeddingFunction is a deterministic bag-of-words hashing embedder, so
+nothing has to be downloaded; its vectors are meaningless beyond shared
+tokens, which is enough to exercise retrieval.
+
+Usage:
+    CHROMA_BACKEND=memory python app.py
+"""
+import re
+import threading
+import zlib
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9_]+")
+
+
+class HashEmbeddingFunction:
+    """Token-hashing embedder: L2-normalised counts in `dim` buckets."""
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    def __call__(self, input):
+        out = []
+        for text in input:
+            vec = np.zeros(self.dim, dtype=np.float32)
+            for token in TOKEN_RE.findall(text.lower()):
+                vec[zlib.crc32(token.encode()) % self.dim] += 1.0
+            norm = np.linalg.norm(vec)
+            out.append((vec / norm if norm else vec).tolist())
+        return out
+
+
+def _compare(value, op, expected):
+    if op == "$eq":
+        return value == expected
+    if op == "$ne":
+        return value != expected
+    if op == "$in":
+        return value in expected
+    if op == "$nin":
+        return value not in expected
+    if value is None:
+        return False
+    if op == "$gt":
+        return value > expected
+    if op == "$gte":
+        return value >= expected
+    if op == "$lt":
+        return value < expected
+    if op == "$lte":
+        return value <= expected
+    raise ValueError(f"Unsupported where operator: {op}")
+
+
+def matches_where(meta, where):
+    """Evaluate a ChromaDB where filter against one metadata dict."""
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(matches_where(meta, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(matches_where(meta, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            if not all(_compare(meta.get(key), op, v) for op, v in cond.items()):
+                return False
+        elif meta.get(key) != cond:
+            return False
+    return True
+
+
+class InMemoryCollection:
+    def __init__(self, name, metadata=None, embedding_function=None):
+        self.name = name
+        self.metadata = metadata or {}
+        self.embedding_function = embedding_function
+        self._ids = []
+        self._index = {}      # id -> row
+        self._docs = []
+        self._metas = []
+        self._vectors = []
+        self._matrix = None   # stacked vectors, rebuilt lazily after writes
+        self._lock = threading.Lock()
+
+    def count(self):
+        return len(self._ids)
+
+    def upsert(self, ids, documents=None, metadatas=None, embeddings=None):
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+        if embeddings is None:
+            embeddings = self.embedding_function(documents)
+        with self._lock:
+            for doc_id, doc, meta, vec in zip(ids, documents, metadatas, embeddings):
+                vec = np.asarray(vec, dtype=np.float32)
+                row = self._index.get(doc_id)
+                if row is None:
+                    self._index[doc_id] = len(self._ids)
+                    self._ids.append(doc_id)
+                    self._docs.append(doc)
+                    self._metas.append(dict(meta or {}))
+                    self._vectors.append(vec)
+                else:
+                    self._docs[row], self._metas[row], self._vectors[row] = doc, dict(meta or {}), vec
+            self._matrix = None
+
+    add = upsert
+
+    def _rows(self, ids=None, where=None):
+        rows = range(len(self._ids)) if ids is None else [self._index[i] for i in ids if i in self._index]
+        return [r for r in rows if matches_where(self._metas[r], where)]
+
+    def _result(self, rows, include):
+        out = {"ids": [self._ids[r] for r in rows]}
+        if "documents" in include:
+            out["documents"] = [self._docs[r] for r in rows]
+        if "metadatas" in include:
+            out["metadatas"] = [self._metas[r] for r in rows]
+        if "embeddings" in include:
+            out["embeddings"] = [self._vectors[r].tolist() for r in rows]
+        return out
+
+    def get(self, ids=None, where=None, limit=None, offset=0, include=("documents", "metadatas")):
+        with self._lock:
+            rows = self._rows(ids, where)[offset:]
+            return self._result(rows[:limit] if limit else rows, include)
+
+    def peek(self, limit=10):
+        return self.get(limit=limit)
+
+    def delete(self, ids=None, where=None):
+        with self._lock:
+            drop = set(self._rows(ids, where))
+            keep = [r for r in range(len(self._ids)) if r not in drop]
+            self._ids = [self._ids[r] for r in keep]
+            self._docs = [self._docs[r] for r in keep]
+            self._metas = [self._metas[r] for r in keep]
+            self._vectors = [self._vectors[r] for r in keep]
+            self._index = {doc_id: i for i, doc_id in enumerate(self._ids)}
+            self._matrix = None
+
+    def query(self, query_texts=None, query_embeddings=None, n_results=10, where=None,
+              include=("documents", "metadatas", "distances")):
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        with self._lock:
+            if self._matrix is None and self._vectors:
+                self._matrix = np.vstack(self._vectors)
+            rows = np.asarray(self._rows(where=where), dtype=np.int64)
+            for q in query_embeddings:
+                if not len(rows):
+                    picked, dist = [], np.empty(0)
+                else:
+                    q = np.asarray(q, dtype=np.float32)
+                    sub = self._matrix[rows]
+                    sims = sub @ q / ((np.linalg.norm(sub, axis=1) * (np.linalg.norm(q) or 1.0)) + 1e-12)
+                    k = min(n_results, len(rows))
+                    top = np.argpartition(-sims, k - 1)[:k]
+                    top = top[np.argsort(-sims[top])]
+                    picked, dist = rows[top].tolist(), 1.0 - sims[top]
+                res = self._result(picked, include)
+                out["ids"].append(res["ids"])
+                out["documents"].append(res.get("documents", []))
+                out["metadatas"].append(res.get("metadatas", []))
+                out["distances"].append([float(d) for d in dist])
+        return out
+
+
+class InMemoryClient:
+    """Drop-in for chromadb.CloudClient / EphemeralClient."""
+
+    def __init__(self, *args, **kwargs):
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def get_or_create_collection(self, name, metadata=None, embedding_function=None, **kwargs):
+        with self._lock:
+            col = self._collections.get(name)
+            if col is None:
+                col = self._collections[name] = InMemoryCollection(name, metadata, embedding_function)
+            elif embedding_function is not None:
+                col.embedding_function = embedding_function
+            return col
+
+    def get_collection(self, name, embedding_function=None, **kwargs):
+        with self._lock:
+            if name not in self._collections:
+                raise ValueError(f"Collection {name} does not exist.")
+        return self.get_or_create_collection(name, embedding_function=embedding_function)
+
+    def list_collections(self):
+        with self._lock:
+            return list(self._collections.values())
+
+    def delete_collection(self, name):
+        with self._lock:
+            self._collections.pop(name, None)
@@ -0,0 +1,133 @@
+"""
+Offline stand-in for the Gemini REST API used by chat_engine.LLMClient.
+
+Implements, for any model name:
+
+    POST /v1beta/models/<model>:generateContent
+    POST /v1beta/models/<model>:streamGenerateContent?alt=sse
+
+The answer is a canned diagnosis that quotes a few lines of the prompt, so
+the chat path can be exercised end to end. --first-token and --token-delay
+simulate model latency.
+
+Usage:
+    python fake_llm.py --port 8765 --first-token 0.4 --token-delay 0.02
+    GEMINI_BASE_URL=http://localhost:8765/v1beta python app.py
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+ROUTE_RE = re.compile(r"^/v1beta/models/(?P<model>[^:/]+):(?P<method>generateContent|streamGenerateContent)$")
+
+
+# One per template group in the context (context_builder.py)
+GROUP_RE = re.compile(r"^(DEBUG|INFO|WARNING|ERROR|CRITICAL) ")
+
+
+def canned_answer(prompt):
+    """A deterministic answer derived from the prompt."""
+    groups = [l for l in prompt.splitlines() if GROUP_RE.match(l)]
+    errors = [l for l in groups if l.startswith(("ERROR", "CRITICAL"))]
+    question = next((l.split(":", 1)[1].strip() for l in prompt.splitlines()
+                     if l.startswith("User Question:")), "")
+    answer = [
+        f"Diagnosis for: {question or 'your question'}",
+        f"I looked at {len(groups)} kinds of log lines, {len(errors)} of them errors.",
+    ]
+    for line in errors[:3]:
+        answer.append(f"- Notable: {line[:160]}")
+    answer.append("Suggestion: check the affected service's dependencies and connection pools.")
+    return "\n".join(answer)
+
+
+def chunk_words(text, words_per_chunk=3):
+    words = text.split(" ")
+    for i in range(0, len(words), words_per_chunk):
+        yield " ".join(words[i:i + words_per_chunk]) + (" " if i + words_per_chunk < len(words) else "")
+
+
+def _candidate(text):
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+
+def make_handler(first_token=0.3, token_delay=0.02):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def do_POST(self):
+            m = ROUTE_RE.match(urlparse(self.path).path)
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not m:
+                self._json({"error": {"code": 404, "message": "not found"}}, 404)
+                return
+
+            prompt = "".join(p.get("text", "") for c in body.get("contents", [])
+                             for p in c.get("parts", []))
+            answer = canned_answer(prompt)
+            time.sleep(first_token)
+
+            if m.group("method") == "generateContent":
+                time.sleep(token_delay * len(list(chunk_words(answer))))
+                self._json(_candidate(answer))
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            for i, piece in enumerate(chunk_words(answer)):
+                if i:
+                    time.sleep(token_delay)
+                self.wfile.write(f"data: {json.dumps(_candidate(piece))}\r\n\r\n".encode())
+                self.wfile.flush()
+
+        def _json(self, payload, status=200):
+            raw = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=8765, first_token=0.3, token_delay=0.02):
+    """Start the fake LLM in a background thread; returns the server."""
+    server = ThreadingHTTPServer((host, port), make_handler(first_token, token_delay))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini API stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first-token", type=float, default=0.3,
+                        help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.02,
+                        help="seconds between streamed chunks")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.first_token, args.token_delay)
+    print(f"🧪 Fake LLM listening on http://{args.host}:{args.port}/v1beta")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Minimal in-memory Loki stand-in for offline testing of the ingest path.
+
+Implements just enough of the Loki HTTP API for app.py:
+
+    GET  /ready
+    POST /loki/api/v1/push          (JSON push format)
+    GET  /loki/api/v1/query_range   (forward/backward, start/end/limit)
+    GET  /loki/api/v1/labels
+    GET  /loki/api/v1/series
+    GET  /loki/api/v1/tail          (WebSocket, RFC 6455 text frames)
+
+Only equality label matchers ({job="fake_logs"}) are understood. With
+--rate, synthetic lines are made by generate_logs.LineGenerator.
+
+Usage:
+    python fake_loki.py --port 3100 --rate 5
+    python fake_loki.py --replay ../fake_logs/app.log --no-tail
+    LOKI_URL=http://localhost:3100 python app.py
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import queue
+import re
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FAKE_LOGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fake_logs")
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+DEFAULT_LABELS = {"job": "fake_logs", "host": "fake-loki"}
+MATCHER_RE = re.compile(r'(\w+)\s*=\s*"((?:[^"\\]|\\.)*)"')
+
+def parse_selector(query):
+    """Parse the equality matchers of a LogQL stream selector."""
+    return dict(MATCHER_RE.findall(query or ""))
+
+
+def matches(labels, selector):
+    return all(labels.get(k) == v for k, v in selector.items())
+
+
+class FakeLokiStore:
+    """Thread-safe per-stream log storage with tail subscriptions."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._streams = {}  # label tuple -> list[(ts_int, line)]
+        self._subscribers = []  # (selector, queue)
+        self._last_ts = 0
+
+    def _next_ts(self, ts=None):
+        if ts is None:
+            ts = max(time.time_ns(), self._last_ts + 1)
+        else:
+            ts = int(ts)
+        self._last_ts = max(self._last_ts, ts)
+        return ts
+
+    def push(self, labels, entries):
+        """Append [(ts, line), ...] to the stream identified by labels."""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self._streams.setdefault(key, [])
+            added = []
+            for ts, line in entries:
+                ts = self._next_ts(ts)
+                values.append((ts, line))
+                added.append([str(ts), line])
+            values.sort(key=lambda v: v[0])
+            subscribers = list(self._subscribers)
+
+        for selector, q in subscribers:
+            if matches(labels, selector):
+                q.put({"stream": dict(labels), "values": added})
+
+    def append(self, line, labels=None):
+        self.push(labels or DEFAULT_LABELS, [(None, line)])
+
+    def query_range(self, query, start, end, limit, direction="backward"):
+        selector = parse_selector(query)
+        with self._lock:
+            picked = []
+            for key, values in self._streams.items():
+                labels = dict(key)
+                if not matches(labels, selector):
+                    continue
+                for ts, line in values:
+                    if start <= ts <= end:
+                        picked.append((ts, labels, line))
+
+        picked.sort(key=lambda p: p[0], reverse=(direction == "backward"))
+        picked = picked[:limit]
+
+        grouped = {}
+        for ts, labels, line in picked:
+            key = tuple(sorted(labels.items()))
+            grouped.setdefault(key, []).append([str(ts), line])
+        return [{"stream": dict(k), "values": v} for k, v in grouped.items()]
+
+    def labels(self):
+        with self._lock:
+            return sorted({k for key in self._streams for k, _ in key})
+
+    def series(self, query):
+        selector = parse_selector(query)
+        with self._lock:
+            return [dict(k) for k in self._streams if matches(dict(k), selector)]
+
+    def subscribe(self, query):
+        q = queue.Queue()
+        with self._lock:
+            self._subscribers.append((parse_selector(query), q))
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[1] is not q]
+
+
+def ws_frame(payload):
+    """Encode an unmasked server->client WebSocket text frame."""
+    data = payload.encode()
+    header = bytearray([0x81])
+    if len(data) < 126:
+        header.append(len(data))
+    elif len(data) < 65536:
+        header.append(126)
+        header += struct.pack(">H", len(data))
+    else:
+        header.append(127)
+        header += struct.pack(">Q", len(data))
+    return bytes(header) + data
+
+
+def make_handler(store, tail_enabled=True):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _json(self, body, status=200):
+            raw = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            args = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+            if url.path == "/ready":
+                raw = b"ready\n"
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+            elif url.path == "/loki/api/v1/query_range":
+                now = time.time_ns()
+                result = store.query_range(
+                    args.get("query", ""),
+                    int(args.get("start", now - 3600 * 1_000_000_000)),
+                    int(args.get("end", now)),
+                    int(args.get("limit", 100)),
+                    args.get("direction", "backward"),
+                )
+                self._json({"status": "success",
+                            "data": {"resultType": "streams", "result": result}})
+            elif url.path == "/loki/api/v1/labels":
+                self._json({"status": "success", "data": store.labels()})
+            elif url.path == "/loki/api/v1/series":
+                self._json({"status": "success",
+                            "data": store.series(args.get("match[]", ""))})
+            elif url.path == "/loki/api/v1/tail" and tail_enabled:
+                self._tail(args)
+            else:
+                self._json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/loki/api/v1/push":
+                self._json({"error": "not found"}, 404)
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            for stream in body.get("streams", []):
+                store.push(stream.get("stream", {}), stream.get("values", []))
+            self.send_response(204)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def _tail(self, args):
+            key = self.headers.get("Sec-WebSocket-Key")
+            if not key or self.headers.get("Upgrade", "").lower() != "websocket":
+                self._json({"error": "websocket upgrade required"}, 400)
+                return
+            accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+            self.send_response(101, "Switching Protocols")
+            self.send_header("Upgrade", "websocket")
+            self.send_header("Connection", "Upgrade")
+            self.send_header("Sec-WebSocket-Accept", accept)
+            self.end_headers()
+            self.close_connection = True
+
+            query = args.get("query", "")
+            q = store.subscribe(query)
+            try:
+                start = int(args.get("start", time.time_ns() - 3600 * 1_000_000_000))
+                backlog = store.query_range(query, start, time.time_ns(),
+                                            int(args.get("limit", 100)), "forward")
+                if backlog:
+                    self.wfile.write(ws_frame(json.dumps({"streams": backlog})))
+                    self.wfile.flush()
+                while True:
+                    try:
+                        stream = q.get(timeout=1.0)
+                    except queue.Empty:
+                        continue
+                    self.wfile.write(ws_frame(json.dumps({"streams": [stream]})))
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError, OSError):
+                pass
+            finally:
+                store.unsubscribe(q)
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=3100, store=None, tail_enabled=True):
+    """Start the fake Loki in a background thread; returns (server, store)."""
+    store = store or FakeLokiStore()
+    server = ThreadingHTTPServer((host, port), make_handler(store, tail_enabled))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory Loki stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3100)
+    parser.add_argument("--rate", type=float, default=2.0,
+                        help="synthetic lines per second (0 to disable)")
+    parser.add_argument("--seed", type=int, help="seed for the synthetic lines")
+    parser.add_argument("--replay", help="log file to preload, one line per entry")
+    parser.add_argument("--no-tail", action="store_true",
+                        help="answer /tail with 404 to exercise the polling fallback")
+    args = parser.parse_args()
+
+    server, store = serve(args.host, args.port, tail_enabled=not args.no_tail)
+    print(f"🧪 Fake Loki listening on http://{args.host}:{args.port}"
+          f" (tail {'off' if args.no_tail else 'on'})")
+
+    if args.replay:
+        with open(args.replay, encoding="utf-8", errors="replace") as f:
+            lines = [l.rstrip("\n") for l in f if l.strip()]
+        base = time.time_ns() - len(lines) * 1_000_000
+        store.push(DEFAULT_LABELS, [(base + i * 1_000_000, l) for i, l in enumerate(lines)])
+        print(f"   Preloaded {len(lines)} lines from {args.replay}")
+
+    # Synthetic lines come from the same templates as fake_logs/generate_logs.py
+    sys.path.insert(0, FAKE_LOGS_DIR)
+    from generate_logs import LineGenerator
+    gen = LineGenerator(seed=args.seed)
+
+    try:
+        while True:
+            if args.rate > 0:
+                store.append(gen.line()[1])
+                time.sleep(1.0 / args.rate)
+            else:
+                time.sleep(1.0)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Loki ingestion loops, leader election and sharding.
+
+One SelectorIngester follows one LogQL stream selector: it pages through
+query_range from its cursor, then tails (or polls) for new lines, and hands
+every batch of streams to app.py's ingest_streams(). Each selector, and each
+shard, keeps its own cursor file, so selectors and shards resume
+independently.
+
+Only one process per host may ingest a given shard: LeaderLock takes an
+exclusive flock on a file under INGEST_STATE_DIR. Under gunicorn every
+worker tries for it, one wins, and the others stand by and retry, so a
+worker that dies (and with it its lock) is replaced by another one.
+
+Sharding splits streams by a stable hash of their labels. Every shard still
+reads the whole selector from Loki (LogQL cannot hash), so the cursor moves
+over all lines, but only the owning shard templates, embeds and upserts a
+stream's lines, which is where ingest time goes. Changing INGEST_SHARDS
+starts new cursor files; re-read lines are deduplicated by their IDs.
+
+API workers that do not ingest still answer /chat and /logs (from the
+vector store and Loki), but /aggregate, /incidents, /templates and /stream
+need the in-memory views of an ingesting process and return 503 there.
+
+Usage (API workers serve only, ingestion in separate shard processes):
+    INGEST_ROLE=api gunicorn -w 4 -b 0.0.0.0:5000 'app:create_app()'
+    python ingester.py --shard 0 --shards 2
+    python ingester.py --shard 1 --shards 2
+"""
+import argparse
+import logging
+import os
+import signal
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: every process becomes leader
+    fcntl = None
+
+from cursor import stream_key
+from loki_tail import LokiTailer, TailUnavailable
+import metrics
+from upstream import CircuitOpen
+
+log = logging.getLogger(__name__)
+
+DEFAULT_SELECTOR = '{job="fake_logs"}'
+
+
+def parse_selectors(value):
+    """LogQL selectors from LOKI_SELECTORS, separated by ';' or newlines."""
+    selectors = [s.strip() for s in value.replace("\n", ";").split(";")]
+    return [s for s in selectors if s] or [DEFAULT_SELECTOR]
+
+
+def shard_of(labels, shards):
+    """Shard (0..shards-1) that owns a stream; stable across processes and restarts."""
+    if shards <= 1:
+        return 0
+    return zlib.crc32(stream_key(labels).encode()) % shards
+
+
+def cursor_path(state_dir, selector, shard=0, shards=1):
+    """
+    Cursor file for one selector and shard. The single-selector, unsharded
+    default keeps the original ingest_cursor.json.
+    """
+    name = "ingest_cursor"
+    if selector != DEFAULT_SELECTOR:
+        name += f"-{zlib.crc32(selector.encode()):08x}"
+    if shards > 1:
+        name += f"-shard{shard}of{shards}"
+    return os.path.join(state_dir, name + ".json")
+
+
+def lock_path(state_dir, shard=0, shards=1):
+    name = "ingest.lock" if shards <= 1 else f"ingest-shard{shard}of{shards}.lock"
+    return os.path.join(state_dir, name)
+
+
+class LeaderLock:
+    """Exclusive, non-blocking flock; held until release() or process exit."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    @property
+    def held(self):
+        return self._fd is not None
+
+    def acquire(self):
+        """Try once; True if this process is (now) the leader."""
+        if self._fd is not None:
+            return True
+        if fcntl is None:
+            self._fd = -1
+            return True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        # Owner's pid, for humans looking at the state dir
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is None:
+            return
+        if self._fd >= 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+        self._fd = None
+
+
+class SelectorIngester:
+    """Catch-up, tail and poll loops for one selector and one cursor."""
+
+    def __init__(self, loki, loki_url, selector, cursor, ingest, is_running,
+                 shard=0, shards=1, mode="tail", page_size=1000, max_page_size=5000,
+                 poll_interval=3.0, tail_max_backoff=30.0, tail_max_failures=5, tail_retry=300.0):
+        self.loki = loki
+        self.loki_url = loki_url
+        self.selector = selector
+        self.cursor = cursor
+        self.ingest = ingest
+        self.is_running = is_running
+        self.shard = shard
+        self.shards = shards
+        self.mode = mode
+        self.page_size = page_size
+        self.max_page_size = max(page_size, max_page_size)
+        self.poll_interval = poll_interval
+        self.tail_max_backoff = tail_max_backoff
+        self.tail_max_failures = tail_max_failures
+        self.tail_retry = tail_retry
+        self.last_fetch = None
+
+    def owns(self, labels):
+        return shard_of(labels, self.shards) == self.shard
+
+    def catch_up(self):
+        """
+        Page through query_range from the cursor until "now".
+
+        The first page starts at the cursor's start and each later one at
+        the newest timestamp of the page before (inclusive); the cursor's
+        per-stream watermarks drop the lines already taken, so bursts larger
+        than one page and lines sharing a timestamp are not lost. Loki cannot
+        page within one timestamp, so a full page that does not get past its
+        start is asked for again with twice the limit, up to max_page_size.
+        Returns True once the backlog is drained, False on any error.
+        """
+        cursor = self.cursor
+        end_time = time.time_ns()
+        start_ts = cursor.start
+        limit = self.page_size
+        pages = 0
+        fetched = 0
+
+        while self.is_running():
+            params = {
+                "query": self.selector,
+                "start": str(start_ts),
+                "end": str(end_time),
+                "limit": limit,
+                "direction": "forward"
+            }
+
+            started = time.perf_counter()
+            try:
+                res = self.loki.get("/loki/api/v1/query_range", params=params)
+            except CircuitOpen as e:
+                log.debug("Catch-up skipped: %s", e)
+                return False
+            except Exception as e:
+                log.warning("⚠️  Catch-up %s: cannot reach Loki: %s", self.selector, e)
+                return False
+            finally:
+                metrics.LOKI_FETCH_SECONDS.labels("query_range").observe(time.perf_counter() - started)
+
+            self.last_fetch = time.time()
+
+            if res.status_code != 200:
+                log.error("❌ Catch-up %s: Loki error %d: %s", self.selector, res.status_code, res.text[:200])
+                return False
+
+            results = res.json().get("data", {}).get("result", [])
+            page_lines = sum(len(s.get("values", [])) for s in results)
+            metrics.LOKI_LINES_PER_FETCH.labels("query_range").observe(page_lines)
+            pages += 1
+            fetched += page_lines
+
+            if results:
+                self.ingest(results, cursor, self.owns)
+
+            if page_lines < limit:
+                break
+
+            newest = max(int(ts) for s in results for ts, _ in s.get("values", []))
+            if newest > start_ts:
+                start_ts = newest
+                limit = self.page_size
+            elif limit < self.max_page_size:
+                # Every line of the page shares one timestamp: ask for more of
+                # them rather than stepping past the ones that did not fit
+                limit = min(limit * 2, self.max_page_size)
+            else:
+                log.warning("⚠️  Catch-up: >%d lines at ts %d, more than Loki returns at once; "
+                            "skipping past it", limit, start_ts)
+                cursor.skip_past(start_ts)
+                start_ts += 1
+                limit = self.page_size
+
+        if pages > 1 or fetched:
+            log.info("📡 Catch-up %s: %d lines in %d page(s), cursor at %d",
+                     self.selector, fetched, pages, cursor.ts)
+        return True
+
+    def tail(self):
+        """Push-based ingestion over Loki's tail WebSocket; returns when tail is unusable."""
+
+        def on_streams(streams):
+            self.last_fetch = time.time()
+            metrics.LOKI_LINES_PER_FETCH.labels("tail").observe(
+                sum(len(s.get("values", [])) for s in streams))
+            self.ingest(streams, self.cursor, self.owns)
+
+        tailer = LokiTailer(
+            self.loki_url,
+            self.selector,
+            on_streams=on_streams,
+            get_start=lambda: self.cursor.start,
+            is_running=self.is_running,
+            before_connect=self.catch_up,
+            max_backoff=self.tail_max_backoff,
+            max_failures=self.tail_max_failures
+        )
+        try:
+            tailer.run()
+        except TailUnavailable as e:
+            log.warning("⚠️  Loki tail unavailable for %s (%s); falling back to polling", self.selector, e)
+
+    def poll(self, until=None):
+        """Poll with catch-up until stopped or, if given, until time.monotonic() passes `until`."""
+        poll_count = 0
+        consecutive_errors = 0
+
+        while self.is_running() and (until is None or time.monotonic() < until):
+            try:
+                poll_count += 1
+
+                # No readiness probe: the Loki upstream's circuit breaker learns
+                # health from the query itself and fails fast while Loki is down
+                if self.catch_up():
+                    consecutive_errors = 0
+                else:
+                    consecutive_errors += 1
+                    if consecutive_errors == 3:
+                        log.info("💡 Make sure Loki container is running: docker-compose ps loki")
+
+            except Exception as e:
+                log.exception("❌ Poll #%d (%s): Unexpected error: %s", poll_count, self.selector, e)
+                consecutive_errors += 1
+
+            time.sleep(self.poll_interval)
+
+    def run(self):
+        log.info("🔄 Ingesting %s from %s (shard %d/%d, mode: %s), cursor %d (%s)",
+                 self.selector, self.loki_url, self.shard, self.shards, self.mode,
+                 self.cursor.ts, self.cursor.path)
+        if self.mode != "tail":
+            self.poll()
+            return
+        # Polling is only a fallback: try tailing again every tail_retry
+        # seconds, e.g. once a slow-starting Loki is up
+        while self.is_running():
+            self.tail()
+            if self.is_running():
+                self.poll(until=time.monotonic() + self.tail_retry)
+            if self.is_running():
+                log.info("🔁 Retrying Loki tail for %s", self.selector)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run Loki ingestion without serving the API")
+    parser.add_argument("--shard", type=int, default=int(os.getenv("INGEST_SHARD", "0")))
+    parser.add_argument("--shards", type=int, default=int(os.getenv("INGEST_SHARDS", "1")))
+    parser.add_argument("--selector", action="append", default=[],
+                        help="LogQL stream selector (repeatable); default LOKI_SELECTORS")
+    args = parser.parse_args()
+    if not 0 <= args.shard < args.shards:
+        parser.error("--shard must be in [0, --shards)")
+
+    # app.py reads its configuration at import time
+    os.environ["INGEST_ROLE"] = "ingest"
+    os.environ["INGEST_SHARD"] = str(args.shard)
+    os.environ["INGEST_SHARDS"] = str(args.shards)
+    if args.selector:
+        os.environ["LOKI_SELECTORS"] = ";".join(args.selector)
+
+    import app
+    app.create_app()
+
+    stop = threading.Event()
+
+    def interrupt(signum, frame):
+        log.warning("⏹️  Stopping ingester shard %d/%d", args.shard, args.shards)
+        stop.set()
+
+    signal.signal(signal.SIGINT, interrupt)
+    signal.signal(signal.SIGTERM, interrupt)
+    stop.wait()
+    app.stop_ingest()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Parsing of ingested log lines: header and key=value fields.
+
+Lines from generate_logs.py look like
+
+    2025-10-28 18:48:57,732 [ERROR] [db-connection] DB connection timeout after 3523ms while acquiring from pool_size=20
+
+and older ones (most of fake_logs/app.log) like
+
+    2025-10-29 16:47:41,612 ERROR: Authentication error
+    2025-10-29 16:47:41,612 ERROR:db-connection:Deadlock detected
+
+parse_line() splits off level, service (the logger, when there is one) and
+message; extract_fields() pulls typed fields out of the message:
+
+    pool_size=20       -> 20 (int), ratio=0.5 -> 0.5 (float)
+    user_id=1234       -> "1234"   (identifiers stay strings)
+    topic=auth-events  -> "auth-events"
+    "after 3523ms"     -> latency_ms 3523.0
+
+The same parsing feeds the stored metadata (records.py), the rollups'
+numeric measurements (measurements()), the lexical index and template
+mining (drain.py).
+"""
+import re
+
+# "2025-10-28 18:48:57,732 [ERROR] [db-connection] message" (generate_logs.py),
+# or "2025-10-28 18:48:57,732 ERROR: message" / "... ERROR:db-connection:message"
+LINE_RE = re.compile(
+    r"^\S+ \S+ (?:\[(?P<level>[A-Z]+)\] \[(?P<service>[^\]]+)\] "
+    r"|(?P<bare_level>[A-Z]+):(?:(?P<logger>[\w.\-]+):)? ?)(?P<message>.*)$",
+    re.DOTALL)
+
+LATENCY_RE = re.compile(r"\b(\d+(?:\.\d+)?)\s?ms\b")
+FIELD_KV_RE = re.compile(r"\b([A-Za-z_][\w.]*)=([^\s,;()\[\]\"']+)")
+INT_RE = re.compile(r"^-?\d{1,18}$")
+FLOAT_RE = re.compile(r"^-?\d+\.\d+$")
+
+# Numeric-looking values that name things rather than measure them
+ID_FIELDS = {"id", "key"}
+# ...and numbers that are positions, not measurements
+POSITION_FIELDS = {"offset"}
+MAX_FIELDS = 12
+MAX_FIELD_CHARS = 128
+
+
+def parse_line(line):
+    """(level, service or None, message) from a log line, or (None, None, line)."""
+    m = LINE_RE.match(line)
+    if not m:
+        return None, None, line
+    if m.group("level"):
+        return m.group("level"), m.group("service"), m.group("message")
+    return m.group("bare_level"), m.group("logger"), m.group("message")
+
+
+def field_value(key, value):
+    """A key=value value as the type it is stored with."""
+    if key in ID_FIELDS or key.endswith("_id"):
+        return value
+    if INT_RE.match(value):
+        return int(value)
+    if FLOAT_RE.match(value):
+        return float(value)
+    return value
+
+
+def extract_fields(message, latency=True):
+    """Typed key=value fields in a message (plus latency_ms from "...3523ms")."""
+    fields = {}
+    if latency:
+        m = LATENCY_RE.search(message)
+        if m:
+            fields["latency_ms"] = float(m.group(1))
+    for key, value in FIELD_KV_RE.findall(message):
+        key = key.lower()
+        value = value.rstrip(".:?!")[:MAX_FIELD_CHARS]
+        if not value or key in fields:
+            continue
+        if len(fields) >= MAX_FIELDS:
+            break
+        fields[key] = field_value(key, value)
+    return fields
+
+
+def measurements(message):
+    """Numeric measurements in a message, e.g. {"latency_ms": 3523.0, "pool_size": 20.0}."""
+    return {key: float(value) for key, value in extract_fields(message).items()
+            if isinstance(value, (int, float)) and key not in POSITION_FIELDS}
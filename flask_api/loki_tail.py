@@ -0,0 +1,147 @@
+"""
+Push-based log ingestion from Loki's /loki/api/v1/tail WebSocket.
+
+The tailer keeps one long-lived connection open and hands every batch of
+streams it receives to a callback (the same shape as a query_range result,
+so the existing upsert path can consume it unchanged). On disconnect it
+reconnects with jittered exponential backoff and resumes from the last
+timestamp the caller has seen (after an optional before_connect hook, which
+app.py uses to page through any gap with query_range). If tailing is not possible at all it raises
+TailUnavailable so the caller can fall back to range polling.
+"""
+import json
+import logging
+import random
+import time
+from urllib.parse import urlencode
+
+try:
+    import websocket  # websocket-client
+except ImportError:  # optional: without it we always fall back to polling
+    websocket = None
+
+log = logging.getLogger(__name__)
+
+
+class TailUnavailable(Exception):
+    """Loki tail cannot be used; the caller should poll instead."""
+
+
+def tail_url(loki_url, query, start_ns, limit=1000, delay_for=0):
+    """Build the ws:// (or wss://) tail URL for a query starting at start_ns."""
+    if loki_url.startswith("https://"):
+        base = "wss://" + loki_url[len("https://"):]
+    elif loki_url.startswith("http://"):
+        base = "ws://" + loki_url[len("http://"):]
+    else:
+        base = loki_url
+    params = {
+        "query": query,
+        "start": str(start_ns),
+        "limit": limit,
+        "delay_for": delay_for,
+    }
+    return f"{base.rstrip('/')}/loki/api/v1/tail?{urlencode(params)}"
+
+
+class LokiTailer:
+    """Tail a LogQL query and feed received streams into on_streams."""
+
+    def __init__(self, loki_url, query, on_streams, get_start, is_running,
+                 before_connect=None, limit=1000, connect_timeout=5.0,
+                 idle_timeout=30.0, min_backoff=1.0, max_backoff=30.0, max_failures=5):
+        self.loki_url = loki_url
+        self.query = query
+        self.on_streams = on_streams
+        self.get_start = get_start
+        self.is_running = is_running
+        self.before_connect = before_connect
+        self.limit = limit
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.max_failures = max_failures
+
+        self.connected = False
+        self.reconnects = 0
+        self.dropped_entries = 0
+
+    def _sleep_backoff(self, attempt):
+        delay = min(self.max_backoff, self.min_backoff * (2 ** (attempt - 1)))
+        delay = random.uniform(delay / 2, delay)
+        log.info("⏳ Tail reconnecting in %.1fs (attempt %d)", delay, attempt)
+        end = time.time() + delay
+        while self.is_running() and time.time() < end:
+            time.sleep(min(0.5, end - time.time()))
+
+    def _connect(self):
+        if self.before_connect is not None:
+            # e.g. drain the gap since the last connection via query_range,
+            # since tail itself only replays a bounded number of lines
+            self.before_connect()
+        url = tail_url(self.loki_url, self.query, self.get_start(), self.limit)
+        ws = websocket.create_connection(url, timeout=self.connect_timeout)
+        ws.settimeout(self.idle_timeout)
+        return ws
+
+    def _consume(self, ws):
+        """Read messages until the connection closes or we are stopped."""
+        while self.is_running():
+            try:
+                raw = ws.recv()
+            except websocket.WebSocketTimeoutException:
+                # Quiet stream; loop so a stop request is noticed.
+                continue
+            if not raw:
+                return
+            data = json.loads(raw)
+            dropped = data.get("dropped_entries") or []
+            if dropped:
+                self.dropped_entries += len(dropped)
+                log.warning("⚠️  Loki dropped %d tail entries (consumer too slow)", len(dropped))
+            streams = data.get("streams") or []
+            if streams:
+                self.on_streams(streams)
+
+    def run(self):
+        """
+        Tail until is_running() turns false.
+
+        Raises TailUnavailable when the client library is missing, Loki
+        rejects the tail handshake, or max_failures connects fail in a row.
+        """
+        if websocket is None:
+            raise TailUnavailable("websocket-client is not installed")
+
+        failures = 0
+        while self.is_running():
+            try:
+                ws = self._connect()
+            except websocket.WebSocketBadStatusException as e:
+                raise TailUnavailable(f"tail handshake rejected (status {e.status_code})")
+            except Exception as e:
+                failures += 1
+                log.warning("⚠️  Tail connect failed (%d/%d): %s", failures, self.max_failures, e)
+                if failures >= self.max_failures:
+                    raise TailUnavailable(f"{failures} consecutive connect failures")
+                self._sleep_backoff(failures)
+                continue
+
+            failures = 0
+            self.connected = True
+            log.info("🔌 Tailing Loki: %s (from %s)", self.query, self.get_start())
+            try:
+                self._consume(ws)
+            except Exception as e:
+                log.warning("⚠️  Tail connection lost: %s", e)
+            finally:
+                self.connected = False
+                try:
+                    ws.close()
+                except Exception:
+                    pass
+
+            if self.is_running():
+                self.reconnects += 1
+                self._sleep_backoff(1)
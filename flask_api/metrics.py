@@ -0,0 +1,59 @@
+"""
+Prometheus metrics for the ingest path and /chat.
+
+Scraped by the flask-api job in prometheus/prometheus.yml through the
+/metrics route in app.py. Gauges that mirror in-process state (queue depth,
+ingest lag, SSE clients) are registered as callbacks by app.py so they are
+computed at scrape time instead of on the hot path.
+"""
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+CHAT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+LINE_BUCKETS = (0, 1, 10, 50, 100, 250, 500, 1000, 5000)
+
+LOKI_FETCH_SECONDS = Histogram(
+    "logs_loki_fetch_seconds", "Latency of Loki query_range fetches",
+    ["source"], buckets=LATENCY_BUCKETS)
+LOKI_LINES_PER_FETCH = Histogram(
+    "logs_loki_lines_per_fetch", "Lines returned per Loki fetch or tail message",
+    ["source"], buckets=LINE_BUCKETS)
+
+UPSERT_BATCH_SIZE = Histogram(
+    "logs_upsert_batch_size", "Lines per ChromaDB upsert batch", buckets=LINE_BUCKETS)
+UPSERT_SECONDS = Histogram(
+    "logs_upsert_seconds", "Latency of ChromaDB upsert batches (including embedding)",
+    buckets=LATENCY_BUCKETS)
+UPSERT_FAILURES = Counter(
+    "logs_upsert_failures_total", "Failed ChromaDB upsert attempts")
+DEAD_LETTERED = Counter(
+    "logs_dead_lettered_lines_total", "Lines given up on after UPSERT_MAX_ATTEMPTS failed upserts")
+
+LINES_INGESTED = Counter(
+    "logs_ingested_lines_total", "Lines upserted into the vector store")
+DEDUP_DROPS = Counter(
+    "logs_dedup_dropped_total", "Lines dropped because their ID was already ingested")
+
+INGEST_LAG = Gauge(
+    "logs_ingest_lag_seconds", "Now minus the timestamp of the newest upserted line")
+QUEUE_DEPTH = Gauge(
+    "logs_ingest_queue_depth", "Lines waiting in the upsert queue")
+SSE_CLIENTS = Gauge(
+    "logs_stream_clients", "Connected /stream clients")
+
+UPSTREAM_UP = Gauge(
+    "logs_upstream_up", "1 if the backend's circuit is closed and its last call succeeded",
+    ["backend"])
+
+INCIDENTS = Counter(
+    "logs_incidents_total", "Spikes flagged by the anomaly detector",
+    ["kind"])
+
+CHAT_STAGE_SECONDS = Histogram(
+    "logs_chat_stage_seconds", "Latency of /chat stages",
+    ["stage"], buckets=CHAT_BUCKETS)
+
+
+def exposition():
+    """(body, content type) for the /metrics route."""
+    return generate_latest(), CONTENT_TYPE_LATEST
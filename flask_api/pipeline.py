@@ -0,0 +1,236 @@
+"""
+Staged ingest: a bounded queue between the Loki fetcher and upsert workers.
+
+The fetcher calls submit() with a unit of records (one fetched batch). A
+pool of workers drains the queue into upsert batches that are closed by
+record count, payload bytes or a maximum wait, whichever comes first. When
+the queue is full submit() blocks, which slows the fetcher down instead of
+buffering without bound.
+
+Each unit may carry an on_commit callback. Callbacks run strictly in submit
+order, and only once every record of that unit *and of all earlier units*
+has been upserted, so the caller can persist its cursor from them without
+ever skipping lines that are still in flight. Failed upserts are retried
+with backoff, up to max_attempts times; a batch that still fails (e.g.
+metadata the store rejects) is handed to `dead_letter` and counted as done,
+so one poison batch cannot hold back every later commit. DeadLetterFile
+keeps such batches as JSON lines that backfill.py --dead-letter replays.
+"""
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+
+class DeadLetterFile:
+    """Append failed records to a JSON-lines file: {"id", "document", "metadata", "error"}."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, records, error):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            for doc_id, doc, meta in records:
+                f.write(json.dumps({"id": doc_id, "document": doc, "metadata": meta,
+                                    "error": str(error)}) + "\n")
+
+    @staticmethod
+    def read(path):
+        """Yield the (id, document, metadata) records of a dead-letter file."""
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    yield entry["id"], entry["document"], entry["metadata"]
+
+
+class IngestPipeline:
+    """Bounded, batched, multi-worker upsert stage."""
+
+    def __init__(self, sink, workers=2, max_queue=10_000, batch_size=250,
+                 batch_bytes=512 * 1024, max_latency=0.25, max_backoff=30.0,
+                 max_attempts=10, dead_letter=None):
+        self.sink = sink  # sink(ids, docs, metas), raises on failure
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+        self.max_latency = max_latency
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.dead_letter = dead_letter  # dead_letter(records, error) for batches given up on
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._seq = itertools.count()
+        self._pending = OrderedDict()  # seq -> [remaining, on_commit]
+        self._pending_lock = threading.Lock()
+        self._commit_lock = threading.Lock()
+        self._threads = []
+        self._stopping = threading.Event()
+
+        self.batches = 0
+        self.records = 0
+        self.failures = 0
+        self.dead_lettered = 0
+        self.last_batch_size = 0
+        self.last_batch_seconds = 0.0
+
+    # ----------------------------------------------------------------
+    # Producer side
+    # ----------------------------------------------------------------
+    def submit(self, records, on_commit=None):
+        """
+        Enqueue records [(id, doc, meta), ...] as one unit.
+
+        Blocks while the queue is full (backpressure).
+        """
+        seq = next(self._seq)
+        with self._pending_lock:
+            self._pending[seq] = [len(records), on_commit]
+        if not records:
+            self._complete({seq: 0})
+            return
+        for record in records:
+            self._queue.put((seq, record))
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def in_flight(self):
+        with self._pending_lock:
+            return sum(p[0] for p in self._pending.values())
+
+    # ----------------------------------------------------------------
+    # Worker side
+    # ----------------------------------------------------------------
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"upsert-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self, timeout=10.0):
+        """Let workers drain what is queued, then stop them."""
+        self._stopping.set()
+        deadline = time.time() + timeout
+        for t in self._threads:
+            t.join(max(0.0, deadline - time.time()))
+        return self.in_flight() == 0
+
+    def _next_batch(self):
+        try:
+            first = self._queue.get(timeout=0.2)
+        except queue.Empty:
+            return None
+
+        batch = [first]
+        size = len(first[1][1])
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.batch_size and size < self.batch_bytes:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[1][1])
+        return batch
+
+    def _work(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                if self._stopping.is_set():
+                    return
+                continue
+
+            ids = [r[0] for _, r in batch]
+            docs = [r[1] for _, r in batch]
+            metas = [r[2] for _, r in batch]
+
+            attempt = 0
+            while True:
+                started = time.time()
+                try:
+                    self.sink(ids, docs, metas)
+                    stored = True
+                    break
+                except Exception as e:
+                    attempt += 1
+                    with self._pending_lock:
+                        self.failures += 1
+                    if attempt >= self.max_attempts:
+                        self._give_up([r for _, r in batch], e)
+                        stored = False
+                        break
+                    delay = min(self.max_backoff, 0.5 * (2 ** (attempt - 1)))
+                    delay = random.uniform(delay / 2, delay)
+                    log.warning("❌ Upsert of %d logs failed (attempt %d/%d): %s; retrying in %.1fs",
+                                len(ids), attempt, self.max_attempts, e, delay)
+                    time.sleep(delay)
+
+            with self._pending_lock:
+                if stored:
+                    self.batches += 1
+                    self.records += len(ids)
+                    self.last_batch_size = len(ids)
+                    self.last_batch_seconds = time.time() - started
+                else:
+                    self.dead_lettered += len(ids)
+
+            done = {}
+            for seq, _ in batch:
+                done[seq] = done.get(seq, 0) + 1
+            self._complete(done)
+
+    def _give_up(self, records, error):
+        log.error("💀 Giving up on %d logs after %d attempts: %s", len(records), self.max_attempts, error)
+        if self.dead_letter is None:
+            return
+        try:
+            self.dead_letter(records, error)
+        except Exception as e:
+            log.exception("❌ Could not dead-letter %d logs: %s", len(records), e)
+
+    def _complete(self, done):
+        """Account finished records and run on_commit for the completed prefix."""
+        with self._commit_lock:
+            ready = []
+            with self._pending_lock:
+                for seq, n in done.items():
+                    self._pending[seq][0] -= n
+                while self._pending:
+                    seq, (remaining, on_commit) = next(iter(self._pending.items()))
+                    if remaining > 0:
+                        break
+                    self._pending.popitem(last=False)
+                    if on_commit is not None:
+                        ready.append(on_commit)
+            for on_commit in ready:
+                try:
+                    on_commit()
+                except Exception as e:
+                    log.exception("⚠️  Commit callback failed: %s", e)
+
+    def stats(self):
+        return {
+            "queued": self.qsize(),
+            "in_flight": self.in_flight(),
+            "workers": self.workers,
+            "batches": self.batches,
+            "records": self.records,
+            "failures": self.failures,
+            "dead_lettered": self.dead_lettered,
+            "last_batch_size": self.last_batch_size,
+            "last_batch_seconds": round(self.last_batch_seconds, 4),
+        }
@@ -0,0 +1,66 @@
+"""
+Shared in-memory ring buffer of recently ingested log lines.
+
+The ingest path appends every new line; /logs serves from here instead of
+sending a fresh query_range to Loki for every dashboard poll. Each entry
+gets a monotonically increasing sequence number, which clients pass back
+as `since` to receive only what is new, one page at a time.
+"""
+import threading
+from collections import deque
+from itertools import islice
+
+
+class RecentLogs:
+    """Bounded, thread-safe buffer of (seq, ts, line, labels)."""
+
+    def __init__(self, capacity=5000):
+        self.capacity = capacity
+        self._entries = deque(maxlen=capacity)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    @property
+    def latest(self):
+        """Sequence number of the newest entry (0 when empty)."""
+        return self._seq
+
+    def __len__(self):
+        return len(self._entries)
+
+    def extend(self, entries):
+        """Append [(ts, line, labels), ...] in ingest order."""
+        with self._lock:
+            for ts, line, labels in entries:
+                self._seq += 1
+                self._entries.append((self._seq, ts, line, labels))
+
+    def since(self, seq=0, limit=100):
+        """
+        Entries newer than seq, newest first; returns (entries, cursor, more, reset).
+
+        seq=0 gives a snapshot of the newest `limit` entries. Otherwise the
+        page is the *oldest* `limit` entries after seq and cursor is the last
+        of them, so a client passing cursor back sees every entry once; more
+        is True while newer entries remain. reset is True if entries after
+        seq were already evicted (or seq is from before a restart): the page
+        then starts at the oldest entry still kept.
+        """
+        with self._lock:
+            latest = self._seq
+            if seq <= 0:
+                return list(islice(reversed(self._entries), limit)), latest, False, False
+            oldest = self._entries[0][0] if self._entries else latest + 1
+            reset = seq < oldest - 1 or seq > latest
+            start = 0 if reset else seq - oldest + 1
+            page = list(islice(self._entries, start, start + limit))
+        cursor = page[-1][0] if page else latest
+        return page[::-1], cursor, cursor < latest, reset
+
+    def as_streams(self, entries):
+        """Group entries into Loki's {stream, values} result shape."""
+        grouped = {}
+        for _, ts, line, labels in entries:
+            key = tuple(sorted(labels.items()))
+            grouped.setdefault(key, []).append([str(ts), line])
+        return [{"stream": dict(k), "values": v} for k, v in grouped.items()]
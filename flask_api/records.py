@@ -0,0 +1,113 @@
+"""
+Vector-store records for ingested lines.
+
+The live Loki ingester (app.py) and backfill.py both build IDs and metadata
+here, so a line gets the same ID and metadata schema whichever path stored
+it, and re-ingesting it is an idempotent upsert.
+
+Metadata is typed and flat so ChromaDB can filter on it:
+
+    timestamp        int, ns epoch            template_id / template / template_params
+    level, service   from "[LEVEL] [service]" (lines in generate_logs.py's format)
+    label_<name>     each Loki stream label, e.g. label_job, label_host
+    <key>            typed key=value fields of the message (logline.py):
+                     status=503 -> 503, user_id=1234 -> "1234",
+                     "after 3523ms" -> latency_ms 3523.0
+
+where_clause() turns filters into a ChromaDB `where`, and stream_labels()
+rebuilds a line's Loki labels from its metadata.
+"""
+import ast
+import json
+import re
+import time
+from datetime import datetime
+
+from dedup import log_id
+from logline import extract_fields, parse_line
+
+# asctime as written by generate_logs.py / Python logging: "2025-10-28 18:48:57,732"
+FILE_TS_RE = re.compile(r"^(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2})(?:[,.](\d{1,6}))?")
+
+LABEL_PREFIX = "label_"
+# Keys the schema itself uses; a message field by the same name is dropped
+RESERVED_FIELDS = {"timestamp", "level", "service", "template_id", "template", "template_params"}
+
+
+def build_meta(labels, ts, template_match, line=""):
+    """Metadata for one line; template_match is TemplateMiner.add()'s result."""
+    tpl_id, template, params = template_match
+    level, service, message = parse_line(line)
+    meta = {
+        "timestamp": int(ts),
+        "template_id": tpl_id,
+        "template": template,
+        "template_params": json.dumps(params)
+    }
+    if level:
+        meta["level"] = level
+    if service:
+        meta["service"] = service
+    for name, value in labels.items():
+        meta[LABEL_PREFIX + name] = str(value)
+    for key, value in extract_fields(message).items():
+        if key not in RESERVED_FIELDS and not key.startswith(LABEL_PREFIX):
+            meta.setdefault(key, value)
+    return meta
+
+
+def build_record(labels, ts, line, miner):
+    """(id, document, metadata) for one line."""
+    meta = build_meta(labels, ts, miner.add(line), line)
+    return log_id(labels, ts, line), line, meta
+
+
+def stream_labels(meta):
+    """The Loki stream labels a line was stored with."""
+    labels = {k[len(LABEL_PREFIX):]: v for k, v in meta.items() if k.startswith(LABEL_PREFIX)}
+    if not labels and "labels" in meta:
+        # Stored before typed metadata, as str(labels)
+        try:
+            labels = ast.literal_eval(meta["labels"])
+        except (ValueError, SyntaxError):
+            labels = {"job": meta.get("job", "unknown")}
+    return labels
+
+
+def where_clause(levels=None, services=None, since_ns=None, until_ns=None, fields=None):
+    """
+    ChromaDB `where` for the given filters, or None if there are none.
+
+    fields maps a metadata key to the value it must equal.
+    """
+    conditions = []
+    if levels:
+        conditions.append({"level": {"$in": sorted(levels)}})
+    if services:
+        conditions.append({"service": {"$in": sorted(services)}})
+    if since_ns:
+        conditions.append({"timestamp": {"$gte": int(since_ns)}})
+    if until_ns:
+        conditions.append({"timestamp": {"$lte": int(until_ns)}})
+    for key, value in (fields or {}).items():
+        conditions.append({key: value})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+def parse_file_timestamp(line, tz=None):
+    """Nanosecond epoch of a line's leading asctime in tz (default local time), or None."""
+    m = FILE_TS_RE.match(line)
+    if not m:
+        return None
+    try:
+        fields = time.strptime(m.group(1).replace("T", " "), "%Y-%m-%d %H:%M:%S")
+        if tz is None:
+            seconds = time.mktime(fields)
+        else:
+            seconds = datetime(*fields[:6], tzinfo=tz).timestamp()
+    except (ValueError, OverflowError):
+        return None
+    fraction = (m.group(2) or "0").ljust(9, "0")
+    return int(seconds) * 1_000_000_000 + int(fraction)
@@ -0,0 +1,238 @@
+"""
+Incremental per-minute rollups of ingested lines.
+
+RollupEngine keeps a ring buffer of one-minute buckets. Each bucket counts
+lines by (service, level, template) and keeps a QuantileSketch for every
+numeric field seen under that key, where fields are pulled out of the
+message (logline.measurements): "...after 3523ms" -> latency_ms,
+"pool_size=20" -> pool_size. Aggregate
+questions ("how many DB timeouts in the last 10 minutes", "p99 query
+latency") are then answered by merging at most `minutes` small buckets
+instead of scanning logs in Loki or ChromaDB.
+"""
+import math
+import threading
+import time
+from collections import Counter
+
+from logline import measurements
+
+DIMENSIONS = ("service", "level", "template")
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with bounded relative error (DDSketch-style).
+
+    Positive values land in logarithmic bins of ratio gamma, so any quantile
+    is reported within `relative_accuracy` of the true value; memory grows
+    with the log of the value range, not with the number of values.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = Counter()
+        self.zeros = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        if value <= 0:
+            self.zeros += 1
+        else:
+            self.bins[math.ceil(math.log(value) / self._log_gamma)] += 1
+        self.count += 1
+        self.total += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        self.bins.update(other.bins)
+        self.zeros += other.zeros
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return max(self.min, 0.0)
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                value = 2 * self.gamma ** index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self, quantiles=(0.5, 0.9, 0.99)):
+        if self.count == 0:
+            return {"count": 0}
+        out = {
+            "count": self.count,
+            "min": self.min,
+            "max": self.max,
+            "avg": round(self.total / self.count, 3),
+        }
+        for q in quantiles:
+            out[f"p{round(q * 100, 1):g}"] = round(self.quantile(q), 3)
+        return out
+
+
+class _Minute:
+    __slots__ = ("minute", "counts", "spans", "fields")
+
+    def __init__(self, minute):
+        self.minute = minute
+        self.counts = Counter()  # (service, level, template_id) -> lines
+        self.spans = {}          # (service, level, template_id) -> [first ts, last ts]
+        self.fields = {}         # (service, level, template_id, field) -> QuantileSketch
+
+
+class RollupEngine:
+    """Ring buffer of per-minute rollups covering the last `minutes` minutes."""
+
+    def __init__(self, minutes=1440, relative_accuracy=0.01):
+        self.minutes = minutes
+        self.relative_accuracy = relative_accuracy
+        self._ring = [None] * minutes
+        self._templates = {}  # template_id -> latest template text
+        self._lock = threading.Lock()
+
+    def add(self, ts_ns, level, service, message, template_id=None, template=None):
+        ts_ns = int(ts_ns)
+        minute = ts_ns // 60_000_000_000
+        fields = measurements(message)
+        service = service or "unknown"
+        with self._lock:
+            slot = minute % self.minutes
+            bucket = self._ring[slot]
+            if bucket is None or bucket.minute != minute:
+                if bucket is not None and bucket.minute > minute:
+                    return  # older than the window
+                bucket = self._ring[slot] = _Minute(minute)
+            key = (service, level or "UNKNOWN", template_id)
+            bucket.counts[key] += 1
+            span = bucket.spans.get(key)
+            if span is None:
+                bucket.spans[key] = [ts_ns, ts_ns]
+            elif ts_ns < span[0]:
+                span[0] = ts_ns
+            elif ts_ns > span[1]:
+                span[1] = ts_ns
+            for name, value in fields.items():
+                sketch = bucket.fields.get(key + (name,))
+                if sketch is None:
+                    sketch = bucket.fields[key + (name,)] = QuantileSketch(self.relative_accuracy)
+                sketch.add(value)
+            if template_id is not None and template is not None:
+                self._templates[template_id] = template
+
+    def _buckets(self, since_ns, until_ns):
+        now_minute = time.time_ns() // 60_000_000_000
+        lo = max(since_ns // 60_000_000_000, now_minute - self.minutes + 1) if since_ns else now_minute - self.minutes + 1
+        hi = until_ns // 60_000_000_000 if until_ns else now_minute
+        return [b for b in self._ring if b is not None and lo <= b.minute <= hi]
+
+    def aggregate(self, since_ns=None, until_ns=None, services=None, levels=None,
+                  match=None, group_by=("service", "level"), quantiles=(0.5, 0.9, 0.99)):
+        """
+        Counts and field quantiles over [since_ns, until_ns], at minute
+        granularity.
+
+        services / levels restrict the lines counted; match keeps templates
+        whose text contains the substring (case-insensitive). group_by is
+        any subset of ("service", "level", "template").
+        """
+        group_by = tuple(d for d in group_by if d in DIMENSIONS)
+        match = match.lower() if match else None
+        groups = Counter()
+        series = Counter()
+        sketches = {}
+
+        with self._lock:
+            buckets = self._buckets(since_ns, until_ns)
+            templates = dict(self._templates)
+
+            def wanted(service, level, tpl_id):
+                return ((not services or service in services)
+                        and (not levels or level in levels)
+                        and (not match or match in templates.get(tpl_id, "").lower()))
+
+            for bucket in buckets:
+                for (service, level, tpl_id), n in bucket.counts.items():
+                    if not wanted(service, level, tpl_id):
+                        continue
+                    key = {"service": service, "level": level, "template": tpl_id}
+                    groups[tuple(key[d] for d in group_by)] += n
+                    series[bucket.minute] += n
+                for (service, level, tpl_id, name), sketch in bucket.fields.items():
+                    if not wanted(service, level, tpl_id):
+                        continue
+                    merged = sketches.get((service, name))
+                    if merged is None:
+                        merged = sketches[(service, name)] = QuantileSketch(self.relative_accuracy)
+                    merged.merge(sketch)
+
+        rows = []
+        for key, n in groups.most_common():
+            row = dict(zip(group_by, key))
+            if "template" in row:
+                row["template_text"] = templates.get(row["template"])
+            row["count"] = n
+            rows.append(row)
+
+        return {
+            "total": sum(groups.values()),
+            "groups": rows,
+            "series": [{"minute": m * 60, "count": series[m]} for m in sorted(series)],
+            "fields": [
+                {"service": service, "field": name, **sketch.summary(quantiles)}
+                for (service, name), sketch in sorted(sketches.items())
+            ],
+        }
+
+    def template_stats(self, since_ns=None, until_ns=None):
+        """{template_id: {"count", "first_ns", "last_ns"}} over the window, all services and levels."""
+        stats = {}
+        with self._lock:
+            for bucket in self._buckets(since_ns, until_ns):
+                for (service, level, tpl_id), n in bucket.counts.items():
+                    first, last = bucket.spans[(service, level, tpl_id)]
+                    entry = stats.get(tpl_id)
+                    if entry is None:
+                        stats[tpl_id] = {"count": n, "first_ns": first, "last_ns": last}
+                    else:
+                        entry["count"] += n
+                        entry["first_ns"] = min(entry["first_ns"], first)
+                        entry["last_ns"] = max(entry["last_ns"], last)
+        return stats
+
+    def summary(self, minutes=15, top=8):
+        """Compact text digest of the last `minutes` minutes for the chat prompt."""
+        since_ns = time.time_ns() - minutes * 60_000_000_000
+        by_level = self.aggregate(since_ns, group_by=("service", "level"))
+        if not by_level["total"]:
+            return f"No lines ingested in the last {minutes} minutes."
+        by_template = self.aggregate(since_ns, group_by=("service", "template"))
+
+        lines = [f"Last {minutes} min: {by_level['total']} lines"]
+        lines.append("By service/level: " + ", ".join(
+            f"{r['service']} {r['level']}={r['count']}" for r in by_level["groups"]))
+        lines.append("Top templates:")
+        lines.extend(f"  {r['count']}x [{r['service']}] {r['template_text']}"
+                     for r in by_template["groups"][:top])
+        latency = [f for f in by_level["fields"] if f["field"] == "latency_ms"]
+        if latency:
+            lines.append("latency_ms: " + ", ".join(
+                f"{f['service']} p50={f['p50']:g} p99={f['p99']:g} max={f['max']:g} (n={f['count']})"
+                for f in latency))
+        return "\n".join(lines)
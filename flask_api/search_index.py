@@ -0,0 +1,185 @@
+"""
+Local lexical retrieval over a recent window of ingested lines.
+
+Vector search is good at "what is this about" but weak at exact tokens such
+as transaction_id=abc123, status=503 or ERROR. SearchIndex is an in-memory
+BM25 inverted index over the last `capacity` lines, kept current by the
+ingest path. parse_filters() pulls level / service / time-range hints out of
+a question, and rrf() fuses the lexical and vector rankings.
+"""
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from logline import parse_line
+
+KEY_VALUE_RE = re.compile(r"[A-Za-z_][\w.\-]*[=:][\w.\-/:]+")
+WORD_RE = re.compile(r"[A-Za-z0-9_]+")
+EXACT_RE = re.compile(r"[A-Za-z_][\w.\-]*=[\w.\-/:]+|\b[0-9a-f]{8,}\b|\b[0-9a-f]{8}-[0-9a-f-]{27}\b")
+
+LEVEL_WORDS = {
+    "error": "ERROR", "errors": "ERROR", "failed": "ERROR", "failure": "ERROR", "failures": "ERROR",
+    "warning": "WARNING", "warnings": "WARNING", "warn": "WARNING",
+    "info": "INFO",
+    "critical": "CRITICAL", "fatal": "CRITICAL",
+    "debug": "DEBUG",
+}
+SERVICE_ALIASES = {"database": "db", "redis": "cache", "gateway": "api", "login": "auth", "jwt": "auth"}
+TIME_RE = re.compile(r"\b(?:last|past|previous)\s+(\d+)?\s*(second|sec|minute|min|hour|hr|day)s?\b", re.I)
+UNIT_SECONDS = {"second": 1, "sec": 1, "minute": 60, "min": 60, "hour": 3600, "hr": 3600, "day": 86400}
+
+
+def tokenize(text):
+    """Lower-cased words plus whole key=value / key:value tokens."""
+    lowered = text.lower()
+    return KEY_VALUE_RE.findall(lowered) + WORD_RE.findall(lowered)
+
+
+def exact_terms(question):
+    """Exact values named in a question (key=value tokens, hex or UUID IDs)."""
+    return EXACT_RE.findall(question.lower())
+
+
+def parse_filters(question, services=()):
+    """
+    Extract structured filters from a natural-language question.
+
+    Returns {"levels": set, "services": set, "since_ns": int | None}.
+    """
+    words = WORD_RE.findall(question.lower())
+    levels = {LEVEL_WORDS[w] for w in words if w in LEVEL_WORDS}
+
+    wanted = set()
+    for w in words:
+        w = SERVICE_ALIASES.get(w, w)
+        for svc in services:
+            if w == svc or w == svc.split("-")[0]:
+                wanted.add(svc)
+    for svc in services:
+        if svc in question.lower():
+            wanted.add(svc)
+
+    since_ns = None
+    m = TIME_RE.search(question)
+    if m:
+        amount = int(m.group(1) or 1)
+        since_ns = time.time_ns() - amount * UNIT_SECONDS[m.group(2).lower()] * 1_000_000_000
+
+    return {"levels": levels, "services": wanted, "since_ns": since_ns}
+
+
+def matches_filters(level, service, ts, filters):
+    """
+    Whether a line may answer a question with these filters.
+
+    A line whose level or service is unknown (a header parse_line() does
+    not recognise, or one without a logger) is only rejected by what it
+    does show, so questions naming a level still find such lines.
+    """
+    if filters.get("levels") and level and level not in filters["levels"]:
+        return False
+    if filters.get("services") and service and service not in filters["services"]:
+        return False
+    if filters.get("since_ns") and int(ts) < filters["since_ns"]:
+        return False
+    return True
+
+
+def rrf(rankings, k=60):
+    """Reciprocal rank fusion of several ranked ID lists; best first."""
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class SearchIndex:
+    """Bounded BM25 inverted index; the oldest lines are evicted first."""
+
+    def __init__(self, capacity=20_000, k1=1.2, b=0.75):
+        self.capacity = capacity
+        self.k1 = k1
+        self.b = b
+        self._docs = OrderedDict()  # id -> (line, ts, level, service, meta, term counts, length)
+        self._postings = {}         # term -> {id: tf}
+        self._services = Counter()
+        self._total_len = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def services(self):
+        with self._lock:
+            return [s for s, n in self._services.items() if n > 0]
+
+    def add(self, doc_id, line, ts, meta=None):
+        level, service, _ = parse_line(line)
+        terms = Counter(tokenize(line))
+        with self._lock:
+            if doc_id in self._docs:
+                return
+            length = sum(terms.values())
+            self._docs[doc_id] = (line, int(ts), level, service, meta or {}, terms, length)
+            for term, tf in terms.items():
+                self._postings.setdefault(term, {})[doc_id] = tf
+            self._total_len += length
+            if service:
+                self._services[service] += 1
+            while len(self._docs) > self.capacity:
+                self._evict()
+
+    def _evict(self):
+        doc_id, (_, _, _, service, _, terms, length) = self._docs.popitem(last=False)
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+        self._total_len -= length
+        if service:
+            self._services[service] -= 1
+
+    def search(self, query, k=15, filters=None):
+        """
+        Top-k (id, line, meta) by BM25, restricted to filters.
+
+        With no usable query terms, returns the newest lines matching filters.
+        """
+        filters = filters or {}
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self._docs)
+            if n == 0:
+                return []
+            avgdl = self._total_len / n
+            scores = {}
+            for term in terms:
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    dl = self._docs[doc_id][6]
+                    norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * dl / avgdl))
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm
+
+            if scores:
+                ranked = sorted(scores, key=scores.get, reverse=True)
+            elif any(filters.values()):
+                ranked = reversed(self._docs)
+            else:
+                return []
+
+            hits = []
+            for doc_id in ranked:
+                line, ts, level, service, meta = self._docs[doc_id][:5]
+                if matches_filters(level, service, ts, filters):
+                    hits.append((doc_id, line, meta))
+                    if len(hits) >= k:
+                        break
+            return hits
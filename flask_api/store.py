@@ -0,0 +1,353 @@
+"""
+Time-partitioned ChromaDB log store.
+
+Instead of one ever-growing collection, lines go into one collection per
+time bucket (hourly by default), named "<prefix>_<UTC bucket start>", e.g.
+system_logs_20251028T1800. Retention drops expired buckets whole with
+delete_collection, so there are no per-document deletes and storage stays
+bounded. Queries fan out only to buckets that overlap the requested time
+range, so their cost depends on the window asked about, not on uptime.
+
+Per-bucket counts are tracked locally (seeded from ChromaDB at startup,
+incremented by the lines an upsert adds) so count() does not hit the server
+on hot paths; count(exact=True) refreshes them, counting every bucket in
+parallel. Buckets created by another process (e.g. backfill.py) are picked
+up by a periodic re-listing of collections.
+
+Earlier versions kept every line in one "<prefix>" collection (e.g.
+system_logs). migrate_legacy() moves its lines into their time buckets,
+embeddings included, and drops it; lines past retention are not moved.
+"""
+import calendar
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+NAME_FORMAT = "%Y%m%dT%H%M"
+
+
+def cloud_database_name(value):
+    """The ChromaDB Cloud database name; ours is created with a trailing space."""
+    if value and not value.endswith(" "):
+        return value + " "
+    return value or "Dharmil "
+
+
+def open_client(backend="cloud", api_key=None, tenant=None, database=None):
+    """(client, embedding function) for CHROMA_BACKEND "cloud" or "memory"."""
+    if backend == "memory":
+        from fake_chroma import HashEmbeddingFunction, InMemoryClient
+        log.info("🧪 Using in-memory ChromaDB stand-in")
+        return InMemoryClient(), HashEmbeddingFunction()
+
+    import chromadb
+    from chromadb.utils import embedding_functions
+    log.info("🔵 Connecting to ChromaDB Cloud (tenant: %s, database: '%s', length: %d)",
+             tenant, database, len(database or ""))
+    client = chromadb.CloudClient(api_key=api_key, tenant=tenant, database=database)
+    # Same function for template embeddings at ingest and query_texts at chat time
+    return client, embedding_functions.DefaultEmbeddingFunction()
+
+
+def _legacy_meta(meta):
+    """Unpartitioned-era metadata with an int "timestamp" (it used to be a string)."""
+    meta = dict(meta or {})
+    try:
+        meta["timestamp"] = int(meta["timestamp"])
+    except (KeyError, TypeError, ValueError):
+        try:
+            meta["timestamp"] = int(float(meta["processed_at"]) * 1_000_000_000)
+        except (KeyError, TypeError, ValueError):
+            meta.pop("timestamp", None)
+    return meta
+
+
+class PartitionedStore:
+    """Rolling time-bucketed collections with whole-bucket retention."""
+
+    def __init__(self, client, prefix="system_logs", bucket_seconds=3600,
+                 retention_seconds=86400, embedding_function=None,
+                 metadata=None, query_workers=4, refresh_seconds=60.0):
+        if bucket_seconds < 60 or bucket_seconds % 60:
+            raise ValueError("bucket_seconds must be a whole number of minutes")
+        self.client = client
+        self.prefix = prefix
+        self.bucket_seconds = bucket_seconds
+        self.retention_seconds = retention_seconds
+        self.embedding_function = embedding_function
+        self.metadata = metadata or {}
+        self._name_re = re.compile(rf"^{re.escape(prefix)}_(\d{{8}}T\d{{4}})$")
+        self._collections = {}  # bucket start (s) -> collection
+        self._counts = {}       # bucket start (s) -> approximate line count
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=query_workers, thread_name_prefix="store")
+        self.refresh_seconds = refresh_seconds
+        self._refreshed = 0.0
+        self._discover()
+        self.enforce_retention()
+
+    # --- buckets ---------------------------------------------------------
+
+    def bucket_of(self, ts_ns):
+        seconds = int(ts_ns) // 1_000_000_000
+        return seconds - seconds % self.bucket_seconds
+
+    def name_of(self, bucket):
+        return f"{self.prefix}_{time.strftime(NAME_FORMAT, time.gmtime(bucket))}"
+
+    def _parse_name(self, name):
+        m = self._name_re.match(name)
+        if not m:
+            return None
+        return calendar.timegm(time.strptime(m.group(1), NAME_FORMAT))
+
+    def _discover(self):
+        """Adopt bucket collections not known yet; returns how many were added."""
+        self._refreshed = time.monotonic()
+        found = 0
+        for col in self.client.list_collections():
+            # Older clients return Collection objects, newer ones names
+            name = getattr(col, "name", col)
+            bucket = self._parse_name(name)
+            if bucket is None or bucket in self._collections:
+                continue
+            col = self.client.get_or_create_collection(
+                name=name, embedding_function=self.embedding_function)
+            count = col.count()
+            with self._lock:
+                if bucket not in self._collections:
+                    self._collections[bucket] = col
+                    self._counts[bucket] = count
+                    found += 1
+        if found:
+            log.info("🗂️  Found %d new log bucket(s), %d lines in total", found, self.count())
+        return found
+
+    def refresh(self, force=False):
+        """Re-list collections at most every refresh_seconds."""
+        if force or time.monotonic() - self._refreshed >= self.refresh_seconds:
+            try:
+                self._discover()
+            except Exception as e:
+                log.warning("⚠️  Could not list collections: %s", e)
+                self._refreshed = time.monotonic()
+
+    def _collection(self, bucket):
+        with self._lock:
+            col = self._collections.get(bucket)
+            if col is not None:
+                return col, False
+        col = self.client.get_or_create_collection(
+            name=self.name_of(bucket),
+            metadata={**self.metadata, "bucket_start": bucket, "bucket_seconds": self.bucket_seconds},
+            embedding_function=self.embedding_function
+        )
+        with self._lock:
+            created = bucket not in self._collections
+            col = self._collections.setdefault(bucket, col)
+            self._counts.setdefault(bucket, 0)
+        return col, created
+
+    def buckets(self, since_ns=None, until_ns=None):
+        """Known buckets overlapping [since_ns, until_ns], newest first."""
+        lo = self.bucket_of(since_ns) if since_ns else None
+        hi = self.bucket_of(until_ns) if until_ns else None
+        with self._lock:
+            return sorted((b for b in self._collections
+                           if (lo is None or b >= lo) and (hi is None or b <= hi)), reverse=True)
+
+    def expired(self, ts_ns, now=None):
+        """True if a line at ts_ns falls in a bucket that retention has already dropped."""
+        cutoff = (now or time.time()) - self.retention_seconds
+        return self.bucket_of(ts_ns) + self.bucket_seconds <= cutoff
+
+    def enforce_retention(self, now=None):
+        """Drop every bucket that ended before now - retention; returns how many."""
+        cutoff = (now or time.time()) - self.retention_seconds
+        with self._lock:
+            expired = [b for b in self._collections if b + self.bucket_seconds <= cutoff]
+        for bucket in expired:
+            try:
+                self.client.delete_collection(name=self.name_of(bucket))
+            except Exception as e:
+                log.warning("⚠️  Could not drop expired bucket %s: %s", self.name_of(bucket), e)
+                continue
+            with self._lock:
+                self._collections.pop(bucket, None)
+                dropped = self._counts.pop(bucket, 0)
+            log.info("🧹 Dropped expired bucket %s (%d lines)", self.name_of(bucket), dropped)
+        return len(expired)
+
+    # --- reads and writes ------------------------------------------------
+
+    def upsert(self, ids, documents, metadatas, embeddings=None, now=None):
+        """
+        Route each line to the bucket of its metadata "timestamp" (ns).
+
+        Lines older than the retention window (as of `now`) are dropped.
+        Returns the number of lines written.
+        """
+        now = now or time.time()
+        groups = {}
+        for i, meta in enumerate(metadatas):
+            ts = meta.get("timestamp", time.time_ns())
+            if self.expired(ts, now):
+                continue
+            groups.setdefault(self.bucket_of(ts), []).append(i)
+
+        written = 0
+        rolled_over = False
+        for bucket, idx in sorted(groups.items()):
+            col, created = self._collection(bucket)
+            rolled_over |= created
+            bucket_ids = [ids[i] for i in idx]
+            # Re-ingested lines overwrite themselves and must not be counted twice
+            existing = set(col.get(ids=bucket_ids, include=[]).get("ids") or [])
+            col.upsert(
+                ids=bucket_ids,
+                documents=[documents[i] for i in idx],
+                metadatas=[metadatas[i] for i in idx],
+                embeddings=[embeddings[i] for i in idx] if embeddings is not None else None
+            )
+            with self._lock:
+                self._counts[bucket] = self._counts.get(bucket, 0) + len(set(bucket_ids) - existing)
+            written += len(idx)
+
+        if rolled_over:
+            self.enforce_retention()
+        return written
+
+    def migrate_legacy(self, batch_size=500):
+        """
+        Move the lines of the unpartitioned "<prefix>" collection into time
+        buckets, then drop it; returns how many lines were moved.
+
+        Each page is upserted before it is deleted from the old collection,
+        so an interrupted migration loses nothing and simply continues on
+        the next call. Lines whose timestamp is past retention are dropped.
+        """
+        try:
+            names = {getattr(c, "name", c) for c in self.client.list_collections()}
+            if self.prefix not in names:
+                return 0
+            legacy = self.client.get_collection(name=self.prefix,
+                                                embedding_function=self.embedding_function)
+            log.info("📦 Moving %d lines from the unpartitioned %s collection into buckets",
+                     legacy.count(), self.prefix)
+            moved = seen = 0
+            while True:
+                page = legacy.get(limit=batch_size, include=["documents", "metadatas", "embeddings"])
+                ids = page.get("ids") or []
+                if not ids:
+                    break
+                embeddings = page.get("embeddings")
+                if embeddings is not None and len(embeddings) != len(ids):
+                    embeddings = None
+                metas = [_legacy_meta(m) for m in page.get("metadatas") or [{}] * len(ids)]
+                moved += self.upsert(ids, page.get("documents"), metas, embeddings)
+                seen += len(ids)
+                legacy.delete(ids=ids)
+            self.client.delete_collection(name=self.prefix)
+        except Exception as e:
+            log.warning("⚠️  Could not migrate the %s collection (retried on restart): %s",
+                        self.prefix, e)
+            return 0
+        log.info("📦 Migrated %s: %d lines moved, %d past retention dropped",
+                 self.prefix, moved, seen - moved)
+        return moved
+
+    def count(self, exact=False):
+        if exact:
+            with self._lock:
+                cols = dict(self._collections)
+            buckets = list(cols)
+            counts = dict(zip(buckets, self._pool.map(lambda b: cols[b].count(), buckets)))
+            with self._lock:
+                for b, n in counts.items():
+                    if b in self._collections:
+                        self._counts[b] = n
+        with self._lock:
+            return sum(self._counts.values())
+
+    def peek(self, limit=10):
+        """Up to `limit` lines from the newest buckets."""
+        out = {"ids": [], "documents": [], "metadatas": []}
+        for bucket in self.buckets():
+            if len(out["ids"]) >= limit:
+                break
+            with self._lock:
+                col = self._collections.get(bucket)
+            if col is None:
+                continue
+            sample = col.peek(limit=limit - len(out["ids"]))
+            for key in out:
+                out[key].extend(sample.get(key) or [])
+        return out
+
+    def get(self, where=None, limit=100, since_ns=None, until_ns=None):
+        """
+        Up to `limit` lines matching `where`, newest bucket first.
+
+        ChromaDB returns a bucket's matches in no particular order, so narrow
+        `where` (and since_ns / until_ns, which select the buckets) rather
+        than relying on which lines of a busy bucket come back.
+        """
+        self.refresh()
+        out = {"ids": [], "documents": [], "metadatas": []}
+        for bucket in self.buckets(since_ns, until_ns):
+            if len(out["ids"]) >= limit:
+                break
+            with self._lock:
+                col = self._collections.get(bucket)
+                empty = not self._counts.get(bucket, 0)
+            if col is None or empty:
+                continue
+            found = col.get(where=where, limit=limit - len(out["ids"]),
+                            include=["documents", "metadatas"])
+            for key in out:
+                out[key].extend(found.get(key) or [])
+        return out
+
+    def query(self, query_texts, n_results=10, since_ns=None, until_ns=None, **kwargs):
+        """
+        Nearest neighbours across the buckets overlapping the time range.
+
+        The query is embedded once and sent to each non-empty bucket in
+        parallel; results are merged by distance into the usual ChromaDB
+        shape for a single query ({"ids": [[...]], ...}).
+        """
+        self.refresh()
+        buckets = self.buckets(since_ns, until_ns)
+        with self._lock:
+            targets = [(b, self._collections[b], self._counts.get(b, 0))
+                       for b in buckets if b in self._collections]
+        targets = [t for t in targets if t[2] > 0]
+        merged = {"ids": [[]], "documents": [[]], "metadatas": [[]], "distances": [[]]}
+        if not targets:
+            return merged
+
+        if self.embedding_function is not None:
+            kwargs["query_embeddings"] = self.embedding_function(query_texts)
+        else:
+            kwargs["query_texts"] = query_texts
+
+        def run(target):
+            _, col, n = target
+            return col.query(n_results=min(n_results, n), **kwargs)
+
+        hits = []
+        for result in self._pool.map(run, targets):
+            distances = (result.get("distances") or [[]])[0] or [0.0] * len(result["ids"][0])
+            hits.extend(zip(distances, result["ids"][0],
+                            result["documents"][0], result["metadatas"][0]))
+        hits.sort(key=lambda h: h[0])
+        for distance, doc_id, doc, meta in hits[:n_results]:
+            merged["ids"][0].append(doc_id)
+            merged["documents"][0].append(doc)
+            merged["metadatas"][0].append(meta)
+            merged["distances"][0].append(distance)
+        return merged
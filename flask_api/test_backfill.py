@@ -0,0 +1,83 @@
+"""
+backfill.py: labels shared with promtail, and resuming an interrupted run.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from backfill import PROMTAIL_CONFIG, Progress, backfill_file, file_labels, promtail_targets
+from dedup import log_id
+from drain import TemplateMiner
+from pipeline import IngestPipeline
+from records import build_record, parse_file_timestamp
+
+
+class StopAfter:
+    """A stop event that is set once `chunks` chunks have been read."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def is_set(self):
+        self.chunks -= 1
+        return self.chunks < 0
+
+
+def write_log(path, n):
+    start = datetime.now(timezone.utc) - timedelta(minutes=5)
+    with open(path, "w") as f:
+        for i in range(n):
+            stamp = (start + timedelta(milliseconds=i)).strftime("%Y-%m-%d %H:%M:%S,%f")[:-3]
+            f.write(f"{stamp} [INFO] [cache-manager] Cache hit for key=user:{i}\n")
+
+
+def run(path, state_dir, collection, stop):
+    upserted = []
+
+    def sink(ids, docs, metas):
+        collection.upsert(ids, docs, metas)
+        upserted.extend(ids)
+
+    pipeline = IngestPipeline(sink, workers=2, batch_size=7, max_latency=0.01)
+    pipeline.start()
+    progress = Progress(state_dir, path).load()
+    labels = {"job": "fake_logs", "host": "h", "filename": "/var/log/fake/app.log"}
+    backfill_file(path, labels, pipeline, TemplateMiner(), progress, 512, stop,
+                  expired=lambda ts: False, lost=threading.Event(), tz=timezone.utc)
+    while pipeline.in_flight():
+        time.sleep(0.01)
+    assert pipeline.stop(timeout=5)
+    return upserted
+
+
+def test_resume_from_saved_progress(tmp_path, collection):
+    path = str(tmp_path / "app.log")
+    state_dir = str(tmp_path / "state")
+    write_log(path, 60)
+
+    first = run(path, state_dir, collection, StopAfter(2))
+    saved = Progress(state_dir, path).load()
+    assert 0 < saved.offset < (tmp_path / "app.log").stat().st_size
+    assert saved.lines == len(first)
+
+    second = run(path, state_dir, collection, threading.Event())
+    assert not set(first) & set(second)
+    assert len(first) + len(second) == 60
+    assert collection.count() == 60
+    assert Progress(state_dir, path).load().lines == 60
+
+
+def test_labels_and_ids_match_promtail():
+    labels, tz = file_labels("/home/me/fake_logs/app.log", promtail_targets(PROMTAIL_CONFIG))
+    assert labels == {"job": "fake_logs", "host": "fake-logs-container",
+                      "filename": "/var/log/fake/app.log"}
+    assert tz == timezone.utc
+    assert file_labels("/home/me/notes.txt", promtail_targets(PROMTAIL_CONFIG)) == (None, None)
+
+    # promtail stamps the entry with its asctime, so the live ingester's ID
+    # for it is the one backfill builds
+    line = "2025-10-29 16:47:41,612 ERROR: Authentication error"
+    loki_ts = int(datetime(2025, 10, 29, 16, 47, 41, tzinfo=timezone.utc).timestamp()) * 10**9 + 612_000_000
+    assert parse_file_timestamp(line, tz) == loki_ts
+    doc_id, _, _ = build_record(labels, parse_file_timestamp(line, tz), line, TemplateMiner())
+    assert doc_id == log_id(labels, loki_ts, line)
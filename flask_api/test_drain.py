@@ -0,0 +1,106 @@
+"""
+Template mining and template embedding reuse.
+"""
+import os
+
+from drain import WILDCARD, TemplateEmbeddings, TemplateMiner, template_id
+
+APP_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "fake_logs", "app.log")
+
+
+def test_lines_of_one_template_share_an_id():
+    miner = TemplateMiner()
+    a = miner.add("2025-10-28 18:48:57,732 [ERROR] [db-connection] DB connection timeout after 3523ms while acquiring from pool_size=20")
+    b = miner.add("2025-10-28 18:48:58,001 [ERROR] [db-connection] DB connection timeout after 87ms while acquiring from pool_size=5")
+
+    assert a[0] == b[0]
+    assert b[1] == "DB connection timeout after <*>ms while acquiring from pool_size=<*>"
+    assert b[2] == ["87", "5"]
+
+
+def test_template_id_is_kept_while_it_generalises():
+    miner = TemplateMiner()
+    first = miner.add("2025-10-29 16:47:41,612 INFO: Produced message to topic=orders")
+    second = miner.add("2025-10-29 16:47:42,612 INFO: Produced message to topic=payments")
+
+    assert first[0] == second[0] == template_id("Produced message to topic=orders")
+    assert second[1] == "Produced message to <*>"
+    assert miner.templates() == [{"template_id": first[0], "template": second[1], "count": 2}]
+
+
+def test_wildcards_do_not_count_as_matches():
+    miner = TemplateMiner()
+    # "<*> <*> <*> x" shares only wildcards with "<*> <*> <*> y"
+    a = miner.add("2025-10-29 16:47:41,612 INFO: 1 2 3 alpha beta")
+    b = miner.add("2025-10-29 16:47:41,612 INFO: 4 5 6 gamma delta")
+    assert a[0] != b[0]
+
+
+def test_app_log_templates():
+    miner = TemplateMiner()
+    with open(APP_LOG, encoding="utf-8", errors="replace") as f:
+        ids = {miner.add(line.rstrip("\n"))[0] for line in f if line.strip()}
+    templates = miner.templates()
+
+    assert len(ids) == len(templates)
+    assert 10 <= len(templates) <= 40
+    assert all(t["template"] != WILDCARD for t in templates)
+
+
+def test_overflow_lines_share_the_catch_all():
+    miner = TemplateMiner(max_clusters=2)
+    miner.add("2025-10-29 16:47:41,612 INFO: user logged in")
+    miner.add("2025-10-29 16:47:41,612 INFO: cache warmed up fully")
+    a = miner.add("2025-10-29 16:47:41,612 ERROR: disk full on volume")
+    b = miner.add("2025-10-29 16:47:41,612 WARNING: queue depth high")
+
+    assert a[0] == b[0]
+    assert a[1] == WILDCARD and a[2] == ["disk full on volume"]
+    assert len(miner.templates()) == 3
+
+
+def embedder(calls):
+    def embed(texts):
+        calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+    return embed
+
+
+def test_template_vectors_are_reused():
+    calls = []
+    emb = TemplateEmbeddings(embedder(calls))
+    metas = [{"template_id": "a", "template": "x <*>"}, {"template_id": "a", "template": "x <*>"},
+             {"template_id": "b", "template": "yy"}]
+
+    first = emb.for_batch(metas)
+    second = emb.for_batch(metas[:1])
+    assert first == [[5.0, 1.0], [5.0, 1.0], [2.0, 1.0]]
+    assert second == [[5.0, 1.0]]
+    assert calls == [["x <*>", "yy"]]
+    assert (emb.computed, emb.reused) == (2, 2)
+
+
+def test_eviction_during_embedding_does_not_fail_the_batch():
+    calls = []
+    emb = TemplateEmbeddings(None, capacity=1)
+    emb.embedding_function = embedder(calls)
+    emb.for_batch([{"template_id": "a", "template": "aaa"}])
+
+    def evicting(texts):
+        # Another batch filling the cache while this one embeds
+        with emb._lock:
+            emb._vectors.clear()
+        return embedder(calls)(texts)
+
+    emb.embedding_function = evicting
+    result = emb.for_batch([{"template_id": "a", "template": "aaa"}, {"template_id": "b", "template": "b"}])
+    assert result == [[3.0, 1.0], [1.0, 1.0]]
+
+
+def test_catch_all_lines_are_embedded_from_their_text():
+    calls = []
+    emb = TemplateEmbeddings(embedder(calls))
+    metas = [{"template_id": "c", "template": WILDCARD}, {"template_id": "c", "template": WILDCARD}]
+
+    assert emb.for_batch(metas, ["disk full", "queue depth high"]) == [[9.0, 1.0], [16.0, 1.0]]
+    assert calls == [["disk full", "queue depth high"]]
@@ -0,0 +1,39 @@
+"""
+Line parsing for both header formats found in fake_logs/app.log.
+"""
+import pytest
+
+from drain import message_part
+from logline import extract_fields, measurements, parse_line
+from records import build_meta
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("2025-10-28 18:48:57,732 [ERROR] [db-connection] DB connection timeout after 3523ms",
+     ("ERROR", "db-connection", "DB connection timeout after 3523ms")),
+    ("2025-10-29 16:47:41,612 ERROR: Authentication error",
+     ("ERROR", None, "Authentication error")),
+    ("2025-10-29 09:50:47,038 WARNING: Kafka: message produced successfully",
+     ("WARNING", None, "Kafka: message produced successfully")),
+    ("2025-10-29 09:50:47,038 INFO:kafka-producer:Produced message to topic=orders offset=7",
+     ("INFO", "kafka-producer", "Produced message to topic=orders offset=7")),
+    ("not a log line", (None, None, "not a log line")),
+])
+def test_parse_line(line, expected):
+    assert parse_line(line) == expected
+    assert message_part(line) == expected[2]
+
+
+def test_extract_fields_types():
+    fields = extract_fields("DB timeout after 3523ms pool_size=20 ratio=0.5 user_id=1234 topic=auth-events.")
+    assert fields == {"latency_ms": 3523.0, "pool_size": 20, "ratio": 0.5,
+                      "user_id": "1234", "topic": "auth-events"}
+    assert measurements("Produced message to topic=orders offset=7 after 12ms") == {"latency_ms": 12.0}
+
+
+def test_meta_without_service():
+    meta = build_meta({"job": "fake_logs"}, 1, ("t", "Authentication error", []),
+                      "2025-10-29 16:47:41,612 ERROR: Authentication error")
+    assert meta["level"] == "ERROR"
+    assert "service" not in meta
+    assert meta["label_job"] == "fake_logs"
@@ -0,0 +1,103 @@
+"""
+IngestPipeline commit ordering, upserting into the in-memory collection.
+"""
+import threading
+import time
+
+import pytest
+
+from pipeline import DeadLetterFile, IngestPipeline
+
+
+def unit(name, n=1):
+    return [(f"{name}-{i}", f"{name} line {i}", {"unit": name}) for i in range(n)]
+
+
+class GatedSink:
+    """Upserts into a collection, holding back batches of gated units until released."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.gates = {}
+        self.stored = []
+
+    def gate(self, name):
+        self.gates[name] = threading.Event()
+        return self.gates[name]
+
+    def __call__(self, ids, docs, metas):
+        for meta in metas:
+            gate = self.gates.get(meta["unit"])
+            if gate is not None:
+                assert gate.wait(5), "gate never released"
+        self.collection.upsert(ids, docs, metas)
+        self.stored.extend(m["unit"] for m in metas)
+
+
+@pytest.fixture
+def sink(collection):
+    return GatedSink(collection)
+
+
+def start(sink, **kwargs):
+    pipeline = IngestPipeline(sink, workers=3, batch_size=1, max_latency=0.01, **kwargs)
+    pipeline.start()
+    return pipeline
+
+
+def test_out_of_order_completion_commits_in_submit_order(sink, collection):
+    committed = []
+    release_a = sink.gate("a")
+    pipeline = start(sink)
+
+    pipeline.submit(unit("a"), on_commit=lambda: committed.append("a"))
+    pipeline.submit(unit("b", 2), on_commit=lambda: committed.append("b"))
+    pipeline.submit(unit("c"), on_commit=lambda: committed.append("c"))
+
+    # b and c are upserted while a is still in flight, but must not commit
+    # before it
+    for _ in range(100):
+        if sorted(sink.stored) == ["b", "b", "c"]:
+            break
+        time.sleep(0.02)
+    assert sorted(sink.stored) == ["b", "b", "c"]
+    assert committed == []
+
+    release_a.set()
+    assert pipeline.stop(timeout=5)
+    assert committed == ["a", "b", "c"]
+    assert collection.count() == 4
+
+
+def test_empty_unit_commits_after_earlier_units(sink):
+    committed = []
+    release_a = sink.gate("a")
+    pipeline = start(sink)
+
+    pipeline.submit(unit("a"), on_commit=lambda: committed.append("a"))
+    pipeline.submit([], on_commit=lambda: committed.append("empty"))
+    assert committed == []
+
+    release_a.set()
+    assert pipeline.stop(timeout=5)
+    assert committed == ["a", "empty"]
+
+
+def test_failed_batch_is_dead_lettered_and_later_units_commit(collection, tmp_path):
+    committed = []
+    path = str(tmp_path / "dead_letter.jsonl")
+
+    def sink(ids, docs, metas):
+        if any(m["unit"] == "bad" for m in metas):
+            raise ValueError("rejected metadata")
+        collection.upsert(ids, docs, metas)
+
+    pipeline = start(sink, max_attempts=1, dead_letter=DeadLetterFile(path))
+    pipeline.submit(unit("bad"), on_commit=lambda: committed.append("bad"))
+    pipeline.submit(unit("good"), on_commit=lambda: committed.append("good"))
+    assert pipeline.stop(timeout=5)
+
+    assert committed == ["bad", "good"]
+    assert pipeline.dead_lettered == 1
+    assert list(DeadLetterFile.read(path)) == unit("bad")
+    assert collection.count() == 1
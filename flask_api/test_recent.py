@@ -0,0 +1,56 @@
+"""
+RecentLogs.since(): snapshots and oldest-first paging after a cursor.
+"""
+from recent import RecentLogs
+
+LABELS = {"job": "fake_logs"}
+
+
+def buffer(n, capacity=100):
+    logs = RecentLogs(capacity)
+    logs.extend([(i, f"line {i}", LABELS) for i in range(1, n + 1)])
+    return logs
+
+
+def seqs(entries):
+    return [e[0] for e in entries]
+
+
+def test_snapshot_is_newest_first():
+    entries, cursor, more, reset = buffer(10).since(0, limit=3)
+    assert seqs(entries) == [10, 9, 8]
+    assert (cursor, more, reset) == (10, False, False)
+
+
+def test_pages_after_since_are_oldest_first_until_caught_up():
+    logs = buffer(10)
+    seen = []
+    cursor, more = 2, True
+    while more:
+        entries, cursor, more, reset = logs.since(cursor, limit=3)
+        assert not reset
+        seen.extend(reversed(seqs(entries)))
+    assert seen == list(range(3, 11))
+    assert cursor == 10
+
+    logs.extend([(11, "line 11", LABELS)])
+    entries, cursor, more, reset = logs.since(cursor, limit=3)
+    assert (seqs(entries), cursor, more, reset) == ([11], 11, False, False)
+
+
+def test_caught_up_cursor_returns_nothing():
+    entries, cursor, more, reset = buffer(5).since(5)
+    assert (entries, cursor, more, reset) == ([], 5, False, False)
+
+
+def test_evicted_cursor_resets_to_oldest_kept():
+    logs = buffer(20, capacity=10)
+    entries, cursor, more, reset = logs.since(3, limit=4)
+    assert seqs(entries) == [14, 13, 12, 11]
+    assert (cursor, more, reset) == (14, True, True)
+
+
+def test_cursor_from_before_a_restart_resets():
+    entries, cursor, more, reset = buffer(3).since(50, limit=10)
+    assert seqs(entries) == [3, 2, 1]
+    assert (cursor, more, reset) == (3, False, True)
@@ -0,0 +1,50 @@
+"""
+Lexical search and question filters over both app.log header formats.
+"""
+import time
+
+from search_index import SearchIndex, matches_filters, parse_filters
+
+LINES = [
+    "2025-10-29 16:42:28,154 WARNING: K8s pod restarted",
+    "2025-10-29 16:42:29,001 INFO: K8s pod restarted",
+    "2025-10-29 16:42:30,512 ERROR: Authentication error",
+    "2025-10-29 16:42:31,020 [ERROR] [db-connection] Deadlock detected in transaction_id=abc123def456",
+    "K8s pod restarted without a header",
+]
+
+
+def index():
+    idx = SearchIndex()
+    now = time.time_ns()
+    for i, line in enumerate(LINES):
+        idx.add(f"id-{i}", line, now + i)
+    return idx
+
+
+def test_level_filter_keeps_colon_format_lines():
+    idx = index()
+    question = "K8s pod restarted warning"
+    hits = [line for _, line, _ in idx.search(question, filters=parse_filters(question, idx.services()))]
+
+    assert LINES[0] in hits
+    assert LINES[4] in hits  # no level to conflict with
+    assert LINES[1] not in hits  # INFO conflicts with "warning"
+
+
+def test_service_filter_only_drops_conflicting_services():
+    filters = {"levels": {"ERROR"}, "services": {"db-connection"}, "since_ns": None}
+
+    assert matches_filters("ERROR", None, 0, filters)
+    assert matches_filters("ERROR", "db-connection", 0, filters)
+    assert not matches_filters("ERROR", "auth-service", 0, filters)
+    assert not matches_filters("INFO", None, 0, filters)
+
+
+def test_show_error_logs():
+    idx = index()
+    question = "show ERROR logs"
+    hits = [line for _, line, _ in idx.search(question, filters=parse_filters(question, idx.services()))]
+
+    assert set(hits) >= {LINES[2], LINES[3]}
+    assert LINES[0] not in hits
@@ -0,0 +1,81 @@
+"""
+PartitionedStore on the in-memory ChromaDB stand-in.
+"""
+import time
+
+import pytest
+
+from fake_chroma import HashEmbeddingFunction, InMemoryClient
+from store import PartitionedStore
+
+HOUR_NS = 3600 * 1_000_000_000
+
+
+@pytest.fixture
+def client():
+    return InMemoryClient()
+
+
+def open_store(client, retention_hours=24):
+    return PartitionedStore(client, bucket_seconds=3600, retention_seconds=retention_hours * 3600,
+                            embedding_function=HashEmbeddingFunction())
+
+
+def lines(*timestamps):
+    ids = [f"id-{ts}" for ts in timestamps]
+    docs = [f"line at {ts}" for ts in timestamps]
+    metas = [{"timestamp": ts} for ts in timestamps]
+    return ids, docs, metas
+
+
+def test_lines_are_routed_to_their_hour(client):
+    store = open_store(client)
+    now = (time.time_ns() // HOUR_NS) * HOUR_NS
+    assert store.upsert(*lines(now + 1, now + 2, now - HOUR_NS + 5)) == 3
+
+    assert store.buckets() == [now // 1_000_000_000, (now - HOUR_NS) // 1_000_000_000]
+    assert store.count() == 3
+    assert client.get_collection(store.name_of(store.bucket_of(now))).count() == 2
+    assert store.buckets(since_ns=now) == [now // 1_000_000_000]
+
+
+def test_retention_drops_old_lines_and_buckets(client):
+    store = open_store(client, retention_hours=2)
+    now = time.time_ns()
+    assert store.upsert(*lines(now, now - 5 * HOUR_NS)) == 1
+    assert store.count() == 1
+
+    # A bucket written while it was in the window is dropped once it leaves it
+    later = now / 1e9 + 4 * 3600
+    assert store.enforce_retention(now=later) == 1
+    assert store.buckets() == []
+    assert store.expired(now, now=later)
+
+
+def test_overwrites_are_not_counted_twice(client):
+    store = open_store(client)
+    now = time.time_ns()
+    store.upsert(*lines(now, now + 1))
+    store.upsert(*lines(now, now + 1, now + 2))
+
+    assert store.count() == 3
+    assert store.count(exact=True) == 3
+
+
+def test_unpartitioned_collection_is_migrated(client):
+    now = time.time_ns()
+    legacy = client.get_or_create_collection("system_logs", embedding_function=HashEmbeddingFunction())
+    legacy.upsert(ids=["new", "old", "untimed"],
+                  documents=["recent line", "ancient line", "line without timestamp"],
+                  metadatas=[{"timestamp": str(now)}, {"timestamp": str(now - 100 * HOUR_NS)},
+                             {"processed_at": str(now // 1_000_000_000)}])
+
+    store = open_store(client)
+    assert store.migrate_legacy(batch_size=2) == 2
+
+    assert "system_logs" not in [c.name for c in client.list_collections()]
+    assert store.count() == 2
+    found = store.get(limit=10)
+    assert sorted(found["ids"]) == ["new", "untimed"]
+    assert all(isinstance(m["timestamp"], int) for m in found["metadatas"])
+    assert store.migrate_legacy() == 0
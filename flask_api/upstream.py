@@ -0,0 +1,198 @@
+"""
+Pooled HTTP clients for the services app.py talks to (Loki, Prometheus, LLM).
+
+Each Upstream owns one requests.Session, so connections (and TLS sessions)
+are kept alive and reused instead of being re-established per call. Calls
+get bounded retries with full-jitter exponential backoff, and a per-backend
+CircuitBreaker fails fast once a backend keeps failing instead of letting
+every caller wait out its own timeout.
+
+Health is passive: it is learned from the outcome of real requests, so no
+separate readiness probe is needed before using a backend.
+"""
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+log = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+
+class CircuitOpen(Exception):
+    """The backend's circuit breaker is open; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures;
+    open -> half-open after `reset_timeout` seconds, letting one trial
+    call through; the trial's outcome closes or re-opens the circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, name="upstream"):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def retry_in(self):
+        """Seconds until an open circuit lets a trial call through."""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def allow(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    log.warning("⚡ %s circuit opened after %d consecutive failure(s)", self.name, self._failures)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class Upstream:
+    """One backend: keep-alive pool, retries with jitter, circuit breaker."""
+
+    def __init__(self, name, base_url, timeout=10.0, retries=2,
+                 backoff_base=0.2, backoff_max=2.0, pool_size=10,
+                 failure_threshold=5, reset_timeout=30.0, headers=None):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout, name)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._failures = 0
+        self._last_success = None
+        self._last_failure = None
+        self._last_error = None
+
+    def _backoff(self, attempt):
+        # Full jitter: uniform in [0, min(max, base * 2^attempt)]
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _record(self, ok, error=None):
+        with self._lock:
+            self._requests += 1
+            if ok:
+                self._last_success = time.time()
+            else:
+                self._failures += 1
+                self._last_failure = time.time()
+                self._last_error = error
+        if ok:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+    def request(self, method, path, retries=None, timeout=None, **kwargs):
+        """
+        Send a request to base_url + path.
+
+        Connection errors, timeouts and 429/502/503/504 are retried up to
+        `retries` times; other responses (including 4xx/5xx) are returned
+        to the caller. Raises CircuitOpen without sending anything while
+        the breaker is open, or the last requests exception when retries
+        are exhausted.
+        """
+        retries = self.retries if retries is None else retries
+        url = self.base_url + path
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpen(f"{self.name} circuit open, retry in {self.breaker.retry_in():.0f}s")
+            try:
+                res = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            except requests.RequestException as e:
+                self._record(False, str(e))
+                if attempt >= retries:
+                    raise
+            else:
+                if res.status_code not in RETRY_STATUSES and res.status_code < 500:
+                    self._record(True)
+                    return res
+                self._record(False, f"HTTP {res.status_code}")
+                if attempt >= retries or res.status_code not in RETRY_STATUSES:
+                    return res
+                res.close()
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    @property
+    def healthy(self):
+        """Passive health: circuit closed and the latest request succeeded."""
+        with self._lock:
+            last_ok = self._last_failure is None or (
+                self._last_success is not None and self._last_success >= self._last_failure)
+        return self.breaker.state == CircuitBreaker.CLOSED and last_ok
+
+    def health(self):
+        with self._lock:
+            info = {
+                "requests": self._requests,
+                "failures": self._failures,
+                "last_success": self._last_success,
+                "last_failure": self._last_failure,
+                "last_error": self._last_error,
+            }
+        info["circuit"] = self.breaker.state
+        info["healthy"] = self.healthy
+        return info
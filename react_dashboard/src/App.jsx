@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import axios from "axios";
 
 const BACKEND_URL = "http://localhost:5000";
@@ -10,28 +10,45 @@ function App() {
   const [error, setError] = useState(null);
   const [loading, setLoading] = useState(false);
   const [stats, setStats] = useState({ chromadb_count: 0, logs_added: 0 });
+  const [live, setLive] = useState(false);
+  // Server-side cursor: only lines newer than this are fetched next time
+  const logsCursor = useRef(0);
 
-  // Fetch logs from Flask (called every 15s)
+  // Convert Loki-shaped streams into log rows
+  const toLogRows = (results) =>
+    results.flatMap((r) =>
+      r.values.map((v) => ({
+        ts: parseInt(v[0]),
+        timestamp: new Date(parseInt(v[0]) / 1000000).toLocaleString(),
+        message: v[1],
+        level: getLogLevel(v[1]),
+        job: r.stream?.job || "unknown",
+      }))
+    );
+
+  // Sort by timestamp descending (newest first), keep the latest 100
+  const mergeLogs = (newLogs, incremental) =>
+    setLogs((prev) =>
+      (incremental ? [...newLogs, ...prev] : newLogs)
+        .sort((a, b) => b.ts - a.ts)
+        .slice(0, 100)
+    );
+
+  // Fetch logs from Flask (on load and whenever the live stream reconnects)
   const fetchLogs = async () => {
     try {
-      const res = await axios.get(`${BACKEND_URL}/logs?limit=100`);
+      const since = logsCursor.current;
+      const res = await axios.get(`${BACKEND_URL}/logs?limit=100&since=${since}`);
       const results = res.data?.data?.result || [];
-
-      if (results.length > 0) {
-        const newLogs = results.flatMap((r) =>
-          r.values.map((v) => ({
-            timestamp: new Date(parseInt(v[0]) / 1000000).toLocaleString(),
-            message: v[1],
-            level: getLogLevel(v[1]),
-            job: r.stream?.job || "unknown",
-          }))
-        );
-        // Sort by timestamp descending (newest first)
-        newLogs.sort((a, b) => new Date(b.timestamp) - new Date(a.timestamp));
-        setLogs(newLogs);
-      } else {
-        setLogs([]); // clear if none
+      if (since > 0 && (res.data?.more || res.data?.reset)) {
+        // Too far behind to page through: only the newest 100 are shown anyway
+        logsCursor.current = 0;
+        return fetchLogs();
       }
+      const incremental = since > 0 && res.data?.cursor !== undefined;
+      if (res.data?.cursor !== undefined) logsCursor.current = res.data.cursor;
+
+      mergeLogs(toLogRows(results), incremental);
       setError(null);
     } catch (err) {
       setError("Error fetching logs: " + err.message);
@@ -70,44 +87,134 @@ function App() {
     setUserInput("");
     setMessages((prev) => [...prev, { sender: "user", text: query }]);
 
+    // Update the AI message currently being streamed
+    const updateReply = (patch) =>
+      setMessages((prev) => {
+        const last = prev[prev.length - 1];
+        if (!last?.streaming) return prev;
+        return [...prev.slice(0, -1), { ...last, ...patch(last) }];
+      });
+
     try {
       setLoading(true);
-      const res = await axios.post(`${BACKEND_URL}/chat`, { message: query });
+      // POST can't use EventSource, so read the SSE frames off the body
+      const res = await fetch(`${BACKEND_URL}/chat`, {
+        method: "POST",
+        headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+        body: JSON.stringify({ message: query, stream: true }),
+      });
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
 
-      const aiResponse = res.data?.answer || "No AI response.";
-      const logsFound = res.data?.logs_found || 0;
-      const totalInDb = res.data?.total_in_db || 0;
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
 
-      setMessages((prev) => [
-        ...prev,
-        {
-          sender: "ai",
-          text: aiResponse,
-          meta: `📊 Found ${logsFound} relevant logs out of ${totalInDb} total in ChromaDB`,
-        },
-      ]);
+      const handleFrame = (frame) => {
+        const event = frame.match(/^event: (.*)$/m)?.[1];
+        const data = JSON.parse(frame.match(/^data: (.*)$/m)?.[1] || "{}");
+        if (event === "meta") {
+          setMessages((prev) => [
+            ...prev,
+            {
+              sender: "ai",
+              text: "",
+              streaming: true,
+              meta: `📊 Found ${data.logs_found || 0} relevant logs out of ${data.total_in_db || 0} total in ChromaDB${data.cached ? " · ⚡ cached answer" : ""}`,
+            },
+          ]);
+        } else if (event === "token") {
+          updateReply((m) => ({ text: m.text + data.text }));
+        } else if (event === "error") {
+          updateReply((m) => ({ text: m.text + (m.text ? "\n" : "") + "❌ " + data.error }));
+        }
+      };
+
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let end;
+        while ((end = buffer.indexOf("\n\n")) !== -1) {
+          handleFrame(buffer.slice(0, end));
+          buffer = buffer.slice(end + 2);
+        }
+      }
+      updateReply((m) => ({ text: m.text || "No AI response." }));
     } catch (err) {
       setMessages((prev) => [
         ...prev,
         { sender: "ai", text: "❌ Error: " + err.message },
       ]);
     } finally {
+      updateReply(() => ({ streaming: false }));
       setLoading(false);
     }
   };
 
-  // Poll logs and stats
+  // Live logs and stats over Server-Sent Events
   useEffect(() => {
     // initial fetch
     fetchLogs();
     fetchStats();
 
-    const logsInterval = setInterval(fetchLogs, 15000); // every 15 seconds
-    const statsInterval = setInterval(fetchStats, 5000);
+    let source = null;
+    let poll = null;
+    let retry = null;
+    let delay = 2000;
+    let stopped = false;
+
+    const connect = () => {
+      source = new EventSource(`${BACKEND_URL}/stream`);
+
+      source.onopen = () => {
+        setLive(true);
+        delay = 2000;
+        if (poll) {
+          clearInterval(poll);
+          poll = null;
+        }
+        // Catch up on anything missed while disconnected
+        fetchLogs();
+      };
+      // EventSource reconnects on its own after a dropped connection, but not
+      // when the server refused the feed (a 503 from a gunicorn worker that
+      // does not ingest): poll meanwhile and reconnect with backoff, which
+      // may land on the worker that does
+      source.onerror = () => {
+        setLive(false);
+        if (source.readyState !== EventSource.CLOSED || stopped) return;
+        if (!poll) {
+          poll = setInterval(() => {
+            fetchLogs();
+            fetchStats();
+          }, 5000);
+        }
+        retry = setTimeout(connect, delay);
+        delay = Math.min(delay * 2, 60000);
+      };
+
+      source.addEventListener("logs", (e) => {
+        const data = JSON.parse(e.data);
+        logsCursor.current = data.cursor;
+        mergeLogs(toLogRows(data.result || []), true);
+      });
+
+      source.addEventListener("stats", (e) => {
+        const data = JSON.parse(e.data);
+        setStats({
+          chromadb_count: data.chromadb_count || 0,
+          logs_added: data.logs_added || 0,
+          logs_processed: data.logs_processed || 0,
+        });
+      });
+    };
+    connect();
 
     return () => {
-      clearInterval(logsInterval);
-      clearInterval(statsInterval);
+      stopped = true;
+      source.close();
+      if (poll) clearInterval(poll);
+      if (retry) clearTimeout(retry);
     };
   }, []);
 
@@ -128,8 +235,8 @@ function App() {
           <span style={styles.statValue}>{logs.length}</span>
         </div>
         <div style={styles.statItem}>
-          <span style={styles.statLabel}>⏱️ Polling:</span>
-          <span style={styles.statValue}>15s</span>
+          <span style={styles.statLabel}>⏱️ Updates:</span>
+          <span style={styles.statValue}>{live ? "live" : "reconnecting"}</span>
         </div>
         <button
           style={styles.refreshButton}
@@ -206,7 +313,7 @@ function App() {
               </div>
             ))}
 
-            {loading && (
+            {loading && !messages[messages.length - 1]?.streaming && (
               <div style={styles.loadingMessage}>
                 <span style={styles.loadingDots}>●</span>
                 <span style={styles.loadingDots}>●</span>